@@ -1,4 +1,4 @@
-from . import api_characteristic, api_concept, api_page, api_user, api_gameworld, api_import_export, api_vectordb, api_agent, api_specialist, api_backup
+from . import api_characteristic, api_concept, api_page, api_user, api_gameworld, api_import_export, api_vectordb, api_agent, api_specialist, api_backup, api_job
 
 __all__ = [
     "api_characteristic",
@@ -11,4 +11,5 @@ __all__ = [
     "api_agent",
     "api_specialist",
     "api_backup",
+    "api_job",
 ]
@@ -5,6 +5,7 @@ from app.dependencies import get_current_user, require_role
 from app.models.model_user import User, UserRole
 from app.models.model_agent import Agent
 from app.crud.crud_agent import (
+    build_agent_chat,
     chat_with_agent,
     create_agent,
     get_agent,
@@ -12,14 +13,17 @@ from app.crud.crud_agent import (
     update_agent,
     delete_agent,
 )
-from app.crud import crud_vectordb, crud_chat_history
+from app.crud import crud_vectordb, crud_chat_history, crud_job
 from app.crud.crud_page_analysis import analyze_page, generate_pages
 from app.crud.crud_page import get_page
 from app.schemas.schema_agent import AgentCreate, AgentRead, AgentUpdate
+from app.config import settings
 from app.database import get_session
+from app.api.api_job import JobFilters, list_job_dicts
+from app.llm import get_chat_model
+from app.streaming import StreamFormat, stream_chat_response
 from pydantic import BaseModel
 from typing import List, Literal, Optional
-import json
 
 class ChatMessage(BaseModel):
     role: Literal["system", "user", "assistant"]
@@ -31,146 +35,86 @@ class ChatRequest(BaseModel):
 router = APIRouter(prefix="/agents", tags=["Agents"], dependencies=[Depends(get_current_user)])
 
 
+VECTOR_JOB_TYPES = ("update_vector_db",)
+WRITER_JOB_TYPES = ("analyze_pages", "generate_pages")
+NOVELIST_JOB_TYPES = ("create_novel",)
+
+
+async def _job_status(session: AsyncSession, job_id: str, job_types) -> dict:
+    job = await crud_job.get_job(session, job_id, job_types)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return crud_job.job_to_dict(job)
+
+
+async def _update_job(session: AsyncSession, job_id: str, job_types, payload: dict) -> dict:
+    if not await crud_job.get_job(session, job_id, job_types):
+        raise HTTPException(status_code=404, detail="Job not found")
+    job = await crud_job.update_job_result(session, job_id, payload)
+    return crud_job.job_to_dict(job)
+
+
 @router.post("/{agent_id}/update_vector_db")
 async def update_vector_job(
     agent_id: int,
+    mode: Literal["full", "incremental"] = "incremental",
+    session: AsyncSession = Depends(get_session),
     user: User = Depends(get_current_user),
 ):
-    from uuid import uuid4
-    from pathlib import Path
-    from app.config import settings
     from app.task_queue import task_rebuild_vectordb
 
-    job_id = uuid4().hex
-    job_dir = Path(settings.vectordb_job_dir)
-    job_dir.mkdir(parents=True, exist_ok=True)
-    job_path = job_dir / f"{job_id}.json"
-    with open(job_path, "w") as f:
-        json.dump({"status": "queued", "agent_id": agent_id, "job_type": "update_vector_db"}, f)
-
-    task_rebuild_vectordb.delay(agent_id, job_id)
-    return {"job_id": job_id}
+    job = await crud_job.create_job(session, "update_vector_db", agent_id, {"mode": mode})
+    task_rebuild_vectordb.delay(agent_id, job.id, mode)
+    return {"job_id": job.id}
 
 
 @router.get("/vector_jobs/{job_id}")
-async def vector_job_status(job_id: str):
-    from pathlib import Path
-    from app.config import settings
-
-    job_path = Path(settings.vectordb_job_dir) / f"{job_id}.json"
-    if not job_path.is_file():
-        raise HTTPException(status_code=404, detail="Job not found")
-    with open(job_path) as f:
-        data = json.load(f)
-    return data
+async def vector_job_status(job_id: str, session: AsyncSession = Depends(get_session)):
+    return await _job_status(session, job_id, VECTOR_JOB_TYPES)
 
 
 @router.get("/vector_jobs")
-async def list_vector_jobs():
-    from pathlib import Path
-    from app.config import settings
-
-    job_dir = Path(settings.vectordb_job_dir)
-    job_dir.mkdir(parents=True, exist_ok=True)
-    jobs = []
-    for p in job_dir.glob("*.json"):
-        with open(p) as f:
-            data = json.load(f)
-        data["job_id"] = p.stem
-        jobs.append(data)
-    return jobs
+async def list_vector_jobs(
+    filters: JobFilters = Depends(),
+    session: AsyncSession = Depends(get_session),
+):
+    return await list_job_dicts(session, VECTOR_JOB_TYPES, filters)
 
 
 @router.get("/writer_jobs/{job_id}")
-async def writer_job_status(job_id: str):
-    from pathlib import Path
-    from app.config import settings
-
-    job_path = Path(settings.writer_job_dir) / f"{job_id}.json"
-    if not job_path.is_file():
-        raise HTTPException(status_code=404, detail="Job not found")
-    with open(job_path) as f:
-        data = json.load(f)
-    return data
+async def writer_job_status(job_id: str, session: AsyncSession = Depends(get_session)):
+    return await _job_status(session, job_id, WRITER_JOB_TYPES)
 
 
 @router.patch("/writer_jobs/{job_id}")
-async def update_writer_job(job_id: str, payload: dict):
-    from pathlib import Path
-    from app.config import settings
-
-    job_path = Path(settings.writer_job_dir) / f"{job_id}.json"
-    if not job_path.is_file():
-        raise HTTPException(status_code=404, detail="Job not found")
-    with open(job_path) as f:
-        data = json.load(f)
-    data.update(payload)
-    with open(job_path, "w") as f:
-        json.dump(data, f)
-    data["job_id"] = job_id
-    return data
+async def update_writer_job(job_id: str, payload: dict, session: AsyncSession = Depends(get_session)):
+    return await _update_job(session, job_id, WRITER_JOB_TYPES, payload)
 
 
 @router.get("/writer_jobs")
-async def list_writer_jobs():
-    from pathlib import Path
-    from app.config import settings
-
-    job_dir = Path(settings.writer_job_dir)
-    job_dir.mkdir(parents=True, exist_ok=True)
-    jobs = []
-    for p in job_dir.glob("*.json"):
-        with open(p) as f:
-            data = json.load(f)
-        data["job_id"] = p.stem
-        jobs.append(data)
-    return jobs
+async def list_writer_jobs(
+    filters: JobFilters = Depends(),
+    session: AsyncSession = Depends(get_session),
+):
+    return await list_job_dicts(session, WRITER_JOB_TYPES, filters)
 
 
 @router.get("/novelist_jobs/{job_id}")
-async def novelist_job_status(job_id: str):
-    from pathlib import Path
-    from app.config import settings
-
-    job_path = Path(settings.novelist_job_dir) / f"{job_id}.json"
-    if not job_path.is_file():
-        raise HTTPException(status_code=404, detail="Job not found")
-    with open(job_path) as f:
-        data = json.load(f)
-    return data
+async def novelist_job_status(job_id: str, session: AsyncSession = Depends(get_session)):
+    return await _job_status(session, job_id, NOVELIST_JOB_TYPES)
 
 
 @router.patch("/novelist_jobs/{job_id}")
-async def update_novelist_job(job_id: str, payload: dict):
-    from pathlib import Path
-    from app.config import settings
-
-    job_path = Path(settings.novelist_job_dir) / f"{job_id}.json"
-    if not job_path.is_file():
-        raise HTTPException(status_code=404, detail="Job not found")
-    with open(job_path) as f:
-        data = json.load(f)
-    data.update(payload)
-    with open(job_path, "w") as f:
-        json.dump(data, f)
-    data["job_id"] = job_id
-    return data
+async def update_novelist_job(job_id: str, payload: dict, session: AsyncSession = Depends(get_session)):
+    return await _update_job(session, job_id, NOVELIST_JOB_TYPES, payload)
 
 
 @router.get("/novelist_jobs")
-async def list_novelist_jobs():
-    from pathlib import Path
-    from app.config import settings
-
-    job_dir = Path(settings.novelist_job_dir)
-    job_dir.mkdir(parents=True, exist_ok=True)
-    jobs = []
-    for p in job_dir.glob("*.json"):
-        with open(p) as f:
-            data = json.load(f)
-        data["job_id"] = p.stem
-        jobs.append(data)
-    return jobs
+async def list_novelist_jobs(
+    filters: JobFilters = Depends(),
+    session: AsyncSession = Depends(get_session),
+):
+    return await list_job_dicts(session, NOVELIST_JOB_TYPES, filters)
 
 @router.post("/{agent_id}/chat")
 async def chat(
@@ -184,7 +128,9 @@ async def chat(
     if not agent or agent.vector_db_update_date is None:
         raise HTTPException(status_code=400, detail="Agent unavailable")
 
-    history = crud_chat_history.load_history(user.id, agent_id)
+    history = await crud_chat_history.load_history(
+        session, user.id, agent_id, limit=settings.chat_history_context
+    )
     user_msg = msgs[-1] if msgs else {"role": "user", "content": ""}
     chat_messages = history + [user_msg]
     assistant_resp = await chat_with_agent(
@@ -194,30 +140,62 @@ async def chat(
         user_nickname=user.nickname,
     )
 
-    assistant_msg = {"role": "assistant", "content": assistant_resp["answer"]}
-    if assistant_resp.get("sources"):
-        assistant_msg["sources"] = assistant_resp["sources"]
-
-    new_history = (history + [user_msg, assistant_msg])[-20:]
-    crud_chat_history.save_history(user.id, agent_id, new_history)
+    await crud_chat_history.record_exchange(
+        session, user.id, agent_id, user_msg, assistant_resp["answer"], assistant_resp.get("sources")
+    )
 
     return JSONResponse(assistant_resp)
 
 
+@router.post("/{agent_id}/chat/stream")
+async def chat_stream(
+    agent_id: int,
+    payload: ChatRequest,
+    format: StreamFormat = "sse",
+    session: AsyncSession = Depends(get_session),
+    user: User = Depends(get_current_user),
+):
+    """Stream the answer: retrieved sources first, then tokens as they arrive."""
+    msgs = [m.model_dump() for m in payload.messages]
+    history = await crud_chat_history.load_history(
+        session, user.id, agent_id, limit=settings.chat_history_context
+    )
+    user_msg = msgs[-1] if msgs else {"role": "user", "content": ""}
+    try:
+        prompt_messages, sources = await build_agent_chat(
+            session,
+            agent_id,
+            history + [user_msg],
+            user_nickname=user.nickname,
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Agent unavailable")
+
+    async def save(answer: str) -> None:
+        await crud_chat_history.record_exchange(session, user.id, agent_id, user_msg, answer, sources)
+
+    return stream_chat_response(get_chat_model(), prompt_messages, sources, save, fmt=format, label=f"agent {agent_id} chat")
+
+
 @router.get("/{agent_id}/history")
 async def chat_history(
     agent_id: int,
     limit: int = 20,
+    session: AsyncSession = Depends(get_session),
     user: User = Depends(get_current_user),
 ):
-    messages = crud_chat_history.load_history(user.id, agent_id)
-    return {"messages": messages[-limit:]}
+    messages = await crud_chat_history.load_history(session, user.id, agent_id, limit=limit)
+    return {"messages": messages}
 
 
 @router.delete("/{agent_id}/history")
-async def clear_chat_history(agent_id: int, user: User = Depends(get_current_user)):
+async def clear_chat_history(
+    agent_id: int,
+    session: AsyncSession = Depends(get_session),
+    user: User = Depends(get_current_user),
+):
     """Remove all stored chat messages between the current user and this agent."""
-    crud_chat_history.clear_history(user.id, agent_id)
+    await crud_chat_history.clear_history(session, user.id, agent_id)
     return {"ok": True}
 
 
@@ -235,7 +213,7 @@ async def chat_test(
         raise HTTPException(status_code=400, detail="Agent unavailable")
 
     query = msgs[-1].get("content", "") if msgs else ""
-    docs = crud_vectordb.query_world(agent.world_id, query, n_results=4)
+    docs = await crud_vectordb.aquery_world(agent.world_id, query, n_results=4)
     return {"documents": docs}
 
 
@@ -344,32 +322,19 @@ class AnalyzeJobRequest(BaseModel):
 async def analyze_page_job_endpoint(
     agent_id: int,
     page_id: int,
+    session: AsyncSession = Depends(get_session),
     user: User = Depends(get_current_user),
 ):
-    from uuid import uuid4
-    from pathlib import Path
-    from app.config import settings
     from app.task_queue import task_analyze_pages_job
 
-    job_id = uuid4().hex
-    job_dir = Path(settings.writer_job_dir)
-    job_dir.mkdir(parents=True, exist_ok=True)
-    job_path = job_dir / f"{job_id}.json"
-    with open(job_path, "w") as f:
-        json.dump(
-            {
-                "status": "queued",
-                "agent_id": agent_id,
-                "job_type": "analyze_pages",
-                "page_ids": [page_id],
-                "pages_total": 1,
-                "pages_processed": 0,
-            },
-            f,
-        )
-
-    task_analyze_pages_job.delay(agent_id, [page_id], job_id)
-    return {"job_id": job_id}
+    job = await crud_job.create_job(
+        session,
+        "analyze_pages",
+        agent_id,
+        {"page_ids": [page_id], "pages_total": 1, "pages_processed": 0},
+    )
+    task_analyze_pages_job.delay(agent_id, [page_id], job.id)
+    return {"job_id": job.id}
 
 
 class GenerateJobRequest(BaseModel):
@@ -384,41 +349,32 @@ async def generate_pages_job_endpoint(
     agent_id: int,
     page_id: int,
     payload: GenerateJobRequest,
+    session: AsyncSession = Depends(get_session),
     user: User = Depends(get_current_user),
 ):
-    from uuid import uuid4
-    from pathlib import Path
-    from app.config import settings
     from app.task_queue import task_generate_pages_job
 
-    job_id = uuid4().hex
-    job_dir = Path(settings.writer_job_dir)
-    job_dir.mkdir(parents=True, exist_ok=True)
-    job_path = job_dir / f"{job_id}.json"
-    with open(job_path, "w") as f:
-        json.dump(
-            {
-                "status": "queued",
-                "agent_id": agent_id,
-                "page_id": page_id,
-                "job_type": "generate_pages",
-                "merge_groups": payload.merge_groups or [],
-                "suggestions": payload.suggestions or [],
-                "bulk_accept_updates": payload.bulk_accept_updates or False,
-            },
-            f,
-        )
-
+    job = await crud_job.create_job(
+        session,
+        "generate_pages",
+        agent_id,
+        {
+            "page_id": page_id,
+            "merge_groups": payload.merge_groups or [],
+            "suggestions": payload.suggestions or [],
+            "bulk_accept_updates": payload.bulk_accept_updates or False,
+        },
+    )
     task_generate_pages_job.delay(
         agent_id,
         page_id,
         payload.pages,
-        job_id,
+        job.id,
         payload.merge_groups or [],
         payload.suggestions or [],
         payload.bulk_accept_updates or False,
     )
-    return {"job_id": job_id}
+    return {"job_id": job.id}
 
 
 class AnalyzePagesJobRequest(BaseModel):
@@ -436,68 +392,43 @@ class NovelJobRequest(BaseModel):
 async def analyze_pages_job_endpoint(
     agent_id: int,
     payload: AnalyzePagesJobRequest,
+    session: AsyncSession = Depends(get_session),
     user: User = Depends(get_current_user),
 ):
-    from uuid import uuid4
-    from pathlib import Path
-    from app.config import settings
     from app.task_queue import task_analyze_pages_job
 
-    job_id = uuid4().hex
-    job_dir = Path(settings.writer_job_dir)
-    job_dir.mkdir(parents=True, exist_ok=True)
-    job_path = job_dir / f"{job_id}.json"
-
-    with open(job_path, "w") as f:
-        json.dump(
-            {
-                "status": "queued",
-                "agent_id": agent_id,
-                "job_type": "analyze_pages",
-                "page_ids": payload.page_ids,
-                "pages_total": len(payload.page_ids),
-                "pages_processed": 0,
-            },
-            f,
-        )
-
-    task_analyze_pages_job.delay(agent_id, payload.page_ids, job_id)
-    return {"job_id": job_id}
+    job = await crud_job.create_job(
+        session,
+        "analyze_pages",
+        agent_id,
+        {
+            "page_ids": payload.page_ids,
+            "pages_total": len(payload.page_ids),
+            "pages_processed": 0,
+        },
+    )
+    task_analyze_pages_job.delay(agent_id, payload.page_ids, job.id)
+    return {"job_id": job.id}
 
 
 @router.post("/{agent_id}/novel_job")
 async def create_novel_job_endpoint(
     agent_id: int,
     payload: NovelJobRequest,
+    session: AsyncSession = Depends(get_session),
     user: User = Depends(get_current_user),
 ):
-    from uuid import uuid4
-    from pathlib import Path
-    from app.config import settings
     from app.task_queue import task_create_novel_job
 
-    job_id = uuid4().hex
-    job_dir = Path(settings.novelist_job_dir)
-    job_dir.mkdir(parents=True, exist_ok=True)
-    job_path = job_dir / f"{job_id}.json"
-    with open(job_path, "w") as f:
-        json.dump(
-            {
-                "status": "queued",
-                "agent_id": agent_id,
-                "job_type": "create_novel",
-            },
-            f,
-        )
-
+    job = await crud_job.create_job(session, "create_novel", agent_id)
     task_create_novel_job.delay(
         agent_id,
         payload.text,
         payload.instructions,
         payload.previous_page_id,
         payload.helper_agents or [],
-        job_id,
+        job.id,
     )
-    return {"job_id": job_id}
+    return {"job_id": job.id}
 
 
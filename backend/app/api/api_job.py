@@ -0,0 +1,114 @@
+import asyncio
+from datetime import datetime
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import job_events
+from app.config import settings
+from app.crud import crud_job
+from app.database import get_session
+from app.dependencies import get_current_user
+from app.models.model_job import Job
+from app.streaming import MEDIA_TYPES, encode_event
+
+router = APIRouter(prefix="/jobs", tags=["Jobs"], dependencies=[Depends(get_current_user)])
+
+
+class JobFilters:
+    """Query parameters shared by every job listing endpoint."""
+
+    def __init__(
+        self,
+        agent_id: Optional[int] = None,
+        status: Optional[str] = None,
+        before: Optional[datetime] = Query(None, description="Only jobs created before this time"),
+        limit: int = Query(50, ge=1, le=500),
+        offset: int = Query(0, ge=0),
+    ):
+        self.agent_id = agent_id
+        self.status = status
+        self.before = before
+        self.limit = limit
+        self.offset = offset
+
+
+async def list_job_dicts(session: AsyncSession, job_types, filters: JobFilters) -> list[dict]:
+    jobs = await crud_job.list_jobs(
+        session,
+        job_types=job_types,
+        agent_id=filters.agent_id,
+        status=filters.status,
+        before=filters.before,
+        limit=filters.limit,
+        offset=filters.offset,
+    )
+    return [crud_job.job_to_dict(j) for j in jobs]
+
+
+@router.get("/")
+async def list_jobs(
+    job_type: Optional[List[str]] = Query(None),
+    filters: JobFilters = Depends(),
+    session: AsyncSession = Depends(get_session),
+):
+    return await list_job_dicts(session, job_type, filters)
+
+
+@router.get("/{job_id}")
+async def get_job(job_id: str, session: AsyncSession = Depends(get_session)):
+    job = await crud_job.get_job(session, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return crud_job.job_to_dict(job)
+
+
+FINISHED = ("done", "error")
+
+
+@router.get("/{job_id}/events")
+async def job_event_stream(job_id: str, session: AsyncSession = Depends(get_session)):
+    """Server-Sent Events for one job.
+
+    The stream opens with a ``status`` event holding the whole job, then
+    relays the worker's ``status``/``progress`` updates (partial, merge them
+    into the first one) and ends after ``done`` or ``error``.
+    """
+    if not await crud_job.get_job(session, job_id):
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def snapshot() -> dict:
+        job = await session.get(Job, job_id, populate_existing=True)
+        state = crud_job.job_to_dict(job) if job else {"job_id": job_id, "status": "error", "error": "Job deleted"}
+        # end the read transaction, later snapshots must see new commits
+        await session.commit()
+        return state
+
+    async def body():
+        async with job_events.subscribe(job_id) as queue:
+            state = await snapshot()
+            yield encode_event("sse", "status", state)
+            while state.get("status") not in FINISHED:
+                try:
+                    message = await asyncio.wait_for(queue.get(), settings.job_events_keepalive)
+                except asyncio.TimeoutError:
+                    # nothing pushed for a while, catch up from the table in
+                    # case an event was lost
+                    latest = await snapshot()
+                    if latest != state:
+                        state = latest
+                        yield encode_event("sse", "status", state)
+                    else:
+                        yield ": keepalive\n\n"
+                    continue
+                event = message.pop("event", "progress")
+                state.update(message)
+                yield encode_event("sse", event, message)
+
+    return StreamingResponse(
+        body(),
+        media_type=MEDIA_TYPES["sse"],
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
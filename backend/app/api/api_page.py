@@ -5,7 +5,7 @@ from fastapi import Query
 from app.database import get_session
 from app.models.model_user import User, UserRole
 from app.models.model_page import Page, PageCharacteristicValue
-from app.schemas.schema_page import PageCreate, PageRead, PageUpdate
+from app.schemas.schema_page import PageCreate, PageRead, PageUpdate, PageBacklinkRead
 from app.schemas.schema_page_characteristic_value import  PageCharacteristicValueUpdate, PageCharacteristicValueRead, PageCharacteristicValueCreate
 from app.crud.crud_page import (
     create_page,
@@ -19,9 +19,11 @@ from app.crud.crud_page import (
     update_page_characteristic_value,
     delete_page_characteristic_value,
     delete_page_characteristic_values,
+    get_backlinks,
 )
 from datetime import datetime, timezone
 from app.dependencies import get_current_user, require_role
+from app.crud.crud_vectordb import schedule_reindex
 
 
 
@@ -87,6 +89,7 @@ async def create_page_endpoint(
         from app.task_queue import task_auto_crosslink_batch, task_sync_page_ref_attributes
         task_auto_crosslink_batch.delay(db_page.id)
         task_sync_page_ref_attributes.delay(db_page.id)
+    schedule_reindex(db_page)
     return response
 
     # values = await get_page_characteristic_values(session, db_page.id)
@@ -123,6 +126,17 @@ async def read_page(
     return PageRead.model_validate({**db_page.model_dump(), "values": values})
         
 
+@router.get("/{page_id}/backlinks", response_model=List[PageBacklinkRead])
+async def read_page_backlinks(
+    page_id: int,
+    session: AsyncSession = Depends(get_session),
+):
+    db_page = await get_page(session, page_id)
+    if not db_page:
+        raise HTTPException(status_code=404, detail="Page not found")
+    return await get_backlinks(session, page_id)
+
+
 @router.patch("/{page_id}", response_model=PageRead)
 async def update_page_endpoint(
     page_id: int,
@@ -169,6 +183,7 @@ async def update_page_endpoint(
     from app.task_queue import task_auto_crosslink_page_content, task_sync_page_ref_attributes
     task_auto_crosslink_page_content.delay(db_page.id)
     task_sync_page_ref_attributes.delay(db_page.id)
+    schedule_reindex(db_page)
 
     return response
 
@@ -192,7 +207,8 @@ async def delete_page_endpoint(
     )
     task_remove_page_refs_from_characteristics.delay(db_page.id)
     task_remove_crosslinks_to_page.delay(page_id)
-    
+    schedule_reindex(db_page, deleted=True)
+
     return {"ok": True}
 
 # -- PageCharacteristicValue endpoints (optional, add as needed)
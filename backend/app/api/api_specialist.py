@@ -1,7 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
 from fastapi.responses import JSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from uuid import uuid4
 import json
 from pathlib import Path
 import base64
@@ -9,17 +8,21 @@ import base64
 from app.dependencies import get_current_user
 from app.models.model_user import User
 from app.database import get_session
+from app.api.api_job import JobFilters, list_job_dicts
 from app.crud import (
     crud_specialist_source,
     crud_specialist_vectordb,
     crud_chat_history,
+    crud_job,
 )
-from app.crud.crud_specialist_agent import chat_with_specialist
+from app.crud.crud_specialist_agent import build_specialist_chat, chat_with_specialist
 from app.models.model_specialist_source import SpecialistSource
 from app.schemas.schema_specialist_source import SpecialistSourceCreate, SpecialistSourceRead
 from pydantic import BaseModel
 from typing import Literal
 from app.config import settings
+from app.llm import get_chat_model
+from app.streaming import StreamFormat, stream_chat_response
 from fastapi import Response
 
 router = APIRouter(prefix="/specialist_agents", tags=["SpecialistAgents"], dependencies=[Depends(get_current_user)])
@@ -178,40 +181,35 @@ async def import_vectordb(
     return {"documents_indexed": count}
 
 
+SPECIALIST_JOB_TYPES = ("rebuild_specialist_vectors",)
+
+
 @router.post("/{agent_id}/rebuild_vectors_async")
-async def rebuild_vectors_async(agent_id: int, user: User = Depends(get_current_user)):
+async def rebuild_vectors_async(
+    agent_id: int,
+    session: AsyncSession = Depends(get_session),
+    user: User = Depends(get_current_user),
+):
     from app.task_queue import task_rebuild_specialist_vectors
-    job_id = uuid4().hex
-    job_dir = Path(settings.specialist_job_dir)
-    job_dir.mkdir(parents=True, exist_ok=True)
-    job_path = job_dir / f"{job_id}.json"
-    with open(job_path, "w") as f:
-        json.dump({"status": "queued", "agent_id": agent_id, "job_type": "rebuild_specialist_vectors"}, f)
-    task_rebuild_specialist_vectors.delay(agent_id, job_id)
-    return {"job_id": job_id}
+    job = await crud_job.create_job(session, "rebuild_specialist_vectors", agent_id)
+    task_rebuild_specialist_vectors.delay(agent_id, job.id)
+    return {"job_id": job.id}
 
 
 @router.get("/vector_jobs/{job_id}")
-async def specialist_vector_job_status(job_id: str):
-    job_path = Path(settings.specialist_job_dir) / f"{job_id}.json"
-    if not job_path.is_file():
+async def specialist_vector_job_status(job_id: str, session: AsyncSession = Depends(get_session)):
+    job = await crud_job.get_job(session, job_id, SPECIALIST_JOB_TYPES)
+    if not job:
         raise HTTPException(status_code=404, detail="Job not found")
-    with open(job_path) as f:
-        data = json.load(f)
-    return data
+    return crud_job.job_to_dict(job)
 
 
 @router.get("/vector_jobs")
-async def list_vector_jobs():
-    job_dir = Path(settings.specialist_job_dir)
-    job_dir.mkdir(parents=True, exist_ok=True)
-    jobs = []
-    for p in job_dir.glob("*.json"):
-        with open(p) as f:
-            data = json.load(f)
-        data["job_id"] = p.stem
-        jobs.append(data)
-    return jobs
+async def list_vector_jobs(
+    filters: JobFilters = Depends(),
+    session: AsyncSession = Depends(get_session),
+):
+    return await list_job_dicts(session, SPECIALIST_JOB_TYPES, filters)
 
 
 class ChatMessage(BaseModel):
@@ -231,7 +229,9 @@ async def specialist_chat(
     user: User = Depends(get_current_user),
 ):
     msgs = [m.model_dump() for m in payload.messages]
-    history = crud_chat_history.load_history(user.id, agent_id)
+    history = await crud_chat_history.load_history(
+        session, user.id, agent_id, limit=settings.chat_history_context
+    )
     user_msg = msgs[-1] if msgs else {"role": "user", "content": ""}
     chat_messages = history + [user_msg]
     assistant_resp = await chat_with_specialist(
@@ -240,25 +240,58 @@ async def specialist_chat(
         chat_messages,
         user_nickname=user.nickname,
     )
-    assistant_msg = {"role": "assistant", "content": assistant_resp["answer"]}
-    if assistant_resp.get("sources"):
-        assistant_msg["sources"] = assistant_resp["sources"]
-    new_history = (history + [user_msg, assistant_msg])[-20:]
-    crud_chat_history.save_history(user.id, agent_id, new_history)
+    await crud_chat_history.record_exchange(
+        session, user.id, agent_id, user_msg, assistant_resp["answer"], assistant_resp.get("sources")
+    )
     return JSONResponse(assistant_resp)
 
 
+@router.post("/{agent_id}/chat/stream")
+async def specialist_chat_stream(
+    agent_id: int,
+    payload: ChatRequest,
+    format: StreamFormat = "sse",
+    session: AsyncSession = Depends(get_session),
+    user: User = Depends(get_current_user),
+):
+    """Stream the answer: sources first, then tokens as they arrive."""
+    msgs = [m.model_dump() for m in payload.messages]
+    history = await crud_chat_history.load_history(
+        session, user.id, agent_id, limit=settings.chat_history_context
+    )
+    user_msg = msgs[-1] if msgs else {"role": "user", "content": ""}
+    try:
+        prompt_messages, sources = await build_specialist_chat(
+            session,
+            agent_id,
+            history + [user_msg],
+            user_nickname=user.nickname,
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Agent unavailable")
+
+    async def save(answer: str) -> None:
+        await crud_chat_history.record_exchange(session, user.id, agent_id, user_msg, answer, sources)
+
+    return stream_chat_response(get_chat_model(), prompt_messages, sources, save, fmt=format, label=f"specialist {agent_id} chat")
+
+
 @router.get("/{agent_id}/history")
 async def specialist_chat_history(
     agent_id: int,
     limit: int = 20,
+    session: AsyncSession = Depends(get_session),
     user: User = Depends(get_current_user),
 ):
-    messages = crud_chat_history.load_history(user.id, agent_id)
-    return {"messages": messages[-limit:]}
+    messages = await crud_chat_history.load_history(session, user.id, agent_id, limit=limit)
+    return {"messages": messages}
 
 
 @router.delete("/{agent_id}/history")
-async def clear_specialist_history(agent_id: int, user: User = Depends(get_current_user)):
-    crud_chat_history.clear_history(user.id, agent_id)
+async def clear_specialist_history(
+    agent_id: int,
+    session: AsyncSession = Depends(get_session),
+    user: User = Depends(get_current_user),
+):
+    await crud_chat_history.clear_history(session, user.id, agent_id)
     return {"ok": True}
@@ -1,5 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Literal
 
 from app.database import get_session
 from app.crud import crud_vectordb
@@ -7,10 +8,18 @@ from app.crud import crud_vectordb
 router = APIRouter(prefix="/vectordb", tags=["VectorDB"])
 
 
+@router.get("/metrics")
+async def vectordb_cache_metrics():
+    return crud_vectordb.cache_metrics()
+
+
 @router.post("/{world_id}/rebuild")
-async def rebuild_world_vector(world_id: int, session: AsyncSession = Depends(get_session)):    
-    count = await crud_vectordb.rebuild_world(session, world_id)
-    return {"pages_indexed": count}
+async def rebuild_world_vector(
+    world_id: int,
+    mode: Literal["full", "incremental"] = "incremental",
+    session: AsyncSession = Depends(get_session),
+):
+    return await crud_vectordb.rebuild_world(session, world_id, mode=mode)
 
 
 @router.post("/{world_id}/add_page/{page_id}")
@@ -23,5 +32,5 @@ async def add_page(world_id: int, page_id: int, session: AsyncSession = Depends(
 
 @router.get("/{world_id}/search")
 async def search_world(world_id: int, q: str = Query(..., alias="query"), n: int = 5):
-    results = crud_vectordb.query_world(world_id, q, n_results=n)
+    results = await crud_vectordb.aquery_world(world_id, q, n_results=n)
     return results
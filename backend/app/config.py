@@ -1,3 +1,5 @@
+from typing import Literal
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 class Settings(BaseSettings):
@@ -8,15 +10,81 @@ class Settings(BaseSettings):
     openai_api_key: str | None = None
     open_ai_model: str | None = None
     vector_db_path: str = "./data/vector_db"
+    # Legacy JSON chat history, imported into the chat_message table on startup
     chat_history_dir: str = "./data/chat/{user_id}"
-    vectordb_job_dir: str = "./data/vector_jobs"
-    writer_job_dir: str = "./data/writer_jobs"
-    specialist_job_dir: str = "./data/specialist_jobs"
-    novelist_job_dir: str = "./data/novelist_jobs"
+    # Finished jobs are kept this many days, expired ones are purged every
+    # job_purge_interval seconds
+    job_ttl_days: int = 7
+    job_purge_interval: int = 3600
+    # Redis URL for job progress events (defaults to the Celery broker), and
+    # how often an idle /jobs/{id}/events stream re-checks the job table
+    job_events_url: str | None = None
+    job_events_keepalive: int = 15
     celery_broker_url: str = "redis://localhost:6379/0"
     celery_result_backend: str = "redis://localhost:6379/0"
     vector_db_url: str = "localhost"
     vector_db_port: str = "8001"
+    # chroma_http (server at vector_db_url), chroma_persistent (embedded,
+    # under vector_db_path) or flat (built-in exact index, small worlds)
+    vector_backend: Literal["chroma_http", "chroma_persistent", "flat"] = "chroma_http"
+    # Collection handles kept per process (world and specialist collections)
+    chroma_collection_cache_size: int = 64
+    # Threads embedding chat/search queries, and concurrent vector searches
+    # per backend, used by the async retrieval path
+    query_embedding_threads: int = 4
+    vector_search_concurrency: dict[str, int] = {"chroma_http": 16, "chroma_persistent": 4, "flat": 4}
+    # In-memory caches for chat retrieval (entries, seconds)
+    query_cache_size: int = 2048
+    query_cache_ttl: int = 3600
+    result_cache_size: int = 2048
+    result_cache_ttl: int = 600
+    # Seconds a collection's index generation is trusted before its file is
+    # checked again (changes made by other processes show up this late)
+    index_generation_ttl: float = 1.0
+    # Seconds to wait before re-embedding an edited page, so that a burst of
+    # edits results in a single reindex.
+    vector_reindex_delay: int = 10
+    # Number of chunks embedded per forward pass during world rebuilds
+    vector_embed_batch_size: int = 256
+    embedding_cache_path: str = "./data/embedding_cache.sqlite3"
+    embedding_cache_max_entries: int = 200_000
+    # Generated tone prompts of the agent personalities
+    personality_file: str = "./data/personalities_parsing.json"
+    # Load the embedding model at startup instead of on the first request
+    embedding_prewarm: bool = False
+    # Unix socket of a shared ``python -m app.embeddings`` worker; when unset
+    # every process loads its own copy of the model.
+    embedding_worker_socket: str | None = None
+    # Chat history: messages sent to the model, retention per conversation
+    chat_history_context: int = 20
+    chat_history_keep: int = 500
+    chat_history_max_age_days: int | None = None
+    chat_history_prune_interval: int = 3600
+    # Shared OpenAI HTTP pool (HTTP/2 is used when the ``h2`` package is installed)
+    llm_http2: bool = True
+    llm_max_connections: int = 32
+    llm_keepalive_expiry: float = 120.0
+    llm_timeout: float = 120.0
+    # Concurrent LLM requests per process for batch work (page analysis and
+    # generation), and retries with exponential backoff on rate limits /
+    # transient errors
+    llm_concurrency: int = 8
+    llm_max_retries: int = 3
+    llm_retry_base_delay: float = 1.0
+    # Default page analysis extraction mode for worlds that don't choose one:
+    # per_concept (one prompt per concept and chunk) or multi_concept (one
+    # JSON prompt per chunk)
+    page_analysis_mode: Literal["per_concept", "multi_concept"] = "per_concept"
+    # Pages analyzed at the same time by a bulk analyze job (their LLM calls
+    # still share llm_concurrency)
+    analysis_page_concurrency: int = 4
+    # Context window of open_ai_model, in tokens
+    llm_context_tokens: int = 128000
+    # Novels: transcripts are split into arcs of about novel_arc_tokens (at
+    # most novel_max_arcs of them, on speaker or scene changes), the arcs are
+    # merged in several passes when they don't fit in llm_context_tokens
+    novel_arc_tokens: int = 1500
+    novel_max_arcs: int = 12
     model_config = SettingsConfigDict(env_file=".env", extra="ignore")
 
 settings = Settings()
@@ -2,11 +2,16 @@ from . import crud_characteristic
 from . import crud_concept
 from . import crud_gameworld
 from . import crud_import_export
+from . import crud_name_index
 from . import crud_page
 from . import crud_page_links_update
+from . import crud_crosslink_matcher
+from . import crud_embedding_cache
 from . import crud_users
+from . import crud_personality
 from . import crud_agent
 from . import crud_chat_history
+from . import crud_job
 from . import crud_specialist_source
 from . import crud_specialist_vectordb
 from . import crud_specialist_agent
@@ -17,6 +22,9 @@ except Exception:  # pragma: no cover - optional dependency
         def query_world(self, *args, **kwargs):
             return []
 
+        async def aquery_world(self, *args, **kwargs):
+            return []
+
     crud_vectordb = _DummyVectorDB()
 
 __all__ = [
@@ -24,11 +32,16 @@ __all__ = [
     "crud_concept",
     "crud_gameworld",
     "crud_import_export",
+    "crud_name_index",
     "crud_page",
     "crud_page_links_update",
+    "crud_crosslink_matcher",
+    "crud_embedding_cache",
     "crud_users",
+    "crud_personality",
     "crud_agent",
     "crud_chat_history",
+    "crud_job",
     "crud_specialist_source",
     "crud_specialist_vectordb",
     "crud_specialist_agent",
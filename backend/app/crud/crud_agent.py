@@ -2,70 +2,31 @@
 
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from langchain_openai import ChatOpenAI
-from langchain_core.prompts import ChatPromptTemplate
-from langgraph.graph import Graph
+from langchain_core.messages import BaseMessage
 
-from pathlib import Path
-import json
-
-from app.config import settings
-from app.crud import crud_vectordb
+from app.crud import crud_personality, crud_vectordb
+from app.llm import CHAT_PROMPT, TokenUsage, run_chat
 from app.models.model_agent import Agent
 from app.models.model_gameworld import GameWorld
 
-openai_model = settings.open_ai_model
-
-PERSONALITY_FILE = Path("./data/personalities_parsing.json")
-
 
 async def ensure_personality_prompts(personalities: list[str]) -> dict:
     """Ensure prompt texts exist for the given personalities."""
-    PERSONALITY_FILE.parent.mkdir(parents=True, exist_ok=True)
-    if PERSONALITY_FILE.is_file():
-        with open(PERSONALITY_FILE) as f:
-            data = json.load(f)
-    else:
-        data = {}
-
-    llm = ChatOpenAI(api_key=settings.openai_api_key or "sk-test", model=openai_model)
-    prompt = ChatPromptTemplate.from_messages([
-        (
-            "system",
-            "Write one short sentence that describes how text should sound when using this personality.",
-        ),
-        ("user", "{personality}"),
-    ])
-    chain = prompt | llm
-
-    updated = False
-    for p in personalities:
-        key = p.strip()
-        if not key or key in data:
-            continue
-        try:
-            resp = await chain.ainvoke({"personality": key})
-            text = resp.content.strip()
-        except Exception:
-            text = f"Write with a {key} tone."
-        data[key] = f"{key} = {text}"
-        updated = True
-
-    if updated:
-        with open(PERSONALITY_FILE, "w") as f:
-            json.dump(data, f, indent=2)
+    return await crud_personality.get_store().get(personalities)
 
-    return data
 
-
-async def chat_with_agent(
+async def build_agent_chat(
     session: AsyncSession,
     agent_id: int,
     messages: list[dict],
     n_results: int = 5,
     user_nickname: str | None = None,
-) -> dict:
-    """Return a chat response and source links using OpenAI with world and agent context."""
+) -> tuple[list[BaseMessage], list[dict]]:
+    """Retrieve context and build the prompt chain for the last user message.
+
+    Returns ``(messages, sources)``; send the messages with ``run_chat`` or
+    stream them from ``get_chat_model()``.
+    """
 
     agent = await session.get(Agent, agent_id)
     if not agent or agent.vector_db_update_date is None:
@@ -76,7 +37,7 @@ async def chat_with_agent(
     # print (f" - AGENT CHAT: {agent.name}")
 
     query = messages[-1].get("content", "") if messages else ""
-    docs = crud_vectordb.query_world(agent.world_id, query, n_results)
+    docs = await crud_vectordb.aquery_world(agent.world_id, query, n_results)
     world = await session.get(GameWorld, agent.world_id)
     # print (f" ---- Querry: {query}")
     # print (f" ---- Docs: {docs}")    
@@ -125,27 +86,30 @@ async def chat_with_agent(
 
     # print (f" ---- system_prompt: {system_prompt}") 
 
-    prompt = ChatPromptTemplate.from_messages(
-        [
-            ("system", system_prompt),
-            ("system", f"Context:\n{context}" if context else "Context: none"),
-            ("system", f"Chat history:\n{history_txt}" if history_txt else "Chat history: none"),
-            ("user", "{input}"),
-        ]
+    prompt_messages = CHAT_PROMPT.format_messages(
+        system=system_prompt,
+        context=f"Context:\n{context}" if context else "Context: none",
+        history=f"Chat history:\n{history_txt}" if history_txt else "Chat history: none",
+        input=query,
     )
+    return prompt_messages, sources
 
-    llm = ChatOpenAI(api_key=settings.openai_api_key or "sk-test", model=openai_model)
-    chain = prompt | llm
 
-    builder = Graph()
-    builder.add_node("chat", chain)
-    builder.set_entry_point("chat")
-    builder.set_finish_point("chat")
-    graph = builder.compile()
-
-    response = await graph.ainvoke({"input": query})
-    answer = getattr(response, "content", str(response))
+async def chat_with_agent(
+    session: AsyncSession,
+    agent_id: int,
+    messages: list[dict],
+    n_results: int = 5,
+    user_nickname: str | None = None,
+    usage: TokenUsage | None = None,
+    stage: str = "chat",
+) -> dict:
+    """Return a chat response and source links using OpenAI with world and agent context."""
+    prompt_messages, sources = await build_agent_chat(
+        session, agent_id, messages, n_results, user_nickname=user_nickname
+    )
 
+    answer = await run_chat(prompt_messages, usage=usage, stage=stage)
     return {"answer": answer, "sources": sources}
 
 
@@ -2,6 +2,7 @@ import os, json, io, zipfile, shutil, tempfile
 from sqlmodel import SQLModel, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.crud.crud_page import reindex_pages
 from app.models import model_agent, model_characteristic, model_concept, model_gameworld, model_page, model_specialist_source, model_user
 
 MODELS = [
@@ -50,6 +51,8 @@ async def import_backup_zip(session: AsyncSession, file, uploads_dir: str = 'upl
         if os.path.exists(extracted_uploads):
             shutil.move(extracted_uploads, uploads_dir)
         # clear tables
+        await session.execute(model_page.PageToken.__table__.delete())
+        await session.execute(model_page.PageLink.__table__.delete())
         for model in MODELS[::-1]:
             await session.execute(model.__table__.delete())
         # insert rows
@@ -59,3 +62,4 @@ async def import_backup_zip(session: AsyncSession, file, uploads_dir: str = 'upl
                 obj = model(**row)
                 session.add(obj)
         await session.commit()
+        await reindex_pages(session)
@@ -81,6 +81,21 @@ async def get_characteristics_for_concept(session: AsyncSession, concept_id: int
     return [row[1] for row in result.all()]
 
 
+async def get_characteristics_for_concepts(session: AsyncSession, concept_ids):
+    # Same as get_characteristics_for_concept for several concepts in one query
+    stmt = (
+        select(ConceptCharacteristicLink, Characteristic)
+        .join(Characteristic, ConceptCharacteristicLink.characteristic_id == Characteristic.id)
+        .where(ConceptCharacteristicLink.concept_id.in_(list(concept_ids)))
+        .order_by(ConceptCharacteristicLink.order)
+    )
+    result = await session.execute(stmt)
+    by_concept = {cid: [] for cid in concept_ids}
+    for link, characteristic in result.all():
+        by_concept[link.concept_id].append(characteristic)
+    return by_concept
+
+
 async def update_concept_characteristic_link(
     session,
     concept_id: int,
@@ -1,41 +1,191 @@
+import asyncio
 import json
-import os
+import logging
+import re
+from datetime import datetime, timedelta, timezone
+from glob import glob
 from pathlib import Path
+from typing import Optional
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.config import settings
+from app.models.model_chat import ChatMessage
+
+logger = logging.getLogger(__name__)
+
+
+def _as_dict(msg: ChatMessage) -> dict:
+    data = {"role": msg.role, "content": msg.content}
+    if msg.sources:
+        data["sources"] = msg.sources
+    return data
+
+
+async def load_history(
+    session: AsyncSession,
+    user_id: int,
+    agent_id: int,
+    limit: int = 20,
+) -> list[dict]:
+    """Return the last ``limit`` messages between a user and an agent, oldest first."""
+    result = await session.execute(
+        select(ChatMessage)
+        .where(ChatMessage.user_id == user_id, ChatMessage.agent_id == agent_id)
+        .order_by(ChatMessage.created_at.desc(), ChatMessage.id.desc())
+        .limit(limit)
+    )
+    return [_as_dict(m) for m in reversed(result.scalars().all())]
+
+
+async def append_message(
+    session: AsyncSession,
+    user_id: int,
+    agent_id: int,
+    role: str,
+    content: str,
+    sources: list[dict] | None = None,
+) -> ChatMessage:
+    """Store one message."""
+    msg = ChatMessage(
+        user_id=user_id, agent_id=agent_id, role=role, content=content, sources=sources or None
+    )
+    session.add(msg)
+    await session.commit()
+    return msg
+
 
+async def record_exchange(
+    session: AsyncSession,
+    user_id: int,
+    agent_id: int,
+    user_msg: dict,
+    answer: str,
+    sources: list[dict] | None = None,
+) -> None:
+    """Store a question and its answer."""
+    now = datetime.now(timezone.utc)
+    session.add_all([
+        ChatMessage(
+            user_id=user_id, agent_id=agent_id, role=user_msg.get("role", "user"),
+            content=user_msg.get("content", ""), created_at=now,
+        ),
+        ChatMessage(
+            user_id=user_id, agent_id=agent_id, role="assistant",
+            content=answer, sources=sources or None, created_at=now,
+        ),
+    ])
+    await session.commit()
 
-def _history_path(user_id: int, agent_id: int) -> Path:
-    base = settings.chat_history_dir.format(user_id=user_id)
-    path = Path(base)
-    path.mkdir(parents=True, exist_ok=True)
-    return path / f"{agent_id}.json"
 
+async def clear_history(session: AsyncSession, user_id: int, agent_id: int) -> None:
+    """Delete chat history for a user and agent."""
+    await session.execute(
+        delete(ChatMessage).where(ChatMessage.user_id == user_id, ChatMessage.agent_id == agent_id)
+    )
+    await session.commit()
 
-def load_history(user_id: int, agent_id: int) -> list[dict]:
-    """Load chat history for a user and agent."""
-    file_path = _history_path(user_id, agent_id)
-    if file_path.is_file():
+
+async def prune_history(
+    session: AsyncSession,
+    keep: Optional[int] = None,
+    max_age_days: Optional[int] = None,
+) -> int:
+    """Apply the retention policy, returns the number of deleted messages.
+
+    Keeps the newest ``keep`` messages of every conversation and drops
+    messages older than ``max_age_days`` (``None`` disables either rule).
+    """
+    keep = settings.chat_history_keep if keep is None else keep
+    max_age_days = settings.chat_history_max_age_days if max_age_days is None else max_age_days
+    deleted = 0
+    if max_age_days:
+        cutoff = datetime.now(timezone.utc) - timedelta(days=max_age_days)
+        result = await session.execute(delete(ChatMessage).where(ChatMessage.created_at < cutoff))
+        deleted += result.rowcount or 0
+    if keep:
+        ranked = select(
+            ChatMessage.id,
+            func.row_number().over(
+                partition_by=(ChatMessage.user_id, ChatMessage.agent_id),
+                order_by=(ChatMessage.created_at.desc(), ChatMessage.id.desc()),
+            ).label("rn"),
+        ).subquery()
+        result = await session.execute(
+            delete(ChatMessage).where(
+                ChatMessage.id.in_(select(ranked.c.id).where(ranked.c.rn > keep))
+            )
+        )
+        deleted += result.rowcount or 0
+    await session.commit()
+    return deleted
+
+
+async def retention_loop(session_maker, interval: Optional[int] = None) -> None:
+    """Run ``prune_history`` forever, every ``interval`` seconds."""
+    interval = interval or settings.chat_history_prune_interval
+    while True:
         try:
-            with open(file_path, "r") as f:
-                return json.load(f)
+            async with session_maker() as session:
+                deleted = await prune_history(session)
+            if deleted:
+                logger.info("Pruned %d chat messages", deleted)
         except Exception:
-            return []
-    return []
+            logger.exception("Chat history pruning failed")
+        await asyncio.sleep(interval)
 
 
-def save_history(user_id: int, agent_id: int, messages: list[dict]) -> None:
-    """Save chat history for a user and agent."""
-    file_path = _history_path(user_id, agent_id)
-    with open(file_path, "w") as f:
-        json.dump(messages, f)
+def json_history_files() -> list[tuple[int, int, Path]]:
+    """``(user_id, agent_id, path)`` of the legacy per-user JSON history files."""
+    prefix, _, suffix = settings.chat_history_dir.partition("{user_id}")
+    pattern = re.compile(re.escape(prefix) + r"(\d+)" + re.escape(suffix) + r"[/\\](\d+)\.json$")
+    files = []
+    for path in glob(settings.chat_history_dir.format(user_id="*") + "/*.json"):
+        match = pattern.search(path)
+        if match:
+            files.append((int(match.group(1)), int(match.group(2)), Path(path)))
+    return files
 
 
-def clear_history(user_id: int, agent_id: int) -> None:
-    """Delete chat history for a user and agent if it exists."""
-    file_path = _history_path(user_id, agent_id)
-    if file_path.is_file():
+def import_json_history(conn) -> list[Path]:
+    """One-shot migration of the JSON history files into ``chat_message``.
+
+    Runs on a sync connection from ``init_db`` and returns the imported
+    files; pass them to ``mark_imported`` once the transaction is committed
+    so they are not picked up again.
+    """
+    rows = []
+    files = []
+    base = datetime.now(timezone.utc) - timedelta(seconds=1)
+    for user_id, agent_id, path in json_history_files():
         try:
-            file_path.unlink()
-        except Exception:
-            pass
+            messages = json.loads(path.read_text())
+        except (OSError, ValueError):
+            logger.warning("Skipping unreadable chat history %s", path)
+            continue
+        files.append(path)
+        n = len(messages)
+        for i, m in enumerate(messages):
+            if not isinstance(m, dict):
+                continue
+            rows.append({
+                "user_id": user_id,
+                "agent_id": agent_id,
+                "role": m.get("role", "user"),
+                "content": m.get("content", ""),
+                "sources": m.get("sources") or None,
+                # keep the file's order
+                "created_at": base - timedelta(microseconds=n - i),
+            })
+    if rows:
+        conn.execute(ChatMessage.__table__.insert(), rows)
+    if files:
+        logger.info("Importing %d chat messages from %d history files", len(rows), len(files))
+    return files
+
+
+def mark_imported(files: list[Path]) -> None:
+    """Rename imported history files to ``*.json.imported``."""
+    for path in files:
+        path.rename(path.with_name(path.name + ".imported"))
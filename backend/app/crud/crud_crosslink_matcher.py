@@ -0,0 +1,210 @@
+import re
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from bs4 import BeautifulSoup, NavigableString
+
+
+def page_url(page) -> str:
+    return f"/worlds/{page.gameworld_id}/concept/{page.concept_id}/page/{page.id}"
+
+
+def _fold(text: str) -> str:
+    """Lowercase ``text`` character by character so indices stay aligned."""
+    out = []
+    for ch in text:
+        low = ch.lower()
+        out.append(low if len(low) == 1 else ch)
+    return "".join(out)
+
+
+def _is_word(ch: str) -> bool:
+    return ch.isalnum() or ch == "_"
+
+
+def _boundary(text: str, pos: int, seg_start: int, seg_end: int) -> bool:
+    """Emulate ``\\b`` at ``pos`` inside the segment ``text[seg_start:seg_end]``."""
+    left = _is_word(text[pos - 1]) if pos > seg_start else False
+    right = _is_word(text[pos]) if pos < seg_end else False
+    return left != right
+
+
+class CrosslinkMatcher:
+    """Aho-Corasick automaton over the crosslinkable page names of a world.
+
+    Built once from the candidate pages and reused for every document, it
+    finds all name occurrences in a single pass over the text nodes. Names
+    keep the priority order of the pages they came from (first page wins for
+    a duplicated name), which is the order the links are resolved in.
+    """
+
+    def __init__(self, pages: Iterable):
+        self.names: List[str] = []
+        self.targets: List[list] = []
+        index: Dict[str, int] = {}
+        for p in pages:
+            if not p.name:
+                continue
+            key = p.name.lower()
+            if key not in index:
+                index[key] = len(self.names)
+                self.names.append(key)
+                self.targets.append([])
+            self.targets[index[key]].append(p)
+
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[Tuple[int, int]]] = [[]]
+        for pid, key in enumerate(self.names):
+            folded = _fold(key)
+            node = 0
+            for ch in folded:
+                nxt = self._goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[node][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                node = nxt
+            self._out[node].append((pid, len(folded)))
+        self._build_fail_links()
+
+    def _build_fail_links(self) -> None:
+        queue = list(self._goto[0].values())
+        head = 0
+        while head < len(queue):
+            node = queue[head]
+            head += 1
+            for ch, nxt in self._goto[node].items():
+                queue.append(nxt)
+                f = self._fail[node]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                cand = self._goto[f].get(ch, 0)
+                self._fail[nxt] = cand if cand != nxt else 0
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def target_for(self, name_id: int, exclude_page_id: Optional[int] = None):
+        for p in self.targets[name_id]:
+            if p.id != exclude_page_id:
+                return p
+        return None
+
+    def find_all(self, text: str) -> List[Tuple[int, int, int]]:
+        """Return every ``(start, end, name_id)`` occurrence in ``text``."""
+        goto, fail, out = self._goto, self._fail, self._out
+        found = []
+        node = 0
+        for i, ch in enumerate(_fold(text)):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for pid, length in out[node]:
+                found.append((i + 1 - length, i + 1, pid))
+        return found
+
+
+def link_html(
+    html: str | None,
+    matcher: CrosslinkMatcher,
+    exclude_page_id: Optional[int] = None,
+) -> Tuple[str, bool]:
+    """Link the first unlinked occurrence of every page name in ``html``.
+
+    Names that already have a link (same href or same anchor text) are
+    skipped, and text inside ``<a>`` elements is never touched.
+    """
+    soup = BeautifulSoup(html or "", "html.parser")
+    if not len(matcher):
+        return str(soup), False
+
+    linked_hrefs = set()
+    linked_texts = set()
+    for a in soup.find_all("a", href=True):
+        linked_hrefs.add(a.get("href"))
+        linked_texts.add(a.get_text(strip=True).lower())
+
+    nodes = [el for el in soup.find_all(string=True) if not el.find_parent("a")]
+
+    # One automaton pass over every text node, grouping hits by name.
+    hits: Dict[int, List[Tuple[int, int, int]]] = {}
+    for idx, node in enumerate(nodes):
+        for start, end, name_id in matcher.find_all(str(node)):
+            hits.setdefault(name_id, []).append((idx, start, end))
+
+    # Resolve in name priority order; each chosen link splits its text node,
+    # so later names may only match inside the remaining segments.
+    chosen: Dict[int, List[Tuple[int, int, object]]] = {}
+    for name_id in sorted(hits):
+        target = matcher.target_for(name_id, exclude_page_id)
+        if target is None:
+            continue
+        if page_url(target) in linked_hrefs or matcher.names[name_id] in linked_texts:
+            continue
+        for idx, start, end in sorted(hits[name_id]):
+            spans = chosen.get(idx, [])
+            pos = bisect_left(spans, (start,))
+            seg_start = spans[pos - 1][1] if pos else 0
+            seg_end = spans[pos][0] if pos < len(spans) else len(nodes[idx])
+            if start < seg_start or end > seg_end:
+                continue
+            text = str(nodes[idx])
+            if not (
+                _boundary(text, start, seg_start, seg_end)
+                and _boundary(text, end, seg_start, seg_end)
+            ):
+                continue
+            spans.insert(pos, (start, end, target))
+            chosen[idx] = spans
+            break
+
+    if not chosen:
+        return str(soup), False
+
+    for idx, spans in chosen.items():
+        node = nodes[idx]
+        text = str(node)
+        pieces = []
+        cursor = 0
+        for start, end, target in spans:
+            if start > cursor:
+                pieces.append(NavigableString(text[cursor:start]))
+            a = soup.new_tag("a", href=page_url(target))
+            a["class"] = "wiki-link"
+            a["title"] = target.name
+            a.string = text[start:end]
+            pieces.append(a)
+            cursor = end
+        if cursor < len(text):
+            pieces.append(NavigableString(text[cursor:]))
+        node.replace_with(*pieces)
+
+    return str(soup), True
+
+
+_TOKEN_RE = re.compile(r"\w+")
+CROSSLINK_RE = re.compile(r"/worlds/\d+/concept/\d+/page/(\d+)\b")
+
+
+def name_tokens(name: str) -> set[str]:
+    """Return the word tokens a page name is made of."""
+    return set(_TOKEN_RE.findall(_fold(name or "")))
+
+
+def analyze_html(html: str | None) -> Tuple[set[str], set[int]]:
+    """Return the word tokens and the linked page ids of an HTML fragment."""
+    if not html:
+        return set(), set()
+    soup = BeautifulSoup(html, "html.parser")
+    tokens = set(_TOKEN_RE.findall(_fold(soup.get_text(" "))))
+    targets = set()
+    for a in soup.find_all("a", href=True):
+        m = CROSSLINK_RE.search(a["href"])
+        if m:
+            targets.add(int(m.group(1)))
+    return tokens, targets
+
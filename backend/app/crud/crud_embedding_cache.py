@@ -0,0 +1,182 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from typing import Dict, List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+from app.cache import TTLCache
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """SQLite store of embedding vectors keyed by ``(model, sha256(text))``.
+
+    Vectors are stored as float32 blobs. ``last_used`` is refreshed on every
+    hit and once the store holds more than ``max_entries`` vectors the least
+    recently used ones are evicted. The connection is opened lazily (and
+    reopened after a fork) so Celery workers and the API can share the file.
+    """
+
+    def __init__(self, path: str, max_entries: int = 200_000):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None or self._pid != os.getpid():
+            if self.path != ":memory:":
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embedding ("
+                " model TEXT NOT NULL,"
+                " hash TEXT NOT NULL,"
+                " vector BLOB NOT NULL,"
+                " last_used REAL NOT NULL,"
+                " PRIMARY KEY (model, hash))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_embedding_last_used ON embedding (last_used)")
+            conn.commit()
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+    def get_many(self, model: str, hashes: List[str]) -> Dict[str, List[float]]:
+        found: Dict[str, List[float]] = {}
+        if not hashes:
+            return found
+        unique = list(dict.fromkeys(hashes))
+        with self._lock:
+            conn = self._connect()
+            # stay below SQLite's bound-parameter limit
+            for i in range(0, len(unique), 500):
+                part = unique[i : i + 500]
+                marks = ",".join("?" * len(part))
+                rows = conn.execute(
+                    f"SELECT hash, vector FROM embedding WHERE model = ? AND hash IN ({marks})",
+                    [model, *part],
+                ).fetchall()
+                for digest, blob in rows:
+                    vec = array("f")
+                    vec.frombytes(blob)
+                    found[digest] = vec.tolist()
+            if found:
+                now = time.time()
+                conn.executemany(
+                    "UPDATE embedding SET last_used = ? WHERE model = ? AND hash = ?",
+                    [(now, model, digest) for digest in found],
+                )
+                conn.commit()
+        return found
+
+    def put_many(self, model: str, items: Dict[str, List[float]]) -> None:
+        if not items:
+            return
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.executemany(
+                "INSERT OR REPLACE INTO embedding (model, hash, vector, last_used) VALUES (?, ?, ?, ?)",
+                [(model, digest, array("f", vec).tobytes(), now) for digest, vec in items.items()],
+            )
+            self._evict(conn)
+            conn.commit()
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        if self.max_entries <= 0:
+            return
+        (count,) = conn.execute("SELECT COUNT(*) FROM embedding").fetchone()
+        excess = count - self.max_entries
+        if excess > 0:
+            conn.execute(
+                "DELETE FROM embedding WHERE rowid IN"
+                " (SELECT rowid FROM embedding ORDER BY last_used LIMIT ?)",
+                (excess,),
+            )
+
+    def __len__(self) -> int:
+        with self._lock:
+            (count,) = self._connect().execute("SELECT COUNT(*) FROM embedding").fetchone()
+        return count
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "entries": len(self),
+            "max_entries": self.max_entries,
+        }
+
+
+def normalize_query(text: str) -> str:
+    return " ".join(text.split()).casefold()
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper that only runs the model for texts not in ``cache``.
+
+    Queries don't go to the disk store (they would only churn it) but to
+    the in-memory ``query_cache``, keyed by the normalised query text, so
+    repeated chat questions skip the model.
+    """
+
+    def __init__(
+        self,
+        base: Embeddings,
+        cache: EmbeddingCache,
+        model: str,
+        query_cache: Optional[TTLCache] = None,
+    ):
+        self.base = base
+        self.cache = cache
+        self.model = model
+        self.query_cache = query_cache
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        hashes = [text_hash(t) for t in texts]
+        found = self.cache.get_many(self.model, hashes)
+
+        missing: Dict[str, str] = {}
+        for digest, text in zip(hashes, texts):
+            if digest not in found and digest not in missing:
+                missing[digest] = text
+        # repeated texts within the batch are only embedded once
+        self.cache.misses += len(missing)
+        self.cache.hits += len(texts) - len(missing)
+
+        if missing:
+            vectors = self.base.embed_documents(list(missing.values()))
+            computed = dict(zip(missing.keys(), vectors))
+            self.cache.put_many(self.model, computed)
+            found.update(computed)
+        return [found[d] for d in hashes]
+
+    def lookup_query(self, text: str) -> Optional[List[float]]:
+        """Return the cached embedding of a query, if any (no model call)."""
+        if self.query_cache is None:
+            return None
+        return self.query_cache.get(normalize_query(text))
+
+    def compute_query(self, text: str) -> List[float]:
+        vector = self.base.embed_query(text)
+        if self.query_cache is not None:
+            self.query_cache.set(normalize_query(text), vector)
+        return vector
+
+    def embed_query(self, text: str) -> List[float]:
+        vector = self.lookup_query(text)
+        return vector if vector is not None else self.compute_query(text)
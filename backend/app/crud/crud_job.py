@@ -0,0 +1,220 @@
+import asyncio
+import json
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Sequence
+from uuid import uuid4
+
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import job_events
+from app.config import settings
+from app.models.model_job import Job
+
+logger = logging.getLogger(__name__)
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _iso(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value else None
+
+
+def _jsonable(data: Optional[dict]) -> dict:
+    # results may hold model dumps with datetimes
+    return json.loads(json.dumps(data or {}, default=str))
+
+
+def _merged_result(updates: Optional[dict]):
+    # Merge in SQL, so concurrent writers never drop each other's keys
+    return func.json_patch(func.coalesce(Job.result, "{}"), json.dumps(_jsonable(updates)))
+
+
+def job_to_dict(job: Job) -> dict:
+    """Flat status dict, in the shape the job files used to have."""
+    data = {**(job.payload or {}), **(job.progress or {}), **(job.result or {})}
+    data.update(
+        job_id=job.id,
+        job_type=job.type,
+        agent_id=job.agent_id,
+        status=job.status,
+        created_at=_iso(job.created_at),
+    )
+    if job.started_at:
+        data["start_time"] = _iso(job.started_at)
+    if job.finished_at:
+        data["end_time"] = _iso(job.finished_at)
+    if job.error:
+        data["error"] = job.error
+    return data
+
+
+async def create_job(
+    session: AsyncSession,
+    job_type: str,
+    agent_id: Optional[int] = None,
+    payload: Optional[dict] = None,
+) -> Job:
+    job = Job(id=uuid4().hex, type=job_type, agent_id=agent_id, payload=_jsonable(payload))
+    session.add(job)
+    await session.commit()
+    return job
+
+
+async def get_job(session: AsyncSession, job_id: str, job_types: Optional[Sequence[str]] = None) -> Optional[Job]:
+    job = await session.get(Job, job_id)
+    if job is None or (job_types and job.type not in job_types):
+        return None
+    return job
+
+
+async def list_jobs(
+    session: AsyncSession,
+    job_types: Optional[Sequence[str]] = None,
+    agent_id: Optional[int] = None,
+    status: Optional[str] = None,
+    before: Optional[datetime] = None,
+    limit: int = 50,
+    offset: int = 0,
+) -> list[Job]:
+    """Newest jobs first. Pass the ``created_at`` of the last job as ``before``
+    to page without an offset scan."""
+    stmt = select(Job)
+    if job_types:
+        stmt = stmt.where(Job.type.in_(job_types))
+    if agent_id is not None:
+        stmt = stmt.where(Job.agent_id == agent_id)
+    if status:
+        stmt = stmt.where(Job.status == status)
+    if before:
+        stmt = stmt.where(Job.created_at < before)
+    stmt = stmt.order_by(Job.created_at.desc()).offset(offset).limit(limit)
+    result = await session.execute(stmt)
+    return list(result.scalars().all())
+
+
+async def _set(session: AsyncSession, job_id: str, **values) -> None:
+    # One UPDATE statement per report, so concurrent readers never see a
+    # half written status.
+    await session.execute(update(Job).where(Job.id == job_id).values(**values))
+    await session.commit()
+
+
+async def start_job(session: AsyncSession, job_id: str, progress: Optional[dict] = None) -> None:
+    await _set(session, job_id, status="processing", started_at=_now(), progress=_jsonable(progress))
+
+
+async def report_progress(session: AsyncSession, job_id: str, progress: dict) -> None:
+    await _set(session, job_id, progress=_jsonable(progress))
+
+
+async def finish_job(session: AsyncSession, job_id: str, result: Optional[dict] = None) -> None:
+    now = _now()
+    await _set(
+        session, job_id, status="done", result=_merged_result(result), finished_at=now,
+        expires_at=now + timedelta(days=settings.job_ttl_days),
+    )
+
+
+async def fail_job(session: AsyncSession, job_id: str, error: str) -> None:
+    now = _now()
+    await _set(
+        session, job_id, status="error", error=error, finished_at=now,
+        expires_at=now + timedelta(days=settings.job_ttl_days),
+    )
+
+
+async def update_job_result(session: AsyncSession, job_id: str, updates: dict) -> Optional[Job]:
+    """Merge client side updates (e.g. ``action_needed``) into the result."""
+    updated = await session.execute(
+        update(Job).where(Job.id == job_id).values(result=_merged_result(updates))
+    )
+    await session.commit()
+    if not updated.rowcount:
+        return None
+    return await session.get(Job, job_id, populate_existing=True)
+
+
+async def purge_expired(session: AsyncSession) -> int:
+    result = await session.execute(delete(Job).where(Job.expires_at < _now()))
+    await session.commit()
+    return result.rowcount or 0
+
+
+async def expiry_loop(session_maker, interval: Optional[int] = None) -> None:
+    """Delete expired jobs every ``interval`` seconds."""
+    interval = interval or settings.job_purge_interval
+    while True:
+        try:
+            async with session_maker() as session:
+                purged = await purge_expired(session)
+            if purged:
+                logger.info("Purged %d expired jobs", purged)
+        except Exception:
+            logger.exception("Job purge failed")
+        await asyncio.sleep(interval)
+
+
+class JobReporter:
+    """Status writes of a running job, each in its own short transaction so
+    they never interfere with the session doing the actual work. Every
+    write is also published to the job's event stream."""
+
+    def __init__(self, job_id: str, session_maker=None):
+        if session_maker is None:
+            from app.database import async_session_maker as session_maker
+        self.job_id = job_id
+        self._session_maker = session_maker
+        self._pending: Optional[asyncio.Task] = None
+
+    async def start(self, **progress) -> None:
+        async with self._session_maker() as session:
+            await start_job(session, self.job_id, progress)
+        await job_events.publish(
+            self.job_id, "status", {"status": "processing", "start_time": _iso(_now()), **_jsonable(progress)}
+        )
+
+    async def progress(self, **progress) -> None:
+        async with self._session_maker() as session:
+            await report_progress(session, self.job_id, progress)
+        await job_events.publish(self.job_id, "progress", _jsonable(progress))
+
+    def progress_nowait(self, **progress) -> None:
+        """For synchronous progress callbacks: queue the write behind the
+        previous ones so reports land in order."""
+        previous = self._pending
+
+        async def write():
+            if previous:
+                await previous
+            try:
+                await self.progress(**progress)
+            except Exception:
+                logger.exception("Progress report for job %s failed", self.job_id)
+
+        self._pending = asyncio.get_running_loop().create_task(write())
+
+    async def flush(self) -> None:
+        if self._pending:
+            await self._pending
+
+    async def done(self, **result) -> None:
+        await self.flush()
+        async with self._session_maker() as session:
+            await finish_job(session, self.job_id, result)
+        await job_events.publish(
+            self.job_id, "done", {"status": "done", "end_time": _iso(_now()), **_jsonable(result)}
+        )
+        await job_events.close_publisher()
+
+    async def error(self, message: str) -> None:
+        await self.flush()
+        async with self._session_maker() as session:
+            await fail_job(session, self.job_id, message)
+        await job_events.publish(
+            self.job_id, "error", {"status": "error", "end_time": _iso(_now()), "error": message}
+        )
+        await job_events.close_publisher()
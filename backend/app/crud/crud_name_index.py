@@ -0,0 +1,282 @@
+"""Fuzzy page-name lookups for a world.
+
+``NameIndex`` answers "which page is this name?" without comparing the name
+against every page: an exact map of canonical names, a prefix trie and a
+character trigram index whose (bounded) candidates are rescored with
+``SequenceMatcher``. Indexes are cached per world and rebuilt when a page is
+created, renamed or deleted (in this process, or in another one, which the
+cheap ``_stamp`` query notices).
+"""
+import heapq
+import unicodedata
+from collections import Counter
+from difflib import SequenceMatcher
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.model_page import Page
+
+TITLES = {"lord", "lady", "sir", "dame", "mr", "mrs", "ms"}
+
+# fuzzy candidates rescored per lookup at most, the ones sharing the most trigrams
+MAX_CANDIDATES = 256
+
+
+def normalize(text: str) -> str:
+    """Return a lowercase version of the text without diacritics and extra spaces."""
+    text = unicodedata.normalize("NFD", text or "")
+    text = "".join(c for c in text if unicodedata.category(c) != "Mn")
+    return " ".join(text.lower().split())
+
+
+def canonical(name: str) -> str:
+    """Return a normalized version of the name without honorifics."""
+    return " ".join(w for w in normalize(name).split() if w not in TITLES)
+
+
+def _trigrams(text: str, padded: bool = True) -> set[str]:
+    if padded:
+        text = f"  {text} "
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class _Node:
+    __slots__ = ("children", "order", "best")
+
+    def __init__(self):
+        self.children: Dict[str, "_Node"] = {}
+        self.order: Optional[int] = None  # order of the key ending here
+        self.best: Optional[int] = None  # lowest order in this subtree
+
+
+class PrefixTrie:
+    """Ordered keys; finds the earliest key that is a prefix of, or starts
+    with, a query in O(len(query))."""
+
+    def __init__(self):
+        self._root = _Node()
+        self._keys: Dict[int, str] = {}
+        self._next = 0
+
+    def __contains__(self, key: str) -> bool:
+        path = self._path(key)
+        return path is not None and path[-1].order is not None
+
+    def _path(self, key: str) -> Optional[List[_Node]]:
+        node = self._root
+        path = [node]
+        for ch in key:
+            node = node.children.get(ch)
+            if node is None:
+                return None
+            path.append(node)
+        return path
+
+    @staticmethod
+    def _refresh(node: _Node) -> None:
+        orders = [c.best for c in node.children.values()] + [node.order]
+        orders = [o for o in orders if o is not None]
+        node.best = min(orders) if orders else None
+
+    def add(self, key: str, order: int) -> None:
+        node = self._root
+        path = [node]
+        for ch in key:
+            node = node.children.setdefault(ch, _Node())
+            path.append(node)
+        if node.order is not None:
+            del self._keys[node.order]
+        node.order = order
+        self._keys[order] = key
+        self._next = max(self._next, order + 1)
+        for n in reversed(path):
+            self._refresh(n)
+
+    def append(self, key: str) -> None:
+        """Add ``key`` after every other key (moving it there if present)."""
+        self.add(key, self._next)
+
+    def remove(self, key: str) -> None:
+        path = self._path(key)
+        if not path or path[-1].order is None:
+            return
+        del self._keys[path[-1].order]
+        path[-1].order = None
+        for n in reversed(path):
+            self._refresh(n)
+
+    def first_related(self, key: str) -> Optional[Tuple[int, str]]:
+        """``(order, key)`` of the earliest key that ``key`` starts with or
+        that starts with ``key``."""
+        node = self._root
+        orders = []
+        for ch in key:
+            if node.order is not None:
+                orders.append(node.order)
+            node = node.children.get(ch)
+            if node is None:
+                break
+        else:
+            if node.best is not None:
+                orders.append(node.best)
+        if not orders:
+            return None
+        order = min(orders)
+        return order, self._keys[order]
+
+
+class NameIndex:
+    """Page names of one world, in page id order."""
+
+    def __init__(self, pages: Iterable[Tuple[int, str, Optional[int]]]):
+        self.ids: List[int] = []
+        self.keys: List[str] = []
+        self.concept_ids: List[Optional[int]] = []
+        self._concept_by_id: Dict[int, Optional[int]] = {}
+        # canonical name -> positions of its pages, and the id it resolves to
+        self._positions: Dict[str, List[int]] = {}
+        # lengths of the names, to look for names inside a longer value
+        self._lengths: set[int] = set()
+        self._exact: Dict[str, int] = {}
+        self._key_order: Dict[str, int] = {}
+        self._trie = PrefixTrie()
+        self._grams: Dict[str, List[int]] = {}
+        for page_id, name, concept_id in pages:
+            key = canonical(name)
+            pos = len(self.ids)
+            self.ids.append(page_id)
+            self.keys.append(key)
+            self.concept_ids.append(concept_id)
+            self._concept_by_id[page_id] = concept_id
+            self._positions.setdefault(key, []).append(pos)
+            self._lengths.add(len(key))
+            # the last page of a name wins, the name keeps its first position
+            self._exact[key] = page_id
+            if key not in self._key_order:
+                self._key_order[key] = pos
+                self._trie.add(key, pos)
+            for gram in _trigrams(key):
+                self._grams.setdefault(gram, []).append(pos)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def concept_of(self, page_id: int) -> Optional[int]:
+        return self._concept_by_id.get(page_id)
+
+    def _similar(self, key: str) -> List[int]:
+        """Positions (in page order) of the pages sharing enough trigrams
+        with ``key`` to possibly be similar to it."""
+        grams = _trigrams(key)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self._grams.get(gram, ()))
+        # a near-identical name shares most trigrams; when a very common
+        # prefix makes the set large, keep the best MAX_CANDIDATES of them
+        need = max(1, len(grams) // 3)
+        found = [pos for pos, n in shared.items() if n >= need]
+        if len(found) > MAX_CANDIDATES:
+            found = heapq.nlargest(MAX_CANDIDATES, found, key=shared.__getitem__)
+        return sorted(found)
+
+    @staticmethod
+    def _ratio_above(a: str, b: str, threshold: float) -> Optional[float]:
+        matcher = SequenceMatcher(None, a, b)
+        if matcher.real_quick_ratio() <= threshold or matcher.quick_ratio() <= threshold:
+            return None
+        ratio = matcher.ratio()
+        return ratio if ratio > threshold else None
+
+    def find_existing(self, name: str, threshold: float = 0.85) -> Optional[int]:
+        """The page a suggested name refers to: same canonical name, else
+        the first name (in page order) that is a prefix of it, starts with
+        it or is more than ``threshold`` similar."""
+        key = canonical(name)
+        if key in self._exact:
+            return self._exact[key]
+        related = self._trie.first_related(key)
+        best_order = related[0] if related else len(self.ids)
+        best_key = related[1] if related else None
+        for pos in self._similar(key):
+            other = self.keys[pos]
+            order = self._key_order[other]
+            if order < best_order and self._ratio_above(key, other, threshold) is not None:
+                best_order, best_key = order, other
+        return self._exact[best_key] if best_key is not None else None
+
+    def _containing(self, key: str) -> Iterable[int]:
+        """Positions whose name contains ``key``."""
+        grams = _trigrams(key, padded=False)
+        if not grams:
+            return (pos for pos, other in enumerate(self.keys) if key in other)
+        postings = sorted((set(self._grams.get(g, ())) for g in grams), key=len)
+        found = set.intersection(*postings)
+        return (pos for pos in found if key in self.keys[pos])
+
+    def find_page_id(
+        self, name: str, concept_id: Optional[int] = None, threshold: float = 0.8
+    ) -> Optional[int]:
+        """Resolve a page_ref value: the first page (of ``concept_id``) whose
+        name contains it or is contained in it, else the most similar name
+        above ``threshold``."""
+        if not name:
+            return None
+        target = canonical(name)
+
+        def allowed(pos: int) -> bool:
+            return bool(self.keys[pos]) and (concept_id is None or self.concept_ids[pos] == concept_id)
+
+        matches = {pos for pos in self._containing(target) if allowed(pos)}
+        # names contained in the value: only substrings as long as some name
+        n = len(target)
+        for length in self._lengths:
+            for sub in {target[i:i + length] for i in range(n - length + 1)}:
+                matches.update(pos for pos in self._positions.get(sub, ()) if allowed(pos))
+        if matches:
+            return self.ids[min(matches)]
+
+        best_pos, best_ratio = None, threshold
+        for pos in self._similar(target):
+            if not allowed(pos):
+                continue
+            ratio = self._ratio_above(target, self.keys[pos], best_ratio)
+            if ratio is not None:
+                best_pos, best_ratio = pos, ratio
+        return self.ids[best_pos] if best_pos is not None else None
+
+
+_indexes: Dict[int, Tuple[tuple, NameIndex]] = {}
+
+
+async def _stamp(session: AsyncSession, gameworld_id: int) -> tuple:
+    result = await session.execute(
+        select(func.count(Page.id), func.max(Page.id), func.max(Page.updated_at))
+        .where(Page.gameworld_id == gameworld_id)
+    )
+    return tuple(result.one())
+
+
+async def get_name_index(session: AsyncSession, gameworld_id: int) -> NameIndex:
+    """The world's name index, rebuilt only when its pages changed."""
+    stamp = await _stamp(session, gameworld_id)
+    cached = _indexes.get(gameworld_id)
+    if cached and cached[0] == stamp:
+        return cached[1]
+    result = await session.execute(
+        select(Page.id, Page.name, Page.concept_id)
+        .where(Page.gameworld_id == gameworld_id)
+        .order_by(Page.id)
+    )
+    index = NameIndex(result.all())
+    _indexes[gameworld_id] = (stamp, index)
+    return index
+
+
+def invalidate(gameworld_id: Optional[int] = None) -> None:
+    """Drop the cached index of a world (of every world if ``None``)."""
+    if gameworld_id is None:
+        _indexes.clear()
+    else:
+        _indexes.pop(gameworld_id, None)
@@ -1,57 +1,240 @@
+import asyncio
+import math
+import re
+from functools import partial
+from typing import Optional
+
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.models.model_agent import Agent
+from app.models.model_gameworld import GameWorld
 from app.crud.crud_agent import ensure_personality_prompts
 from app.api.api_agent import chat_with_agent  # For RAG context fetching!
 from app.config import settings
 
-from langchain_openai import ChatOpenAI
-from langchain_core.prompts import ChatPromptTemplate
-from langgraph.graph import Graph
+from langchain_core.messages import HumanMessage, SystemMessage
+from app.llm import TokenUsage, count_tokens, gather_limited, run_chat
 import textwrap
 
-def split_into_arcs(text, min_words_per_arc=1000, max_arcs=5):
-    words = text.split()
-    n_words = len(words)
-    if n_words <= min_words_per_arc:
-        return [" ".join(words)]
-    n_arcs = min((n_words + min_words_per_arc - 1) // min_words_per_arc, max_arcs)
-    arc_sizes = [n_words // n_arcs + (1 if i < n_words % n_arcs else 0) for i in range(n_arcs)]
-    arcs = []
-    start = 0
-    for size in arc_sizes:
-        arcs.append(" ".join(words[start:start+size]))
-        start += size
-    return arcs
+# Where an arc may end: a new speaker turn ("Gryx: ...", "[00:12] DM: ..."),
+# a paragraph, or better a scene change (separator line, heading, "Scene 2"
+# or two blank lines)
+SPEAKER_LINE = re.compile(r"^\s*(?:\[[^\]]*\]\s*)?[^\W\d_][\w .'\-]{0,40}:\s")
+SCENE_LINE = re.compile(r"^\s*(?:-{3,}|\*{3,}|={3,}|#{1,6}\s|(?:scene|cena|chapter|cap[ií]tulo)\b)", re.IGNORECASE)
+SENTENCE_END = re.compile(r"(?<=[.!?…])\s+")
+
+
+def _turns(text: str) -> list[tuple[str, bool]]:
+    """``(text, starts_scene)`` of the transcript's speaker turns and paragraphs."""
+    turns: list[tuple[list[str], bool]] = []
+    blank = 0
+    for line in text.splitlines():
+        if not line.strip():
+            blank += 1
+            continue
+        scene = blank >= 2 or bool(SCENE_LINE.match(line))
+        if not turns or scene or blank or SPEAKER_LINE.match(line):
+            turns.append(([line], scene))
+        else:
+            turns[-1][0].append(line)
+        blank = 0
+    return [("\n".join(lines), scene) for lines, scene in turns]
+
+
+def _split_long(text: str, size: float) -> list[str]:
+    """Cut a turn longer than an arc into pieces of about ``size`` tokens,
+    between sentences when possible."""
+    parts = []
+    for sentence in SENTENCE_END.split(text):
+        n = count_tokens(sentence)
+        if n <= size:
+            parts.append(sentence)
+            continue
+        words = sentence.split()
+        step = max(1, int(len(words) * size / n))
+        parts.extend(" ".join(words[i:i + step]) for i in range(0, len(words), step))
+    pieces, current, tokens = [], [], 0
+    for part in parts:
+        n = count_tokens(part)
+        if current and tokens + n > size:
+            pieces.append(" ".join(current))
+            current, tokens = [], 0
+        current.append(part)
+        tokens += n
+    if current:
+        pieces.append(" ".join(current))
+    return pieces
+
+
+def _pack(turns: list[tuple[str, int, bool]], target: float) -> list[str]:
+    limit = target * 1.25
+    arcs, current, tokens = [], [], 0
+    for text, n, scene in turns:
+        if current and (tokens + n > limit or tokens >= target or (scene and tokens >= 0.6 * target)):
+            arcs.append((current, tokens))
+            current, tokens = [], 0
+        current.append(text)
+        tokens += n
+    if current:
+        # a short tail joins the previous arc
+        if arcs and tokens < 0.25 * target and arcs[-1][1] + tokens <= limit:
+            arcs[-1] = (arcs[-1][0] + current, arcs[-1][1] + tokens)
+        else:
+            arcs.append((current, tokens))
+    return ["\n".join(lines) for lines, _ in arcs]
+
+
+def split_into_arcs(text: str, arc_tokens: Optional[int] = None, max_arcs: Optional[int] = None) -> list[str]:
+    """Split a transcript into arcs of about ``arc_tokens`` tokens.
+
+    Arcs end between speaker turns, preferably on a scene change. Longer
+    transcripts get more arcs, up to ``max_arcs``; past that the arcs grow.
+    """
+    arc_tokens = arc_tokens or settings.novel_arc_tokens
+    max_arcs = max_arcs or settings.novel_max_arcs
+    total = count_tokens(text)
+    if total <= arc_tokens:
+        return [text.strip()]
+    target = total / min(math.ceil(total / arc_tokens), max_arcs)
+    counted = [(turn, count_tokens(turn), scene) for turn, scene in _turns(text)]
+    while True:
+        turns = []
+        for turn, n, scene in counted:
+            if n <= target * 1.25:
+                turns.append((turn, n, scene))
+                continue
+            for i, piece in enumerate(_split_long(turn, target)):
+                turns.append((piece, count_tokens(piece), scene and i == 0))
+        arcs = _pack(turns, target)
+        if len(arcs) <= max_arcs:
+            return arcs
+        target *= 1.1
+
 
 async def langchain_chat_completion(
     system_prompt: str,
     user_prompt: str,
     temperature: float = 0.7,
     max_tokens: int = 2048,
+    usage: Optional[TokenUsage] = None,
+    stage: str = "chat",
 ):
-    llm = ChatOpenAI(
-        api_key=settings.openai_api_key,
-        model=settings.open_ai_model,
+    answer = await run_chat(
+        [SystemMessage(content=system_prompt), HumanMessage(content=user_prompt)],
         temperature=temperature,
         max_tokens=max_tokens,
+        usage=usage,
+        stage=stage,
     )
+    return answer.strip()
 
-    prompt = ChatPromptTemplate.from_messages([
-        ("system", system_prompt),
-        ("user", user_prompt),
-    ])
+SYNTHESIS_MAX_TOKENS = 4000
 
-    chain = prompt | llm
 
-    builder = Graph()
-    builder.add_node("chat", chain)
-    builder.set_entry_point("chat")
-    builder.set_finish_point("chat")
-    graph = builder.compile()
+def _final_prompt(previous_session_text: str, critic_notes: str, novels: str) -> str:
+    return ("You are a talented fantasy novelist. Combine and polish the following arcs into a single, seamless, concise fantasy novel chapter.\n"
+
+           +f"{previous_session_text}\n"
+
+        +f"Critic notes for each arc:\n"
+        +f"{critic_notes}\n"
+
+        +f"Novelized arcs:\n"
+        +f"{novels}\n"
+
+       +f" Instructions:\n"
+        +f"- Incorporate important world details where appropriate.\n"
+        +f"- Apply the critic's suggestions to improve narrative flow, character depth, and world consistency.\n"
+        +f"- You may invent brief dialogue lines or transitions if needed for story cohesion, as long as they do not contradict the story so far.\n"
+        +f"- Take in consideration what happened in the previous session! Make continuity with scenes, dialogues, events, and characters.\n"
+        +f"- The entire output must be **no more than 4000 words**.\n"
+        +f"- Eliminate repetition, awkward transitions, or extraneous detail.\n"
+       +f" - Make the final chapter emotionally engaging and easy to read.\n"
+        +f"- Format the output using valid HTML: wrap each paragraph in <p>. Use <h2>/<h3> for titles if relevant. Format dialogue as you would in a novel, with each line in its own <p> or <blockquote> if appropriate.\n"
+    )
+
+
+def _merge_prompt(previous_session_text: str, critic_notes: str, novels: str) -> str:
+    return ("You are a talented fantasy novelist. Merge the following consecutive novelized arcs into one continuous part of a fantasy novel chapter.\n"
+        +f"{previous_session_text}\n"
+        +f"Critic notes for each arc:\n"
+        +f"{critic_notes or '[Already applied]'}\n"
+        +f"Novelized arcs:\n"
+        +f"{novels}\n"
+        +f" Instructions:\n"
+        +f"- Keep every important event, character, and dialogue, in order; the part will be combined with the rest of the chapter later.\n"
+        +f"- Apply the critic's suggestions.\n"
+        +f"- Eliminate repetition and awkward transitions between the arcs.\n"
+        +f"- Write in the same language as the arcs, as plain paragraphs.\n"
+    )
+
+
+def _batches(parts: list[tuple[str, str]], budget: int) -> list[list[tuple[str, str]]]:
+    """Consecutive ``(novel, notes)`` parts grouped to fit ``budget`` tokens,
+    at least two per group so every pass shortens the list."""
+    batches, current, tokens = [], [], 0
+    for part in parts:
+        n = count_tokens(part[0]) + count_tokens(part[1])
+        if len(current) >= 2 and tokens + n > budget:
+            batches.append(current)
+            current, tokens = [], 0
+        current.append(part)
+        tokens += n
+    if len(current) == 1 and batches:
+        batches[-1].append(current[0])
+    elif current:
+        batches.append(current)
+    return batches
+
+
+async def synthesize(
+    tone: str,
+    previous_session_text: str,
+    arc_novels: list[str],
+    arc_critic_notes: list[str],
+    usage: Optional[TokenUsage] = None,
+) -> str:
+    """Combine the arcs into the chapter in one call when they fit in the
+    model's context, else merge consecutive arcs in passes (map-reduce)
+    until they do."""
+    overhead = count_tokens(tone) + count_tokens(
+        _final_prompt(previous_session_text, "", "") + _merge_prompt(previous_session_text, "", "")
+    )
+    budget = settings.llm_context_tokens - SYNTHESIS_MAX_TOKENS - overhead
+    parts = list(zip(arc_novels, arc_critic_notes))
+
+    def fits(parts) -> bool:
+        return sum(count_tokens(novel) + count_tokens(notes) for novel, notes in parts) <= budget
+
+    async def merge(batch: list[tuple[str, str]]) -> str:
+        return await langchain_chat_completion(
+            system_prompt=tone,
+            user_prompt=_merge_prompt(
+                previous_session_text,
+                "\n\n".join(notes for _, notes in batch if notes),
+                "\n\n".join(novel for novel, _ in batch),
+            ),
+            max_tokens=SYNTHESIS_MAX_TOKENS,
+            usage=usage,
+            stage="synthesis_merge",
+        )
+
+    while len(parts) > 1 and not fits(parts):
+        merged = await gather_limited(partial(merge, batch) for batch in _batches(parts, budget))
+        parts = [(novel, "") for novel in merged]
+
+    draft = await langchain_chat_completion(
+        system_prompt=tone,
+        user_prompt=_final_prompt(
+            previous_session_text,
+            "\n\n".join(notes for _, notes in parts if notes),
+            "\n\n".join(novel for novel, _ in parts),
+        ),
+        max_tokens=SYNTHESIS_MAX_TOKENS,
+        usage=usage,
+        stage="synthesis",
+    )
+    return draft.strip()
 
-    response = await graph.ainvoke({"input": ""})
-    answer = getattr(response, "content", str(response))
-    return answer.strip()
 
 async def create_novel(
     session: AsyncSession,
@@ -61,11 +244,18 @@ async def create_novel(
     previous_page_id: int | None = None,
     helper_agent_ids: list[int] | None = None,  # For RAG
     progress_cb=None,
+    usage: Optional[TokenUsage] = None,
 ) -> str:
     """
     Generate a novelized summary from transcript using LangChain LLM graph for all LLM calls,
     the in-db agent personality, and world context per arc.
+
+    Arcs are independent until the synthesis, so their RAG -> write ->
+    critique chains run concurrently (up to ``settings.llm_concurrency``).
+    ``progress_cb(done, total)`` counts finished arcs, then the synthesis.
+    Tokens spent are counted in ``usage`` per stage.
     """
+    usage = usage if usage is not None else TokenUsage()
     helper_agent_ids = helper_agent_ids or []
     rag_agent_id = helper_agent_ids[0] if helper_agent_ids else None
 
@@ -75,34 +265,51 @@ async def create_novel(
     tone = "\n".join(all_tones.get(p, "") for p in personalities if all_tones.get(p))
     tone = tone or "You are a creative, helpful fantasy novelist."
 
-    previous_summary = ""
+    # Loaded before anything runs concurrently, the arcs share this session
+    prev_text = None
     if previous_page_id:
         from app.crud import crud_page
         prev_page = await crud_page.get_page(session, previous_page_id)
         if prev_page:
             prev_text = (prev_page.content or "") + "\n" + (prev_page.autogenerated_content or "")
-            summary_prompt = (
-                "Summarize the following previous session notes in a short paragraph highlighting important characters, actions and dialogues.\n\n"
-                f"{prev_text}"
-            )
-            previous_summary = await langchain_chat_completion(
-                system_prompt="You are a helpful editor summarizing an RPG session.",
-                user_prompt=summary_prompt,
-                temperature=0.3,
-                max_tokens=512,
-            )
+    if rag_agent_id:
+        # so the concurrent RAG calls find them in the session's identity map
+        # instead of querying on the shared connection
+        rag_agent = await session.get(Agent, rag_agent_id)
+        if rag_agent:
+            await session.get(GameWorld, rag_agent.world_id)
 
-    previous_session_text = f"Happened in the previous session:\n{previous_summary}\n" if previous_summary else ""
+    async def summarize_previous() -> str:
+        if not prev_text:
+            return ""
+        summary_prompt = (
+            "Summarize the following previous session notes in a short paragraph highlighting important characters, actions and dialogues.\n\n"
+            f"{prev_text}"
+        )
+        previous_summary = await langchain_chat_completion(
+            system_prompt="You are a helpful editor summarizing an RPG session.",
+            user_prompt=summary_prompt,
+            temperature=0.3,
+            max_tokens=512,
+            usage=usage,
+            stage="previous_summary",
+        )
+        return f"Happened in the previous session:\n{previous_summary}\n" if previous_summary else ""
+
+    # Runs next to the arcs' RAG calls, only writing an arc needs it. Not in
+    # a gather_limited slot, so arcs waiting for it can't starve it.
+    previous_session = asyncio.create_task(summarize_previous())
 
     # 2. Chunk transcript
-    arcs = split_into_arcs(text, min_words_per_arc=1000, max_arcs=5)
-    arc_novels = []
-    arc_critic_notes = []
+    arcs = split_into_arcs(text)
+    total_steps = len(arcs) + 1  # every arc, then the synthesis
+    arcs_done = 0
+    if progress_cb:
+        progress_cb(0, total_steps)
 
-    # 3. Process each arc
-    for idx, arc_text in enumerate(arcs):
-        if progress_cb:
-            progress_cb(idx, len(arcs) + 2)
+    # 3. Process the arcs concurrently, each one RAG -> write -> critique
+    async def process_arc(arc_text: str) -> tuple[str, str]:
+        nonlocal arcs_done
 
         # 3a. Fetch world context (RAG) using chat_with_agent and the RAG agent id
         arc_context = ""
@@ -115,11 +322,12 @@ async def create_novel(
                 +f"{arc_text}\n"
             )
             rag_resp = await chat_with_agent(
-                session, rag_agent_id, [{"role": "user", "content": context_prompt}]
+                session, rag_agent_id, [{"role": "user", "content": context_prompt}],
+                usage=usage, stage="rag",
             )
             arc_context = rag_resp.get("answer", "").strip()
-        else:
-            arc_context = ""
+
+        previous_session_text = await previous_session
 
         # 3b. Writer agent: novelize this arc (LangChain LLM)
         novel_prompt = ("You are a talented fantasy novelist. Rewrite the following RPG transcript arc as a **brief, engaging, and flowing novel segment** (max 1000 words).\n"
@@ -142,8 +350,9 @@ async def create_novel(
         novel_arc = await langchain_chat_completion(
             system_prompt=tone,
             user_prompt=novel_prompt,
+            usage=usage,
+            stage="write",
         )
-        arc_novels.append(novel_arc)
 
         # 3c. Critic: feedback per arc (LangChain LLM)
         critic_system_prompt = "You are an experienced, constructive but critical fantasy literature reviewer."
@@ -166,45 +375,27 @@ async def create_novel(
             user_prompt=critic_prompt,
             temperature=0.2,
             max_tokens=512,
+            usage=usage,
+            stage="critique",
         )
-        arc_critic_notes.append(critic_notes)
-
-    # 4. Synthesize all arcs (main agent)
-    if progress_cb:
-        progress_cb(len(arcs) + 1, len(arcs) + 2)
 
-    arc_novels_joined = "\n\n".join(arc_novels)
-    arc_critic_notes_joined = "\n\n".join(arc_critic_notes)
-
-    final_writer_prompt = ("You are a talented fantasy novelist. Combine and polish the following arcs into a single, seamless, concise fantasy novel chapter.\n"
-
-           +f"{previous_session_text}\n"
-
-        +f"Critic notes for each arc:\n"
-        +f"{arc_critic_notes_joined}\n"
-
-        +f"Novelized arcs:\n"
-        +f"{arc_novels_joined}\n"
+        arcs_done += 1
+        if progress_cb:
+            progress_cb(arcs_done, total_steps)
+        return novel_arc, critic_notes
 
-       +f" Instructions:\n"
-        +f"- Incorporate important world details where appropriate.\n"
-        +f"- Apply the critic's suggestions to improve narrative flow, character depth, and world consistency.\n"
-        +f"- You may invent brief dialogue lines or transitions if needed for story cohesion, as long as they do not contradict the story so far.\n"
-        +f"- Take in consideration what happened in the previous session! Make continuity with scenes, dialogues, events, and characters.\n"
-        +f"- The entire output must be **no more than 4000 words**.\n"
-        +f"- Eliminate repetition, awkward transitions, or extraneous detail.\n"
-       +f" - Make the final chapter emotionally engaging and easy to read.\n"
-        +f"- Format the output using valid HTML: wrap each paragraph in <p>. Use <h2>/<h3> for titles if relevant. Format dialogue as you would in a novel, with each line in its own <p> or <blockquote> if appropriate.\n"
-    )
+    try:
+        results = await gather_limited(partial(process_arc, arc_text) for arc_text in arcs)
+        previous_session_text = await previous_session
+    finally:
+        previous_session.cancel()
+    arc_novels = [novel for novel, _ in results]
+    arc_critic_notes = [notes for _, notes in results]
 
-    draft = await langchain_chat_completion(
-        system_prompt=tone,
-        user_prompt=final_writer_prompt,
-        max_tokens=4000,
-    )
-    draft = draft.strip()
+    # 4. Synthesize all arcs (main agent)
+    draft = await synthesize(tone, previous_session_text, arc_novels, arc_critic_notes, usage)
 
     if progress_cb:
-        progress_cb(len(arcs) + 2, len(arcs) + 2)
+        progress_cb(total_steps, total_steps)
 
     return draft
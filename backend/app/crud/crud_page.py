@@ -3,19 +3,169 @@ from datetime import datetime, timezone
 
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy import delete
+from sqlalchemy import delete, func
 
-from app.models.model_page import Page, PageCharacteristicValue
+from app.models.model_page import Page, PageCharacteristicValue, PageToken, PageLink
 from app.models.model_characteristic import Characteristic
 from app.schemas.schema_page import PageCreate, PageUpdate
 from app.schemas.schema_page_characteristic_value import PageCharacteristicValueCreate
+from app.crud.crud_crosslink_matcher import analyze_html
+from app.crud import crud_name_index
+
+# --- PAGE INDEX (word tokens + link graph) ---
+
+HTML_LINK_KINDS = {"content": "html_link", "autogenerated_content": "autogen_link"}
+
+
+def _page_ref_ids(value) -> List[int]:
+    ids = value if isinstance(value, list) else [value]
+    out = []
+    for v in ids:
+        try:
+            out.append(int(v))
+        except (TypeError, ValueError):
+            continue
+    return out
+
+
+async def sync_page_index(session: AsyncSession, page: Page, tokens: bool = True) -> None:
+    """Replace the word tokens and html/autogen link edges of a page.
+
+    Only the HTML fields are looked at; page_ref edges are maintained by
+    ``sync_page_ref_links``. The caller commits.
+    """
+    if tokens:
+        await session.execute(delete(PageToken).where(PageToken.page_id == page.id))
+    await session.execute(
+        delete(PageLink)
+        .where(PageLink.source_page_id == page.id)
+        .where(PageLink.kind.in_(HTML_LINK_KINDS.values()))
+    )
+    page_tokens: set[str] = set()
+    for field, kind in HTML_LINK_KINDS.items():
+        field_tokens, targets = analyze_html(getattr(page, field))
+        page_tokens.update(field_tokens)
+        session.add_all(
+            PageLink(source_page_id=page.id, target_page_id=t, kind=kind)
+            for t in targets
+            if t != page.id
+        )
+    if tokens:
+        session.add_all(PageToken(page_id=page.id, token=t) for t in page_tokens)
+
+
+async def sync_page_ref_links(session: AsyncSession, page_id: int) -> None:
+    """Replace the page_ref edges of a page from its characteristic values.
+    The caller commits."""
+    await session.execute(
+        delete(PageLink)
+        .where(PageLink.source_page_id == page_id)
+        .where(PageLink.kind == "page_ref")
+    )
+    result = await session.execute(
+        select(PageCharacteristicValue.value)
+        .join(Characteristic, PageCharacteristicValue.characteristic_id == Characteristic.id)
+        .where(PageCharacteristicValue.page_id == page_id)
+        .where(Characteristic.type == "page_ref")
+    )
+    targets = set()
+    for (value,) in result.all():
+        if value is not None:
+            targets.update(_page_ref_ids(value))
+    session.add_all(
+        PageLink(source_page_id=page_id, target_page_id=t, kind="page_ref")
+        for t in targets
+    )
+
+
+async def reindex_pages(session: AsyncSession) -> int:
+    """Rebuild the token index and link graph for every page."""
+    result = await session.execute(select(Page))
+    pages = result.scalars().all()
+    await session.execute(delete(PageToken))
+    await session.execute(delete(PageLink))
+    for page in pages:
+        await sync_page_index(session, page)
+        await sync_page_ref_links(session, page.id)
+    await session.commit()
+    return len(pages)
+
+
+async def get_backlinks(session: AsyncSession, page_id: int) -> List[dict]:
+    """Return the pages linking to or referencing ``page_id``."""
+    result = await session.execute(
+        select(Page, PageLink.kind)
+        .join(PageLink, PageLink.source_page_id == Page.id)
+        .where(PageLink.target_page_id == page_id)
+        .order_by(Page.name)
+    )
+    backlinks: Dict[int, dict] = {}
+    for page, kind in result.all():
+        entry = backlinks.setdefault(
+            page.id,
+            {
+                "page_id": page.id,
+                "name": page.name,
+                "gameworld_id": page.gameworld_id,
+                "concept_id": page.concept_id,
+                "kinds": [],
+            },
+        )
+        entry["kinds"].append(kind)
+    return list(backlinks.values())
+
+
+async def remove_page_refs(session: AsyncSession, page_id: int) -> None:
+    """Strip ``page_id`` from the page_ref values that reference it, using
+    the link graph to find them. The caller commits."""
+    result = await session.execute(
+        select(PageLink.source_page_id)
+        .where(PageLink.target_page_id == page_id)
+        .where(PageLink.kind == "page_ref")
+    )
+    source_ids = [row[0] for row in result.all()]
+    if not source_ids:
+        return
+    res_vals = await session.execute(
+        select(PageCharacteristicValue)
+        .join(Characteristic, PageCharacteristicValue.characteristic_id == Characteristic.id)
+        .where(PageCharacteristicValue.page_id.in_(source_ids))
+        .where(Characteristic.type == "page_ref")
+    )
+    for pcv in res_vals.scalars().all():
+        if not pcv.value:
+            continue
+        value_list = [str(v) for v in (pcv.value if isinstance(pcv.value, list) else [pcv.value])]
+        if str(page_id) in value_list:
+            pcv.value = [v for v in value_list if v != str(page_id)]
+    await session.execute(
+        delete(PageLink)
+        .where(PageLink.target_page_id == page_id)
+        .where(PageLink.kind == "page_ref")
+    )
+
+
+async def get_pages_with_tokens(session: AsyncSession, tokens: set[str]) -> List[int]:
+    """Return the ids of the pages whose text contains every token."""
+    if not tokens:
+        return []
+    result = await session.execute(
+        select(PageToken.page_id)
+        .where(PageToken.token.in_(tokens))
+        .group_by(PageToken.page_id)
+        .having(func.count(PageToken.token) == len(tokens))
+    )
+    return [row[0] for row in result.all()]
 
 # --- PAGE CRUD ---
 
 async def create_page(session: AsyncSession, page: Page) -> Page:
     session.add(page)
+    await session.flush()
+    await sync_page_index(session, page)
     await session.commit()
     await session.flush()
+    crud_name_index.invalidate(page.gameworld_id)
     return page
 
 async def get_page(session: AsyncSession, page_id: int) -> Optional[Page]:
@@ -40,8 +190,12 @@ async def update_page(session: AsyncSession, page_id: int, updates: dict) -> Opt
     for k, v in updates.items():
         setattr(db_page, k, v)
     db_page.updated_at = datetime.now(timezone.utc)
+    if "content" in updates or "autogenerated_content" in updates:
+        await sync_page_index(session, db_page)
     await session.commit()
     await session.flush()
+    if "name" in updates or "concept_id" in updates:
+        crud_name_index.invalidate(db_page.gameworld_id)
     return db_page
 
 async def delete_page(session: AsyncSession, page_id: int) -> bool:
@@ -49,31 +203,17 @@ async def delete_page(session: AsyncSession, page_id: int) -> bool:
     if not page:
         return False
 
-    # Remove references to this page in page_ref characteristics within the same world
-    result = await session.execute(
-        select(Characteristic).where(
-            (Characteristic.type == "page_ref") &
-            (Characteristic.gameworld_id == page.gameworld_id)
-        )
-    )
-    page_ref_characteristics = result.scalars().all()
-    for char in page_ref_characteristics:
-        res_vals = await session.execute(
-            select(PageCharacteristicValue).where(
-                PageCharacteristicValue.characteristic_id == char.id
-            )
-        )
-        vals = res_vals.scalars().all()
-        for pcv in vals:
-            if not pcv.value:
-                continue
-            value_list = [str(v) for v in pcv.value]
-            if str(page_id) in value_list:
-                pcv.value = [v for v in value_list if v != str(page_id)]
+    # Remove references to this page in page_ref characteristics
+    await remove_page_refs(session, page_id)
 
+    # Incoming html/autogen edges are kept for remove_crosslinks_to_page
+    await session.execute(delete(PageToken).where(PageToken.page_id == page_id))
+    await session.execute(delete(PageLink).where(PageLink.source_page_id == page_id))
+    gameworld_id = page.gameworld_id
     await session.delete(page)
     await session.commit()
     await session.flush()
+    crud_name_index.invalidate(gameworld_id)
     return True
 
 # --- PAGE CHARACTERISTIC VALUE CRUD ---
@@ -85,10 +225,12 @@ async def create_page_characteristic_value(session: AsyncSession, value_obj: Pag
     )
     if existing:
         existing.value = value_obj.value
+        await sync_page_ref_links(session, value_obj.page_id)
         await session.commit()
         await session.flush()
         return existing
     session.add(value_obj)
+    await sync_page_ref_links(session, value_obj.page_id)
     await session.commit()
     await session.flush()
     return value_obj
@@ -117,6 +259,7 @@ async def delete_page_characteristic_values(session: AsyncSession, page_id: int)
     await session.execute(
         delete(PageCharacteristicValue).where(PageCharacteristicValue.page_id == page_id)
     )
+    await sync_page_ref_links(session, page_id)
     await session.commit()
     await session.flush()
 
@@ -132,6 +275,7 @@ async def update_page_characteristic_value(session: AsyncSession, page_id: int,
     val = result.scalar_one_or_none()
     if val:
         val.value = value
+        await sync_page_ref_links(session, page_id)
         await session.commit()
         await session.flush()
     return val
@@ -143,6 +287,7 @@ async def delete_page_characteristic_value(session: AsyncSession, page_id: int,
             PageCharacteristicValue.characteristic_id == characteristic_id
         )
     )
+    await sync_page_ref_links(session, page_id)
     await session.commit()
     await session.flush()
 
@@ -151,5 +296,6 @@ async def delete_page_characteristic_values(session: AsyncSession, page_id: int)
     await session.execute(
         delete(PageCharacteristicValue).where(PageCharacteristicValue.page_id == page_id)
     )
+    await sync_page_ref_links(session, page_id)
     await session.commit()
     await session.flush()
\ No newline at end of file
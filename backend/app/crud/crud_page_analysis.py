@@ -2,20 +2,30 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from langchain_openai import ChatOpenAI
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_core.prompts import ChatPromptTemplate
-from typing import Dict, List
+from typing import Callable, Dict, List, Optional
 from difflib import SequenceMatcher
-import unicodedata
+import asyncio
+import logging
 from datetime import datetime, timezone
 
-from app.config import settings
 from app.models.model_page import Page
 from app.models.model_agent import Agent
 from app.models.model_concept import Concept
-from app.crud import crud_page, crud_concept
+from app.config import settings
+from app.crud import crud_page, crud_concept, crud_gameworld
+from app.crud.crud_name_index import NameIndex, PrefixTrie, canonical, get_name_index
 from app.crud import crud_characteristic
 from app.crud.crud_agent import ensure_personality_prompts
+from app.llm import TokenUsage, ainvoke_with_retry, gather_limited, get_chat_model
 import json
 
+logger = logging.getLogger(__name__)
+
+# per_concept: one extraction prompt per (concept, chunk)
+# multi_concept: one JSON prompt per chunk covering every concept, falling
+# back to per_concept for chunks whose answer is not valid JSON
+ANALYSIS_MODES = ("per_concept", "multi_concept")
+
 
 def _valid_name(name: str) -> bool:
     if not name:
@@ -28,47 +38,32 @@ def _valid_name(name: str) -> bool:
     return True
 
 
-def _normalize(text: str) -> str:
-    """Return a lowercase version of the text without diacritics and extra spaces."""
-    text = unicodedata.normalize("NFD", text or "")
-    text = "".join(c for c in text if unicodedata.category(c) != "Mn")
-    return " ".join(text.lower().split())
-
-
-def _canonical(name: str) -> str:
-    """Return a normalized version of the name without honorifics."""
-    n = _normalize(name)
-    titles = {"lord", "lady", "sir", "dame", "mr", "mrs", "ms"}
-    words = [w for w in n.split() if w not in titles]
-    return " ".join(words)
-
-
-def _select_key(name: str, groups: Dict[str, List[dict]]) -> str:
-    """Return the canonical key for grouping similar names."""
-    canonical = _canonical(name)
-    for k in list(groups.keys()):
-        if k.startswith(canonical):
-            groups[canonical] = groups.pop(k)
-            return canonical
-        if canonical.startswith(k):
-            return k
-    return canonical
-
+def _select_key(name: str, groups: Dict[str, List[dict]], keys: PrefixTrie) -> str:
+    """Return the canonical key for grouping similar names.
 
-def _find_existing_page(name: str, page_map: Dict[str, int]) -> int | None:
-    """Find existing page id by canonical or fuzzy match."""
-    key = _canonical(name)
-    if key in page_map:
-        return page_map[key]
-    for k, pid in page_map.items():
-        if key.startswith(k) or k.startswith(key):
-            return pid
-        if SequenceMatcher(None, key, k).ratio() > 0.85:
-            return pid
-    return None
-
-
-async def _choose_concept(llm: ChatOpenAI, name: str, content: str, options: List[Concept]) -> str:
+    ``keys`` mirrors ``groups`` in insertion order: the first group whose
+    key is a prefix of the name, or starts with it, is used (and renamed to
+    the shorter name).
+    """
+    key = canonical(name)
+    related = keys.first_related(key)
+    if related is None:
+        keys.append(key)
+        return key
+    k = related[1]
+    if k.startswith(key):
+        moved = k == key or key not in groups
+        groups[key] = groups.pop(k)
+        keys.remove(k)
+        if moved:
+            keys.append(key)
+        return key
+    return k
+
+
+async def _choose_concept(
+    llm: ChatOpenAI, name: str, content: str, options: List[Concept], usage: TokenUsage
+) -> str:
     prompt = ChatPromptTemplate.from_messages([
         ("system", "Choose the most appropriate concept for the given name. Respond with the concept name only."),
         (
@@ -78,45 +73,166 @@ async def _choose_concept(llm: ChatOpenAI, name: str, content: str, options: Lis
     ])
     opts = "; ".join([f"{c.name}: {c.description or ''}" for c in options])
     chain = prompt | llm
-    resp = await chain.ainvoke({"name": name, "opts": opts, "text": content[:1000]})
+    resp = await ainvoke_with_retry(chain, {"name": name, "opts": opts, "text": content[:1000]})
+    usage.add(resp, "choose_concept")
     return resp.content.strip()
 
 
-async def analyze_page(session: AsyncSession, agent: Agent, page: Page):
-    """Analyze page content and return concept-based page suggestions."""
-    concepts = await crud_concept.get_concepts(
-        session, gameworld_id=page.gameworld_id, auto_generated=True
-    )
-    concepts_by_id: Dict[int, Concept] = {c.id: c for c in concepts}
-    existing_pages = await crud_page.get_pages(session, gameworld_id=page.gameworld_id)
-    pages_by_id = {p.id: p for p in existing_pages}
-    page_map = {_canonical(p.name): p.id for p in existing_pages}
+def _extraction_chain(llm: ChatOpenAI, concept: Concept):
+    prompt = ChatPromptTemplate.from_messages([
+        (
+            "system",
+            f"Extract the exact names of any {concept.name} explicitly mentioned in the text. {concept.description or ''} Respond with a comma separated list of the names only. If none are present, reply with an empty string.",
+        ),
+        ("user", "{text}"),
+    ])
+    return prompt | llm
+
+
+_MULTI_PROMPT = ChatPromptTemplate.from_messages([
+    (
+        "system",
+        "Extract the exact names explicitly mentioned in the text for each of these concepts:\n{concepts}\n"
+        "Respond only with a JSON object that maps every concept name to a list of the names found, "
+        "using an empty list when none are present.",
+    ),
+    ("user", "{text}"),
+])
+
+
+def _parse_multi_concept(text: str, concepts: List[Concept]) -> Optional[List[set[str]]]:
+    """Names per concept from a multi-concept JSON answer, ``None`` if unusable."""
+    text = text.strip()
+    if text.startswith("```"):
+        text = text.strip("`").removeprefix("json").strip()
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return None
+    if not isinstance(data, dict):
+        return None
+    by_name = {str(k).strip().lower(): v for k, v in data.items()}
+    found: List[set[str]] = []
+    for concept in concepts:
+        value = by_name.get(concept.name.strip().lower()) or []
+        if isinstance(value, str):
+            value = value.split(",")
+        if not isinstance(value, list):
+            return None
+        found.append({str(n).strip() for n in value if str(n).strip()})
+    return found
+
+
+async def _extract_names(
+    llm: ChatOpenAI,
+    concepts: List[Concept],
+    docs: List[str],
+    mode: str,
+    usage: TokenUsage,
+) -> List[set[str]]:
+    """Names found for each concept (in the order of ``concepts``).
+
+    All LLM calls run concurrently within ``settings.llm_concurrency``.
+    """
+    found: List[set[str]] = [set() for _ in concepts]
+    if not concepts:
+        return found
+
+    if mode == "multi_concept":
+        chain = _MULTI_PROMPT | llm.bind(response_format={"type": "json_object"})
+        listing = "\n".join(f"- {c.name}: {c.description or ''}" for c in concepts)
+        responses = await gather_limited([
+            (lambda chunk=chunk: ainvoke_with_retry(chain, {"concepts": listing, "text": chunk}))
+            for chunk in docs
+        ])
+        fallback: List[str] = []
+        for chunk, resp in zip(docs, responses):
+            usage.add(resp, "multi_concept")
+            parsed = _parse_multi_concept(resp.content, concepts)
+            if parsed is None:
+                fallback.append(chunk)
+                continue
+            for names, new in zip(found, parsed):
+                names.update(new)
+        if fallback:
+            logger.warning("Multi-concept answer unusable for %d chunk(s), asking per concept", len(fallback))
+        docs = fallback
+
+    chains = [_extraction_chain(llm, c) for c in concepts]
+    calls = [
+        (lambda chain=chain, chunk=chunk: ainvoke_with_retry(chain, {"text": chunk}))
+        for chain in chains
+        for chunk in docs
+    ]
+    responses = await gather_limited(calls)
+    for i, names in enumerate(found):
+        for resp in responses[i * len(docs):(i + 1) * len(docs)]:
+            usage.add(resp, "per_concept")
+            names.update(n.strip() for n in resp.content.split(',') if n.strip())
+    return found
+
+
+async def analysis_mode(session: AsyncSession, gameworld_id: int) -> str:
+    """The world's extraction mode, or the configured default."""
+    world = await crud_gameworld.get_gameworld(session, gameworld_id)
+    mode = (world.analysis_mode if world else None) or settings.page_analysis_mode
+    return mode if mode in ANALYSIS_MODES else "per_concept"
+
+
+class AnalysisContext:
+    """What analyzing a page needs to know about its world, loaded once and
+    shared by every page of a bulk job."""
+
+    def __init__(self, concepts, names: NameIndex, mode: str):
+        self.concepts_by_id: Dict[int, Concept] = {c.id: c for c in concepts}
+        # the concepts pages are extracted for
+        self.concepts = [c for c in concepts if c.auto_generated]
+        self.names = names
+        self.mode = mode
+
+
+async def load_analysis_context(session: AsyncSession, gameworld_id: int) -> AnalysisContext:
+    concepts = await crud_concept.get_concepts(session, gameworld_id=gameworld_id)
+    names = await get_name_index(session, gameworld_id)
+    mode = await analysis_mode(session, gameworld_id)
+    return AnalysisContext(concepts, names, mode)
+
+
+async def analyze_page(
+    session: AsyncSession,
+    agent: Agent,
+    page: Page,
+    usage: Optional[TokenUsage] = None,
+    context: Optional[AnalysisContext] = None,
+):
+    """Analyze page content and return concept-based page suggestions.
+
+    The LLM calls are counted in ``usage`` (a new one if not given), which
+    is also returned as ``token_usage``. Pass a ``context`` to skip loading
+    the world's concepts and pages.
+    """
+    usage = usage if usage is not None else TokenUsage()
+    if context is None:
+        context = await load_analysis_context(session, page.gameworld_id)
+    mode = context.mode
+    concepts = context.concepts
+    concepts_by_id = context.concepts_by_id
+    names = context.names
 
     text_splitter = RecursiveCharacterTextSplitter(chunk_size=2000, chunk_overlap=200)
     docs = text_splitter.split_text(page.content or "")
 
-    llm = ChatOpenAI(api_key=settings.openai_api_key or "sk-test", model=settings.open_ai_model)
+    llm = get_chat_model()
 
     suggestions_by_name: Dict[str, List[dict]] = {}
-    for concept in concepts:
-        found: set[str] = set()
-        prompt = ChatPromptTemplate.from_messages([
-            (
-                "system",
-                f"Extract the exact names of any {concept.name} explicitly mentioned in the text. {concept.description or ''} Respond with a comma separated list of the names only. If none are present, reply with an empty string.",
-            ),
-            ("user", "{text}"),
-        ])
-        chain = prompt | llm
-        for chunk in docs:
-            resp = await chain.ainvoke({"text": chunk})
-            names = [n.strip() for n in resp.content.split(',') if n.strip()]
-            found.update(names)
+    group_keys = PrefixTrie()
+    found_by_concept = await _extract_names(llm, concepts, docs, mode, usage)
+    for concept, found in zip(concepts, found_by_concept):
         for name in sorted(found):
             if not _valid_name(name):
                 continue
-            key = _select_key(name, suggestions_by_name)
-            exists_id = _find_existing_page(key, page_map)
+            key = _select_key(name, suggestions_by_name, group_keys)
+            exists_id = names.find_existing(key)
             entry = {
                 "name": key,
                 "concept_id": concept.id,
@@ -126,33 +242,31 @@ async def analyze_page(session: AsyncSession, agent: Agent, page: Page):
             }
             if exists_id is not None:
                 entry["target_page_id"] = exists_id
-                target_page = pages_by_id.get(exists_id)
-                if target_page:
-                    # Ensure the concept info for the target page is loaded
-                    if target_page.concept_id not in concepts_by_id:
-                        existing_concept = await crud_concept.get_concept(session, target_page.concept_id)
-                        if existing_concept:
-                            concepts_by_id[target_page.concept_id] = existing_concept
-                    entry["concept_id"] = target_page.concept_id
-                    entry["concept"] = concepts_by_id[target_page.concept_id].name
+                target_concept_id = names.concept_of(exists_id)
+                # the context holds every concept of the world; no query
+                # here, bulk analysis shares the session between pages
+                if target_concept_id in concepts_by_id:
+                    entry["concept_id"] = target_concept_id
+                    entry["concept"] = concepts_by_id[target_concept_id].name
             suggestions_by_name.setdefault(key, []).append(entry)
 
+    # Names claimed by several concepts are settled by the LLM, all at once
+    ambiguous = {
+        name: [concepts_by_id[e["concept_id"]] for e in entries if e["concept_id"] in concepts_by_id]
+        for name, entries in suggestions_by_name.items()
+        if len(entries) > 1 and len({e["concept_id"] for e in entries}) > 1
+    }
+    ambiguous = {name: options for name, options in ambiguous.items() if options}
+    choices = await gather_limited([
+        (lambda name=name, options=options: _choose_concept(llm, name, page.content or "", options, usage))
+        for name, options in ambiguous.items()
+    ])
+    best_by_name = dict(zip(ambiguous, choices))
+
     final_suggestions: List[dict] = []
     for name, entries in suggestions_by_name.items():
-        same_concept = len({e["concept_id"] for e in entries}) == 1
-        if len(entries) == 1 or same_concept:
-            entry = entries[0]
-            entry["source_pages"] = [{"id": page.id, "name": page.name}]
-            entry["source_page_ids"] = [page.id]
-            entry["source_page_updated"] = (
-                page.updated_at.isoformat() if page.updated_at else ""
-            )
-            final_suggestions.append(entry)
-            continue
-
-        option_concepts = [concepts_by_id[e["concept_id"]] for e in entries if e["concept_id"] in concepts_by_id]
-        if option_concepts:
-            best = await _choose_concept(llm, name, page.content or "", option_concepts)
+        if name in best_by_name:
+            best = best_by_name[name]
             chosen = next(
                 (e for e in entries if e["concept_id"] in concepts_by_id and concepts_by_id[e["concept_id"]].name == best),
                 entries[0],
@@ -166,95 +280,109 @@ async def analyze_page(session: AsyncSession, agent: Agent, page: Page):
         )
         final_suggestions.append(chosen)
 
-    return {"suggestions": final_suggestions}
+    return {"suggestions": final_suggestions, "analysis_mode": mode, "token_usage": usage.as_dict()}
+
+
+_GENERATE_PROMPT = ChatPromptTemplate.from_messages([
+    (
+        "system",
+        "You are a skilled writer summarizing fantasy lore. {tone} Extract characteristic values found in the text and craft a short, well written narrative recount of the concept's story. Create the text using the same language as the given text. Respond only with valid JSON in the format {{\"autogenerated_content\": <text>, \"values\": {{<characteristic>: [<values>]}}}}. Do not include any other text."
+    ),
+    (
+        "user",
+        "Page name: {name}\nConcept: {concept}\nCharacteristics: {chars}\nText:\n{content}"
+    ),
+])
 
-async def generate_pages(session: AsyncSession, agent: Agent, page: Page, page_specs: List[dict]):
-    print (f" -- GENERATING PAGE!")
+
+def _source_date(page: Page):
+    return page.updated_at or page.created_at
+
+
+async def generate_pages(
+    session: AsyncSession,
+    agent: Agent,
+    page: Page,
+    page_specs: List[dict],
+    usage: Optional[TokenUsage] = None,
+):
     """Generate full page data for selected suggestions.
 
     Each page spec may include ``source_page_ids`` which will be used to
     aggregate the text from those pages before sending it to the language model.
+
+    Concepts, characteristics and source pages are loaded once for all specs,
+    then one summary per (spec, source page) is requested, all of them at the
+    same time up to ``settings.llm_concurrency``. Sections stay ordered by
+    source date.
     """
-    llm = ChatOpenAI(api_key=settings.openai_api_key or "sk-test", model=settings.open_ai_model)
-    generated = []
+    llm = get_chat_model()
+    usage = usage if usage is not None else TokenUsage()
 
     personalities = [p.strip() for p in (agent.personality or "helpful NPC").split(',') if p.strip()]
     prompts = await ensure_personality_prompts(personalities)
     tone = "\n".join(prompts.get(p, "") for p in personalities if prompts.get(p))
+    chain = _GENERATE_PROMPT.partial(tone=tone) | llm
 
-    # Preload existing pages in the same world to resolve page_ref values
-    existing_pages = await crud_page.get_pages(session, gameworld_id=page.gameworld_id)
+    # Resolves page_ref values to pages of the world
+    names = await get_name_index(session, page.gameworld_id)
 
-    def find_page_id(name: str, ref_concept_id: int | None = None) -> int | None:
-        """Lookup for a page by fuzzy name and optional concept."""
-        if not name:
-            return None
-        target = _canonical(name)
-        best_id: int | None = None
-        best_ratio = 0.0
-        for p in existing_pages:
-            if ref_concept_id is not None and p.concept_id != ref_concept_id:
-                continue
-            candidate = _canonical(p.name)
-            if not candidate:
-                continue
-            if target in candidate or candidate in target:
-                return p.id
-            ratio = SequenceMatcher(None, target, candidate).ratio()
-            if ratio > 0.8 and ratio > best_ratio:
-                best_ratio = ratio
-                best_id = p.id
-        return best_id
+    concepts = {}
+    for concept_id in dict.fromkeys(spec["concept_id"] for spec in page_specs):
+        concept = await crud_concept.get_concept(session, concept_id)
+        if concept:
+            concepts[concept_id] = concept
+    characteristics = await crud_characteristic.get_characteristics_for_concepts(session, list(concepts))
 
+    source_pages: Dict[int, Optional[Page]] = {}
     for spec in page_specs:
-        concept = await crud_concept.get_concept(session, spec["concept_id"])
+        for pid in spec.get("source_page_ids") or ():
+            if pid not in source_pages:
+                sp = await crud_page.get_page(session, pid)
+                source_pages[pid] = sp if sp and sp.gameworld_id == page.gameworld_id else None
+
+    plans = []
+    for spec in page_specs:
+        concept = concepts.get(spec["concept_id"])
         if not concept:
             continue
-        characteristics = await crud_characteristic.get_characteristics_for_concept(session, concept.id)
-        char_names = ", ".join(c.name for c in characteristics)
-        prompt = ChatPromptTemplate.from_messages([
-            (
-                "system",
-                "You are a skilled writer summarizing fantasy lore. " + tone + " Extract characteristic values found in the text and craft a short, well written narrative recount of the concept's story. Create the text using the same language as the given text. Respond only with valid JSON in the format {{\"autogenerated_content\": <text>, \"values\": {{<characteristic>: [<values>]}}}}. Do not include any other text."
-            ),
-            (
-                "user",
-                "Page name: {name}\nConcept: {concept}\nCharacteristics: {chars}\nText:\n{content}"
-            ),
-        ])
-        chain = prompt | llm
-
-        sources = []
         if spec.get("source_page_ids"):
-            for pid in spec["source_page_ids"]:
-                sp = next((pp for pp in existing_pages if pp.id == pid), None)
-                if sp:
-                    sources.append(sp)
+            sources = [source_pages[pid] for pid in spec["source_page_ids"]]
         else:
-            sources.append(page)
-
+            sources = [page]
         sources = [s for s in sources if s and s.content]
-        sources.sort(
-            key=lambda s: (s.updated_at or s.created_at) if (s.updated_at or s.created_at) else datetime.min
-        )
-
-        sections: List[str] = []
-        value_map: Dict[int, List[str]] = {}
+        sources.sort(key=lambda s: _source_date(s) or datetime.min)
+        plans.append((spec, concept, sources))
 
-        for sp in sources:
-            resp = await chain.ainvoke({
+    def summarize(spec: dict, concept: Concept, sp: Page):
+        async def call():
+            resp = await ainvoke_with_retry(chain, {
                 "name": spec["name"],
                 "concept": concept.name,
-                "chars": char_names,
+                "chars": ", ".join(c.name for c in characteristics[concept.id]),
                 "content": sp.content,
             })
-            text = resp.content.strip()
+            usage.add(resp, "generate")
+            return resp.content.strip()
+        return call
+
+    answers = iter(await gather_limited(
+        summarize(spec, concept, sp) for spec, concept, sources in plans for sp in sources
+    ))
+
+    generated = []
+    for spec, concept, sources in plans:
+        sections: List[str] = []
+        value_map: Dict[int, List[str]] = {}
+
+        for sp in sources:
+            text = next(answers)
             try:
                 data = json.loads(text)
             except Exception:
                 data = {"autogenerated_content": text, "values": {}}
             vals = data.get("values", {}) if isinstance(data.get("values", {}), dict) else {}
-            for c in characteristics:
+            for c in characteristics[concept.id]:
                 val = vals.get(c.name)
                 if not val:
                     continue
@@ -262,7 +390,7 @@ async def generate_pages(session: AsyncSession, agent: Agent, page: Page, page_s
                 if c.type == "page_ref":
                     refs: List[str] = []
                     for v in val_list:
-                        pid = find_page_id(str(v), c.ref_concept_id)
+                        pid = names.find_page_id(str(v), c.ref_concept_id)
                         if pid is not None:
                             refs.append(str(pid))
                     if refs:
@@ -270,9 +398,7 @@ async def generate_pages(session: AsyncSession, agent: Agent, page: Page, page_s
                 else:
                     value_map.setdefault(c.id, []).extend([str(v) for v in val_list])
 
-            date_str = (
-                (sp.updated_at or sp.created_at or datetime.now(timezone.utc)).date().isoformat()
-            )
+            date_str = (_source_date(sp) or datetime.now(timezone.utc)).date().isoformat()
             header = f"<h2>Notes from {sp.name} - {date_str}</h2>"
             sections.append(header + "\n" + data.get("autogenerated_content", ""))
 
@@ -293,17 +419,85 @@ async def generate_pages(session: AsyncSession, agent: Agent, page: Page, page_s
             "autogenerated_content": "\n\n".join(sections),
             "values": values,
         })
-        print (f" -- GENERATING PAGE! + {generated}")
-    return {"pages": generated}
+    return {"pages": generated, "token_usage": usage.as_dict()}
+
+
+def _bigrams(text: str) -> set[str]:
+    padded = f" {text} "
+    return {padded[i:i + 2] for i in range(len(padded) - 1)}
+
+
+class _SuggestionMerger:
+    """Merges suggestions of the same concept whose names are similar
+    (``SequenceMatcher`` ratio >= 0.6). Only entries sharing a character
+    bigram with the new name are rescored instead of every merged entry;
+    names that similar practically always share one (trigrams already miss
+    short ones such as "are" / "rae")."""
+
+    THRESHOLD = 0.6
+
+    def __init__(self):
+        self.merged: List[dict] = []
+        # (concept_id, bigram) -> positions in ``merged``
+        self._grams: Dict[tuple, set[int]] = {}
+
+    def _index(self, pos: int) -> None:
+        entry = self.merged[pos]
+        for gram in _bigrams(entry["name"].lower()):
+            self._grams.setdefault((entry.get("concept_id"), gram), set()).add(pos)
+
+    def _match(self, sugg: dict) -> Optional[dict]:
+        name = sugg["name"].lower()
+        concept_id = sugg.get("concept_id")
+        candidates: set[int] = set()
+        for gram in _bigrams(name):
+            candidates.update(self._grams.get((concept_id, gram), ()))
+        # the first similar entry wins, as in a linear scan
+        for pos in sorted(candidates):
+            other = self.merged[pos]["name"].lower()
+            matcher = SequenceMatcher(None, other, name)
+            if matcher.real_quick_ratio() >= self.THRESHOLD and matcher.quick_ratio() >= self.THRESHOLD \
+                    and matcher.ratio() >= self.THRESHOLD:
+                return self.merged[pos]
+        return None
+
+    def add(self, sugg: dict) -> None:
+        found = self._match(sugg)
+        if found is None:
+            self.merged.append(sugg)
+            self._index(len(self.merged) - 1)
+            return
+        existing_ids = {p["id"] for p in found.get("source_pages", [])}
+        for sp in sugg.get("source_pages", []):
+            if sp["id"] not in existing_ids:
+                found.setdefault("source_pages", []).append(sp)
+        found.setdefault("source_page_ids", [])
+        for spid in sugg.get("source_page_ids", []):
+            if spid not in found["source_page_ids"]:
+                found["source_page_ids"].append(spid)
+        cur_dt = sugg.get("source_page_updated", "")
+        if cur_dt and cur_dt > found.get("source_page_updated", ""):
+            found.update({k: v for k, v in sugg.items() if k not in ("source_pages", "source_page_ids")})
+            # the entry may have been renamed, make it findable by the new name
+            self._index(self.merged.index(found))
 
 
 async def analyze_pages_bulk(
-    session: AsyncSession, agent: Agent, pages: List[Page]
+    session: AsyncSession,
+    agent: Agent,
+    pages: List[Page],
+    usage: Optional[TokenUsage] = None,
+    progress_cb: Optional[Callable[[int, int], None]] = None,
 ) -> List[dict]:
     """Analyze multiple pages and merge suggestions by fuzzy page name.
 
     Instead of discarding similar suggestions, accumulate the pages they were
-    found in so the reviewer can see every source."""
+    found in so the reviewer can see every source.
+
+    The world is loaded once and up to ``settings.analysis_page_concurrency``
+    pages are analyzed at a time; suggestions are merged in page order, so
+    the result does not depend on which page finishes first.
+    ``progress_cb(done, total)`` is called as pages complete."""
 
     pages = sorted(
         pages,
@@ -311,10 +505,28 @@ async def analyze_pages_bulk(
         if (p.updated_at or p.created_at)
         else datetime.min,
     )
-
-    all_suggestions: List[dict] = []
-    for page in pages:
-        result = await analyze_page(session, agent, page)
+    if not pages:
+        return []
+
+    context = await load_analysis_context(session, pages[0].gameworld_id)
+    # Not llm.gather_limited: each page fans out its own LLM calls, which
+    # take the per-loop LLM slots
+    limit = asyncio.Semaphore(settings.analysis_page_concurrency)
+    completed = 0
+
+    async def analyze(page: Page) -> dict:
+        nonlocal completed
+        async with limit:
+            result = await analyze_page(session, agent, page, usage, context)
+        completed += 1
+        if progress_cb:
+            progress_cb(completed, len(pages))
+        return result
+
+    results = await asyncio.gather(*(analyze(p) for p in pages))
+
+    merger = _SuggestionMerger()
+    for page, result in zip(pages, results):
         for s in result.get("suggestions", []):
             entry = dict(s)
             entry["source_pages"] = [{"id": page.id, "name": page.name}]
@@ -322,34 +534,6 @@ async def analyze_pages_bulk(
             entry["source_page_updated"] = (
                 page.updated_at.isoformat() if page.updated_at else ""
             )
-            all_suggestions.append(entry)
-
-    def _similar(a: str, b: str) -> bool:
-        return SequenceMatcher(None, a.lower(), b.lower()).ratio() >= 0.6
-
-    merged: List[dict] = []
-    for sugg in all_suggestions:
-        found = None
-        for m in merged:
-            if (
-                m.get("concept_id") == sugg.get("concept_id")
-                and _similar(m["name"], sugg["name"])
-            ):
-                found = m
-                break
-        if found:
-            existing_ids = {p["id"] for p in found.get("source_pages", [])}
-            for sp in sugg.get("source_pages", []):
-                if sp["id"] not in existing_ids:
-                    found.setdefault("source_pages", []).append(sp)
-            found.setdefault("source_page_ids", [])
-            for spid in sugg.get("source_page_ids", []):
-                if spid not in found["source_page_ids"]:
-                    found["source_page_ids"].append(spid)
-            cur_dt = sugg.get("source_page_updated", "")
-            if cur_dt and cur_dt > found.get("source_page_updated", ""):
-                found.update({k: v for k, v in sugg.items() if k != "source_pages"})
-        else:
-            merged.append(sugg)
+            merger.add(entry)
 
-    return merged
+    return merger.merged
@@ -1,240 +1,179 @@
-import re
+from sqlalchemy import delete
 from sqlalchemy.future import select
 from bs4 import BeautifulSoup
 
 from app.database import async_session_maker
-from app.crud.crud_page import get_page
-
-from app.models.model_page import Page, PageCharacteristicValue
+from app.crud.crud_page import (
+    HTML_LINK_KINDS,
+    get_page,
+    get_pages_with_tokens,
+    remove_page_refs,
+    sync_page_index,
+    sync_page_ref_links,
+)
+from app.crud.crud_crosslink_matcher import CROSSLINK_RE, CrosslinkMatcher, link_html, name_tokens
+from app.crud.crud_vectordb import schedule_reindex
+
+from app.models.model_page import Page, PageCharacteristicValue, PageLink
 from app.models.model_characteristic import Characteristic, ConceptCharacteristicLink
 
 
-CROSSLINK_RE = re.compile(r'/worlds/\d+/concept/\d+/page/(\d+)')
 async def remove_page_refs_from_characteristics(deleted_page: Page | int):
-    """Remove references to a deleted page from all page reference characteristics
-    within the same game world."""
+    """Remove references to a deleted page from all page reference characteristics."""
+    deleted_page_id = deleted_page.id if isinstance(deleted_page, Page) else deleted_page
     async with async_session_maker() as session:
-        if isinstance(deleted_page, Page):
-            deleted_page = await get_page(session, deleted_page.id)
-        else:
-            deleted_page = await get_page(session, deleted_page)
-
-        if not deleted_page:
-            return
-
-        result = await session.execute(
-            select(Characteristic).where(
-                (Characteristic.type == "page_ref") &
-                (Characteristic.gameworld_id == deleted_page.gameworld_id)
-        )
-    )
-        page_ref_characteristics = result.scalars().all()
-
-        if not page_ref_characteristics:
-            return
+        await remove_page_refs(session, deleted_page_id)
+        await session.commit()
 
-        for char in page_ref_characteristics:
-            # 2. For each such characteristic, find all PageCharacteristicValue with this characteristic_id
-            res_vals = await session.execute(
-                select(PageCharacteristicValue).where(
-                    PageCharacteristicValue.characteristic_id == char.id
-                )
-            )
-            vals = res_vals.scalars().all()
+async def remove_crosslinks_to_page(deleted_page_id: int):
+    """Unwrap the <a> tags pointing at a deleted page, keeping their text.
 
-            for pcv in vals:
-                if not pcv.value:
-                    continue
-                # 3. Remove the deleted page id from the value list (always as string)
-                value_list = [str(v) for v in pcv.value]
-                if str(deleted_page.id) in value_list:
-                    value_list = [v for v in value_list if v != str(deleted_page.id)]
-                    pcv.value = value_list
-                    await session.commit()
-                    await session.flush()
-
-async def remove_crosslinks_to_page(deleted_page_id: int):    
+    Only the pages the link graph lists as linking to it are parsed.
+    """
     async with async_session_maker() as session:
-        # Get all pages except the one being deleted
         result = await session.execute(
-            select(Page).where(Page.id != deleted_page_id)
+            select(Page)
+            .join(PageLink, PageLink.source_page_id == Page.id)
+            .where(PageLink.target_page_id == deleted_page_id)
+            .where(PageLink.kind.in_(HTML_LINK_KINDS.values()))
+            .where(Page.id != deleted_page_id)
+            .distinct()
         )
-        all_pages = result.scalars().all()
-        link_pattern = re.compile(rf'/worlds/\d+/concept/\d+/page/{deleted_page_id}\b')
-
-        for page in all_pages:
-            soup = BeautifulSoup(page.content or "", "html.parser")
-            content_changed = False
+        linking_pages = result.scalars().all()
+
+        changed_pages = []
+        for page in linking_pages:
+            page_changed = False
+            for field in HTML_LINK_KINDS:
+                soup = BeautifulSoup(getattr(page, field) or "", "html.parser")
+                changed = False
+                for a in soup.find_all("a", href=True):
+                    m = CROSSLINK_RE.search(a["href"])
+                    if m and int(m.group(1)) == deleted_page_id:
+                        # Remove the <a> tag, but keep the text inside
+                        a.replace_with(a.get_text())
+                        changed = True
+                if changed:
+                    setattr(page, field, str(soup))
+                    page_changed = True
+            if page_changed:
+                changed_pages.append(page)
+
+        await session.execute(
+            delete(PageLink)
+            .where(PageLink.target_page_id == deleted_page_id)
+            .where(PageLink.kind.in_(HTML_LINK_KINDS.values()))
+        )
+        await session.commit()
+        # the rewritten pages' vector chunks still hold the old HTML
+        for page in changed_pages:
+            schedule_reindex(page)
 
-            # Find all links that match the deleted page
-            for a in soup.find_all("a", href=True):
-                if link_pattern.search(a["href"]):
-                    # Remove the <a> tag, but keep the text inside
-                    a.replace_with(a.get_text())
-                    content_changed = True
 
-            if content_changed:
-                page.content = str(soup)
-                await session.commit()
-                await session.flush()
+async def _load_crosslink_candidates(session, page: Page):
+    """Return the pages whose names may be linked from ``page``."""
+    query = (
+        select(Page)
+        .where(Page.ignore_crosslink == False)
+        .where(Page.id != page.id)
+    )
+    if not page.allow_crossworld:
+        query = query.where(Page.gameworld_id == page.gameworld_id)
+    result = await session.execute(query)
+    return result.scalars().all()
 
 
-async def auto_crosslink_page_content(page):
+async def auto_crosslink_page_content(page, matcher: CrosslinkMatcher | None = None):
 
     async with async_session_maker() as session:
         if isinstance(page, Page):
             page = await get_page(session, page.id)
         else:
             page = await get_page(session, page)
-        
-        if not page.allow_crosslinks:
+
+        if not page or not page.allow_crosslinks:
             return
 
-        # Fetch candidate pages as before
-        if not page.allow_crossworld:
-            candidate_pages = await session.execute(
-                select(Page)
-                .where(Page.gameworld_id == page.gameworld_id)
-                .where(Page.ignore_crosslink == False)
-                .where(Page.id != page.id)
-            )
-            candidate_pages = candidate_pages.scalars().all()
-        else:
-            candidate_pages = await session.execute(
-                select(Page)
-                .where(Page.ignore_crosslink == False)
-                .where(Page.id != page.id)                
-            )
-            candidate_pages = candidate_pages.scalars().all()
-
-        # print (f"Candidate Pages: {candidate_pages} ")
-        page_name_map = {}
-        for cp in candidate_pages:
-            if cp.name.lower() not in page_name_map:
-                page_name_map[cp.name.lower()] = cp
-
-
-        
-        # Parse HTML for Content
-        soup = BeautifulSoup(page.content or "", "html.parser")
-        content_changed = False
-
-        for name, target_page in page_name_map.items():
-            # Check if already linked (ignore case, href and innerText both)
-
-
-            already_linked = False
-            for a in soup.find_all("a", href=True):
-                if (
-                    a.get("href") == f"/worlds/{target_page.gameworld_id}/concept/{target_page.concept_id}/page/{target_page.id}"
-                    or a.get_text(strip=True).lower() == name
-                ):
-                    already_linked = True
-                    break
-            if already_linked:
-                print (f" Name found!")
-                continue
-            
-            # Search for unlinked text nodes and add links
-            pattern = re.compile(rf"\b({re.escape(target_page.name)})\b", re.IGNORECASE)
-            
-
-            for element in soup.find_all(string=True):
-                if element.find_parent("a"):
-                    continue  # skip if already inside any <a>
-            
-
-                if pattern.search(element):
-                    # Replace only the first occurrence in this node
-                    def repl(m):
-                        url = f"/worlds/{target_page.gameworld_id}/concept/{target_page.concept_id}/page/{target_page.id}"
-                        return f'<a href="{url}" class="wiki-link" title="{target_page.name}">{m.group(0)}</a>'
-                    new_html = pattern.sub(repl, element, count=1)
-                    new_nodes = BeautifulSoup(new_html, "html.parser")
-                    print (f" ---- New Node: {new_nodes}")
-                    element.replace_with(new_nodes)
-                    content_changed = True
-                    break  # Only link the first occurrence per page name
-
-        if content_changed:
-            try:
-                new_content = str(soup)                
-                page.content = new_content        
-                await session.commit()
-                await session.flush()
-            except Exception as e:
-                        print("CROSSLINK BACKGROUND TASK ERROR:", repr(e))
-                        import traceback; traceback.print_exc()    
-
-        #Parse HTML for autogenerated content
-        soup = BeautifulSoup(page.autogenerated_content or "", "html.parser")
-        auto_content_changed = False
-
-        for name, target_page in page_name_map.items():
-            # Check if already linked (ignore case, href and innerText both)
-
-
-            already_linked = False
-            for a in soup.find_all("a", href=True):
-                if (
-                    a.get("href") == f"/worlds/{target_page.gameworld_id}/concept/{target_page.concept_id}/page/{target_page.id}"
-                    or a.get_text(strip=True).lower() == name
-                ):
-                    already_linked = True
-                    break
-            if already_linked:                
-                continue
-            
-            # Search for unlinked text nodes and add links
-            pattern = re.compile(rf"\b({re.escape(target_page.name)})\b", re.IGNORECASE)
-            
-
-            for element in soup.find_all(string=True):
-                if element.find_parent("a"):
-                    continue  # skip if already inside any <a>
-            
-
-                if pattern.search(element):
-                    # Replace only the first occurrence in this node
-                    def repl(m):
-                        url = f"/worlds/{target_page.gameworld_id}/concept/{target_page.concept_id}/page/{target_page.id}"
-                        return f'<a href="{url}" class="wiki-link" title="{target_page.name}">{m.group(0)}</a>'
-                    new_html = pattern.sub(repl, element, count=1)
-                    new_nodes = BeautifulSoup(new_html, "html.parser")
-                    
-                    element.replace_with(new_nodes)
-                    auto_content_changed = True
-                    break  # Only link the first occurrence per page name
-
-
-        if auto_content_changed:
+        # Build the name automaton once and reuse it for both HTML fields
+        if matcher is None:
+            matcher = CrosslinkMatcher(await _load_crosslink_candidates(session, page))
+
+        new_content, content_changed = link_html(page.content, matcher, page.id)
+        new_auto, auto_content_changed = link_html(
+            page.autogenerated_content, matcher, page.id
+        )
+
+        if content_changed or auto_content_changed:
             try:
-                new_content = str(soup)                
-                page.autogenerated_content = new_content        
+                if content_changed:
+                    page.content = new_content
+                if auto_content_changed:
+                    page.autogenerated_content = new_auto
+                await sync_page_index(session, page, tokens=False)
                 await session.commit()
                 await session.flush()
+                schedule_reindex(page)
             except Exception as e:
-                        print("CROSSLINK BACKGROUND TASK ERROR:", repr(e))
-                        import traceback; traceback.print_exc()   
-        
+                print("CROSSLINK BACKGROUND TASK ERROR:", repr(e))
+                import traceback; traceback.print_exc()
+
+
+CROSSLINK_COMMIT_BATCH = 200
 
 
 async def auto_crosslink_batch(new_page_id: int):
-    """Update existing pages to link to the newly created page."""
+    """Link the newly created page's name from the existing pages.
+
+    Only pages whose token index contains every word of the new name are
+    parsed and rewritten, and the changes are committed in bulk.
+    """
     async with async_session_maker() as session:
         new_page = await get_page(session, new_page_id)
-        if not new_page:
+        if not new_page or new_page.ignore_crosslink:
             return
 
-        candidate_pages = await session.execute(
+        matcher = CrosslinkMatcher([new_page])
+        if not len(matcher):
+            return
+
+        query = (
             select(Page)
             .where(Page.ignore_crosslink == False)
+            .where(Page.allow_crosslinks == True)
             .where(Page.id != new_page.id)
         )
-        candidate_pages = candidate_pages.scalars().all()
-
-    for page in candidate_pages:
-        await auto_crosslink_page_content(page)
+        tokens = name_tokens(new_page.name)
+        if tokens:
+            page_ids = await get_pages_with_tokens(session, tokens)
+            if not page_ids:
+                return
+            query = query.where(Page.id.in_(page_ids))
+        result = await session.execute(query)
+        targets = [
+            p for p in result.scalars().all()
+            if p.allow_crossworld or p.gameworld_id == new_page.gameworld_id
+        ]
+
+        pending = []
+        for page in targets:
+            new_content, content_changed = link_html(page.content, matcher, page.id)
+            new_auto, auto_changed = link_html(page.autogenerated_content, matcher, page.id)
+            if content_changed:
+                page.content = new_content
+            if auto_changed:
+                page.autogenerated_content = new_auto
+            if content_changed or auto_changed:
+                await sync_page_index(session, page, tokens=False)
+                pending.append(page)
+            if len(pending) >= CROSSLINK_COMMIT_BATCH:
+                await session.commit()
+                for changed in pending:
+                    schedule_reindex(changed)
+                pending = []
+        if pending:
+            await session.commit()
+            for changed in pending:
+                schedule_reindex(changed)
 
 async def sync_page_ref_attributes(page: Page | int):
     """Ensure page reference characteristics are mirrored on the referenced page."""
@@ -254,6 +193,7 @@ async def sync_page_ref_attributes(page: Page | int):
             .where(Characteristic.type == "page_ref")
         )
 
+        touched: set[int] = set()
         for pcv, char in result.all():
             # value can be stored as either a list or a single string depending
             # on the characteristic configuration. Normalise it to a list of
@@ -280,6 +220,7 @@ async def sync_page_ref_attributes(page: Page | int):
                 if not rev_chars:
                     continue
 
+                touched.add(ref_page.id)
                 for rev_char in rev_chars:
                     rev_val = await session.get(PageCharacteristicValue, (ref_page.id, rev_char.id))
                     if rev_val:
@@ -289,8 +230,7 @@ async def sync_page_ref_attributes(page: Page | int):
                         elif not isinstance(vals, list):
                             vals = [str(vals)]
                         if str(page.id) not in vals:
-                            vals.append(str(page.id))
-                            rev_val.value = vals
+                            rev_val.value = [*vals, str(page.id)]
                     else:
                         session.add(
                             PageCharacteristicValue(
@@ -300,5 +240,7 @@ async def sync_page_ref_attributes(page: Page | int):
                             )
                         )
 
+        for ref_page_id in touched:
+            await sync_page_ref_links(session, ref_page_id)
         await session.commit()
         await session.flush()
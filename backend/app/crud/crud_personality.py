@@ -0,0 +1,160 @@
+"""Tone prompts generated for agent personalities.
+
+The prompts live in ``personalities_parsing.json`` and are shared by the API
+and the Celery workers. ``PersonalityStore`` keeps them in memory, checks
+the file's mtime at most every ``check_interval`` seconds (so chats with
+known personalities do no disk I/O), merges new prompts into the file under
+an exclusive lock with an atomic replace, and lets concurrent requests for
+the same unknown personality share one LLM call.
+"""
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Iterable, Optional
+
+from langchain_core.prompts import ChatPromptTemplate
+
+from app.config import settings
+from app.llm import get_chat_model
+
+logger = logging.getLogger(__name__)
+
+_TONE_PROMPT = ChatPromptTemplate.from_messages([
+    (
+        "system",
+        "Write one short sentence that describes how text should sound when using this personality.",
+    ),
+    ("user", "{personality}"),
+])
+
+
+async def describe_personality(personality: str) -> str:
+    """Ask the LLM for a one-line tone description of ``personality``."""
+    try:
+        resp = await (_TONE_PROMPT | get_chat_model()).ainvoke({"personality": personality})
+        text = resp.content.strip()
+    except Exception:
+        text = f"Write with a {personality} tone."
+    return f"{personality} = {text}"
+
+
+class PersonalityStore:
+    def __init__(
+        self,
+        path: Path,
+        generate: Callable[[str], Awaitable[str]] = describe_personality,
+        check_interval: float = 5.0,
+    ):
+        self.path = Path(path)
+        self.generate = generate
+        self.check_interval = check_interval
+        self._data: Dict[str, str] = {}
+        self._stamp = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.loads = 0
+        self.generated = 0
+
+    def _read(self) -> Dict[str, str]:
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _file_stamp(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        # the file is replaced on every write, so the inode changes too
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def refresh(self, force: bool = False) -> None:
+        """Reload the file if another process changed it."""
+        now = time.monotonic()
+        if not force and now - self._checked < self.check_interval:
+            return
+        with self._lock:
+            self._checked = now
+            stamp = self._file_stamp()
+            if stamp != self._stamp:
+                self._data = self._read()
+                self._stamp = stamp
+                self.loads += 1
+
+    def _persist(self, updates: Dict[str, str]) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(f"{self.path}.lock", "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                # merge with whatever other workers wrote meanwhile
+                data = self._read()
+                data.update(updates)
+                tmp = f"{self.path}.{os.getpid()}.tmp"
+                with open(tmp, "w") as f:
+                    json.dump(data, f, indent=2)
+                os.replace(tmp, self.path)
+                with self._lock:
+                    self._data = data
+                    self._stamp = self._file_stamp()
+                    self._checked = time.monotonic()
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    async def _generate(self, key: str) -> str:
+        text = await self.generate(key)
+        self.generated += 1
+        await asyncio.to_thread(self._persist, {key: text})
+        return text
+
+    def _task_for(self, key: str) -> asyncio.Task:
+        loop = asyncio.get_running_loop()
+        task = self._inflight.get(key)
+        # Celery jobs each run their own event loop, don't await across them
+        if task is None or task.done() or task.get_loop() is not loop:
+            task = loop.create_task(self._generate(key))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t, k=key: self._inflight.get(k) is t and self._inflight.pop(k))
+        return task
+
+    async def get(self, personalities: Iterable[str]) -> Dict[str, str]:
+        """Return ``{personality: prompt}``, generating the missing ones."""
+        keys = [p.strip() for p in personalities if p and p.strip()]
+        self.refresh()
+        missing = [k for k in dict.fromkeys(keys) if k not in self._data]
+        if missing:
+            self.refresh(force=True)
+            missing = [k for k in missing if k not in self._data]
+        if missing:
+            texts = await asyncio.gather(*(asyncio.shield(self._task_for(k)) for k in missing))
+            generated = dict(zip(missing, texts))
+        else:
+            generated = {}
+        data = self._data
+        return {k: generated.get(k) or data[k] for k in keys if k in data or k in generated}
+
+    def stats(self) -> dict:
+        return {
+            "personalities": len(self._data),
+            "file_loads": self.loads,
+            "generated": self.generated,
+            "in_flight": len(self._inflight),
+        }
+
+
+_store: Optional[PersonalityStore] = None
+
+
+def get_store() -> PersonalityStore:
+    global _store
+    path = Path(settings.personality_file)
+    if _store is None or _store.path != path:
+        _store = PersonalityStore(path)
+    return _store
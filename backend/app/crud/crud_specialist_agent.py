@@ -3,34 +3,29 @@ from typing import List
 
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from langchain_openai import ChatOpenAI
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.messages import HumanMessage
-from langgraph.graph import Graph
+from langchain_core.messages import BaseMessage
 
-from app.config import settings
+from app.llm import CHAT_PROMPT, run_chat
 from app.models.model_agent import Agent
 from app.models.model_specialist_source import SpecialistSource
-from .crud_specialist_vectordb import query_agent
+from .crud_specialist_vectordb import aquery_agent
 from .crud_agent import ensure_personality_prompts
 
-openai_model = settings.open_ai_model
 
-
-async def chat_with_specialist(
+async def build_specialist_chat(
     session: AsyncSession,
     agent_id: int,
     messages: List[dict],
     n_results: int = 5,
     user_nickname: str | None = None,
-) -> dict:
-    """Generate a chat response using the specialist vector database."""
+) -> tuple[List[BaseMessage], List[dict]]:
+    """Retrieve context and build the prompt chain, see ``build_agent_chat``."""
     agent = await session.get(Agent, agent_id)
     if not agent or agent.specialist_update_date is None:
         raise ValueError("Agent unavailable")
 
     query = messages[-1].get("content", "") if messages else ""
-    docs = query_agent(agent_id, query, max(n_results, 5))
+    docs = await aquery_agent(agent_id, query, max(n_results, 5))
 
     # Map source ids to names
     src_ids = {d.get("source_id") for d in docs if d.get("source_id") is not None}
@@ -70,25 +65,26 @@ async def chat_with_specialist(
         +"If no relevant information is found in the documents, inform the user."
     )
 
-    prompt = ChatPromptTemplate.from_messages(
-        [
-            ("system", system_prompt),
-            ("system", f"Context:\n{context}" if context else "Context: none"),
-            ("system", f"Chat history:\n{history_txt}" if history_txt else "Chat history: none"),
-            ("user", "{input}"),
-        ]
+    prompt_messages = CHAT_PROMPT.format_messages(
+        system=system_prompt,
+        context=f"Context:\n{context}" if context else "Context: none",
+        history=f"Chat history:\n{history_txt}" if history_txt else "Chat history: none",
+        input=query,
     )
+    return prompt_messages, sources
 
-    llm = ChatOpenAI(api_key=settings.openai_api_key or "sk-test", model=openai_model)
-    chain = prompt | llm
 
-    builder = Graph()
-    builder.add_node("chat", chain)
-    builder.set_entry_point("chat")
-    builder.set_finish_point("chat")
-    graph = builder.compile()
-
-    response = await graph.ainvoke({"input": query})
-    answer = getattr(response, "content", str(response))
+async def chat_with_specialist(
+    session: AsyncSession,
+    agent_id: int,
+    messages: List[dict],
+    n_results: int = 5,
+    user_nickname: str | None = None,
+) -> dict:
+    """Generate a chat response using the specialist vector database."""
+    prompt_messages, sources = await build_specialist_chat(
+        session, agent_id, messages, n_results, user_nickname=user_nickname
+    )
 
+    answer = await run_chat(prompt_messages)
     return {"answer": answer, "sources": sources}
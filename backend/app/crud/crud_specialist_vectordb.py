@@ -23,9 +23,12 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 
 from app.crud.crud_vectordb import (
+    aretrieve,
+    get_cached_collection,
     get_chroma_client,
+    mark_index_changed,
+    retrieve,
     _delete_collection,
-    _embedding_fn,
 )
 
 
@@ -141,13 +144,7 @@ def _safe_add_records(
 
 
 def _get_collection(agent_id: int) -> Chroma:
-    name = f"specialist_{agent_id}"
-    client = get_chroma_client()
-    return Chroma(
-        client=client,
-        collection_name=name,
-        embedding_function=_embedding_fn,
-    )
+    return get_cached_collection(f"specialist_{agent_id}")
 
 def _extract_pdf_by_page(pdf_path: str) -> List[str]:
     pages_text = []
@@ -188,8 +185,8 @@ async def rebuild_agent(session: AsyncSession, agent_id: int) -> int:
         select(SpecialistSource).where(SpecialistSource.agent_id == agent_id)
     )
     sources = result.scalars().all()
+    _delete_collection(f"specialist_{agent_id}", get_chroma_client())
     collection = _get_collection(agent_id)
-    _delete_collection(f"specialist_{agent_id}", collection)
 
     docs: List[Document] = []
     for src in sources:
@@ -207,6 +204,7 @@ async def rebuild_agent(session: AsyncSession, agent_id: int) -> int:
     
     if docs:
         _safe_add_documents(collection, docs)
+    mark_index_changed(f"specialist_{agent_id}")
 
     agent = await session.get(Agent, agent_id)
     if agent:
@@ -251,11 +249,12 @@ async def import_agent_vectordb(session: AsyncSession, agent_id: int, data: dict
     embeds = data.get("embeddings") or []
     ids = data.get("ids") or None
 
+    _delete_collection(f"specialist_{agent_id}", get_chroma_client())
     collection = _get_collection(agent_id)
-    _delete_collection(f"specialist_{agent_id}", collection)
 
     if docs:
         _safe_add_records(collection, ids, embeds, docs, metas)
+    mark_index_changed(f"specialist_{agent_id}")
 
     agent = await session.get(Agent, agent_id)
     if agent:
@@ -267,28 +266,12 @@ async def import_agent_vectordb(session: AsyncSession, agent_id: int, data: dict
 
 def query_agent(agent_id: int, query: str, n_results: int = 5) -> List[dict]:
     """Query the specialist vector DB for relevant documents."""
-    collection = _get_collection(agent_id)
-    retrieved = collection.max_marginal_relevance_search(query, k=n_results * 4)
-
-    sources: dict[int, dict] = {}
-    for doc in retrieved:
-        meta = doc.metadata or {}
-        sid = meta.get("source_id")
-        if sid is None:
-            continue
-        entry = sources.setdefault(
-            sid,
-            {"document_parts": [], "metadata": {k: v for k, v in meta.items() if k != "chunk_index"}},
-        )
-        entry["document_parts"].append((meta.get("chunk_index", 0), doc.page_content))
+    return retrieve(f"specialist_{agent_id}", query, n_results, "source_id")
 
-    results: List[dict] = []
-    for src in sources.values():
-        parts = sorted(src["document_parts"], key=lambda x: x[0])
-        full_doc = " ".join(p[1] for p in parts)
-        results.append({"document": full_doc, **src["metadata"]})
 
-    return results[:n_results]
+async def aquery_agent(agent_id: int, query: str, n_results: int = 5) -> List[dict]:
+    """Non-blocking :func:`query_agent` for async handlers."""
+    return await aretrieve(f"specialist_{agent_id}", query, n_results, "source_id")
 
 async def rebuild_agent_with_progress(
     session: AsyncSession,
@@ -300,8 +283,8 @@ async def rebuild_agent_with_progress(
         select(SpecialistSource).where(SpecialistSource.agent_id == agent_id)
     )
     sources = result.scalars().all()
+    _delete_collection(f"specialist_{agent_id}", get_chroma_client())
     collection = _get_collection(agent_id)
-    _delete_collection(f"specialist_{agent_id}", collection)
 
     docs: List[Document] = []
     total = len(sources)
@@ -328,6 +311,7 @@ async def rebuild_agent_with_progress(
         if progress_callback:
             progress_callback(f"embedding documents {len(docs)}")
         _safe_add_documents(collection, docs)
+    mark_index_changed(f"specialist_{agent_id}")
 
     agent = await session.get(Agent, agent_id)
     if agent:
@@ -1,5 +1,14 @@
 import os
-from typing import List, Dict
+import hashlib
+import json
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from uuid import uuid4
+from typing import Callable, Dict, Iterator, List, Literal, Tuple, TypeVar
 
 try:
     from chromadb.errors import ChromaError
@@ -7,19 +16,46 @@ except Exception:  # pragma: no cover - fallback
     class ChromaError(Exception):
         pass
 
-import chromadb
 from langchain_chroma import Chroma
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain.docstore.document import Document
-from langchain_huggingface import HuggingFaceEmbeddings
 
+from app.config import settings
+from app.cache import TTLCache
+from app.crud.crud_embedding_cache import CachedEmbeddings, EmbeddingCache, normalize_query, text_hash
+from app.embeddings import EMBEDDING_MODEL, get_embedding_model
+from app.vector_store import VectorClient, create_vector_client
 
 
-_embedding_fn = HuggingFaceEmbeddings(
-    model_name="sentence-transformers/all-mpnet-base-v2",
-      model_kwargs={"device": "cpu"}
+_embedding_cache = EmbeddingCache(
+    settings.embedding_cache_path,
+    max_entries=settings.embedding_cache_max_entries,
 )
 
+# Shared by the world and specialist collections: chunks whose text was
+# embedded before are read back from the cache instead of re-encoded.
+# The model itself is only loaded on first use (see ``app.embeddings``).
+_query_cache = TTLCache(settings.query_cache_size, settings.query_cache_ttl)
+
+_embedding_fn = CachedEmbeddings(
+    get_embedding_model(),
+    _embedding_cache,
+    EMBEDDING_MODEL,
+    query_cache=_query_cache,
+)
+
+# Grouped retrieval results keyed by (collection, index generation,
+# query hash, n); see ``mark_index_changed``.
+_result_cache = TTLCache(settings.result_cache_size, settings.result_cache_ttl)
+
+
+def cache_metrics() -> dict:
+    return {
+        "embedding_cache": _embedding_cache.stats(),
+        "query_embedding_cache": _query_cache.stats(),
+        "result_cache": _result_cache.stats(),
+    }
+
 
 _text_splitter = RecursiveCharacterTextSplitter(
     chunk_size=300,
@@ -28,8 +64,10 @@ _text_splitter = RecursiveCharacterTextSplitter(
 )
 
 
-def _safe_add_documents(collection: Chroma, docs: List[Document]) -> None:
-    """Safely add documents, splitting on 413 errors."""
+def _safe_add_documents(
+    collection: Chroma, docs: List[Document], ids: List[str] | None = None
+) -> None:
+    """Safely add (or upsert, when ``ids`` are given) documents, splitting on 413 errors."""
 
     client = collection._collection._client
     try:
@@ -44,11 +82,14 @@ def _safe_add_documents(collection: Chroma, docs: List[Document]) -> None:
     if not isinstance(max_size, int) or max_size <= 0 or max_size > 100:
         max_size = 100
 
-    def _add_batch(batch: List[Document]) -> None:
+    def _add_batch(batch: List[Document], batch_ids: List[str] | None) -> None:
         if not batch:
             return
         try:
-            collection.add_documents(batch)
+            if batch_ids:
+                collection.add_documents(batch, ids=batch_ids)
+            else:
+                collection.add_documents(batch)
         except Exception as exc:
             msg = str(exc).lower()
             if (
@@ -58,47 +99,91 @@ def _safe_add_documents(collection: Chroma, docs: List[Document]) -> None:
                 or "413" in msg
             ) and len(batch) > 1:
                 mid = len(batch) // 2
-                _add_batch(batch[:mid])
-                _add_batch(batch[mid:])
+                _add_batch(batch[:mid], batch_ids[:mid] if batch_ids else None)
+                _add_batch(batch[mid:], batch_ids[mid:] if batch_ids else None)
             else:
                 raise
 
     for i in range(0, len(docs), max_size):
-        _add_batch(docs[i : i + max_size])
+        _add_batch(docs[i : i + max_size], ids[i : i + max_size] if ids else None)
 
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
+from sqlalchemy import delete
 from datetime import datetime, timezone
 
 from app.models.model_page import Page, PageCharacteristicValue
 from app.models.model_concept import Concept
 from app.models.model_characteristic import Characteristic
 from app.models.model_agent import Agent
-from app.config import settings
+from app.models.model_vectordb import VectorChunk
+
+T = TypeVar("T")
 
 
-# Persistent client storing collections under ./vector_db. ``chromadb``
-# expects a filesystem path. ``settings.vector_db_path`` already contains
-# the default path, but the location can be overridden with the
-# ``VECTOR_DB_PATH`` environment variable.  The previous implementation
-# attempted to read an environment variable whose name was the path
-# itself which resulted in ``None`` being passed to ``PersistentClient``
-# and therefore created an in-memory database.  Use the provided setting
-# directly and fall back to it if the environment variable is not set.
-_db_path = os.getenv("VECTOR_DB_PATH", settings.vector_db_path)
+def _generation_path(name: str) -> str:
+    return os.path.join(settings.vector_db_path, "index_generations", name)
 
-chromadbURL = os.getenv("VECTOR_DB_URL", settings.vector_db_url)
-chromadbPort = int(os.getenv("VECTOR_DB_PORT", settings.vector_db_port))
 
-# Ensure the directory exists so ``chromadb`` can persist collections
-os.makedirs(_db_path, exist_ok=True)
+# name -> (monotonic time of the last check, file mtime, generation)
+_generations: Dict[str, Tuple[float, float, str]] = {}
 
-# _client = chromadb.PersistentClient(path=_db_path)
+
+def _read_generation(name: str) -> Tuple[float, str]:
+    path = _generation_path(name)
+    try:
+        mtime = os.stat(path).st_mtime
+        with open(path) as f:
+            return mtime, f.read()
+    except FileNotFoundError:
+        return 0.0, ""
+
+
+def index_generation(name: str) -> str:
+    """Current generation token of a collection's index ("" if never changed).
+
+    Kept in memory; the file is only looked at again (its mtime first)
+    after ``settings.index_generation_ttl`` seconds.
+    """
+    now = time.monotonic()
+    cached = _generations.get(name)
+    if cached and now - cached[0] < settings.index_generation_ttl:
+        return cached[2]
+    if cached:
+        try:
+            mtime = os.stat(_generation_path(name)).st_mtime
+        except FileNotFoundError:
+            mtime = 0.0
+        if mtime == cached[1]:
+            _generations[name] = (now, mtime, cached[2])
+            return cached[2]
+    mtime, generation = _read_generation(name)
+    _generations[name] = (now, mtime, generation)
+    return generation
+
+
+def mark_index_changed(name: str) -> None:
+    """Record that the collection's content changed.
+
+    The generation token is part of every result-cache key and lives on
+    disk, so results cached by the API are invalidated by rebuilds that run
+    in a Celery worker too.
+    """
+    path = _generation_path(name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    generation = uuid4().hex
+    with open(tmp, "w") as f:
+        f.write(generation)
+    os.replace(tmp, path)
+    _generations[name] = (time.monotonic(), os.stat(path).st_mtime, generation)
+    _result_cache.invalidate(lambda key: key[0] == name)
 
 
 def _delete_collection(name: str, _client) -> None:
     """Delete a Chroma collection by name if it exists."""
-    
+    invalidate_collection(name)
+    mark_index_changed(name)
     try:
         
         if hasattr(_client, "delete_collection"):
@@ -123,72 +208,115 @@ def _delete_collection(name: str, _client) -> None:
         pass
 
 
-def get_chroma_client():
-    """Return a Chroma client without requiring a running server."""
+_client_lock = threading.Lock()
+_client = None
+_client_pid: int | None = None
 
-    return chromadb.HttpClient(host=chromadbURL, port=chromadbPort)
-    
-    # _db_path = os.getenv("VECTOR_DB_PATH", settings.vector_db_path)
-    # print (f"READING CHROMA CLIENT FROM HERE: " + _db_path)
-    # os.makedirs(_db_path, exist_ok=True)
-    # return chromadb.PersistentClient(path=_db_path)
 
-def _get_collection(world_id: int):
-    name = f"world_{world_id}"
-    client = get_chroma_client()   # <-- Created when function runs, in child process
-    return Chroma(
+def get_chroma_client() -> VectorClient:
+    """Return this process's shared vector store client.
+
+    The backend is picked by ``settings.vector_backend`` (see
+    ``app.vector_store``). The client is created once per process (and
+    again after a fork) so HTTP connections are kept alive between calls.
+    """
+    global _client, _client_pid
+    if _client is None or _client_pid != os.getpid():
+        with _client_lock:
+            if _client is None or _client_pid != os.getpid():
+                _client = create_vector_client()
+                _client_pid = os.getpid()
+    return _client
+
+
+_collections: "OrderedDict[str, Chroma]" = OrderedDict()
+_collections_lock = threading.Lock()
+
+
+def get_cached_collection(name: str) -> Chroma:
+    """Return a (possibly cached) langchain handle for the collection ``name``.
+
+    Handles are kept in a small LRU keyed by collection name; an entry is
+    only reused while it still points at the current client and embedding
+    function.
+    """
+    client = get_chroma_client()
+    with _collections_lock:
+        collection = _collections.get(name)
+        if (
+            collection is not None
+            and collection._client is client
+            and collection._embedding_function is _embedding_fn
+        ):
+            _collections.move_to_end(name)
+            return collection
+
+    collection = Chroma(
         client=client,
         collection_name=name,
         embedding_function=_embedding_fn,
     )
+    with _collections_lock:
+        _collections[name] = collection
+        _collections.move_to_end(name)
+        while len(_collections) > max(settings.chroma_collection_cache_size, 1):
+            _collections.popitem(last=False)
+    return collection
 
 
-# def _get_collection(world_id: int):
-#     name = f"world_{world_id}"
-#     return Chroma(
-#         client=_client,
-#         collection_name=name,
-#         embedding_function=_embedding_fn,
-#     )
+def invalidate_collection(name: str) -> None:
+    with _collections_lock:
+        _collections.pop(name, None)
 
 
-async def add_page(session: AsyncSession, page_id: int):
-    result = await session.execute(
-        select(Page).where(Page.id == page_id)
-    )
-    page = result.scalar_one_or_none()    
+def with_collection(name: str, fn: Callable[[Chroma], T]) -> T:
+    """Run ``fn`` on the cached handle of ``name``.
 
-    if not page:
-        return None
+    A cached handle goes stale when another process drops and recreates
+    the collection (e.g. a full rebuild in a Celery worker), so on failure
+    the handle is rebuilt and ``fn`` retried once. Only use it for
+    idempotent operations.
+    """
+    try:
+        return fn(get_cached_collection(name))
+    except Exception:
+        invalidate_collection(name)
+        return fn(get_cached_collection(name))
 
-    # Load related concept
-    concept = await session.get(Concept, page.concept_id)    
 
-    # Load characteristic values
-    values = await session.execute(
-        select(PageCharacteristicValue, Characteristic)
-        .join(Characteristic, PageCharacteristicValue.characteristic_id == Characteristic.id)
-        .where(PageCharacteristicValue.page_id == page.id)
-    )    
-    char_texts = []
-    for val, char in values.all():
-        if val.value is None:
-            continue
-        val_str = ", ".join(val.value) if isinstance(val.value, list) else str(val.value)
-        char_texts.append(f"{char.name}: {val_str}")
+def _get_collection(world_id: int):
+    return get_cached_collection(f"world_{world_id}")
+
+
+def chunk_id(page_id: int, chunk_index: int) -> str:
+    """Deterministic Chroma id of a page chunk."""
+    return f"page-{page_id}-{chunk_index}"
+
+
+def _chunk_hash(doc: Document) -> str:
+    """sha256 of the chunk text plus its metadata (a rename must reindex)."""
+    meta = json.dumps(doc.metadata, sort_keys=True, default=str)
+    return hashlib.sha256(f"{meta}\n{doc.page_content}".encode("utf-8")).hexdigest()
+
 
-    
+def _char_text(char: Characteristic, value) -> str | None:
+    if value is None:
+        return None
+    val_str = ", ".join(value) if isinstance(value, list) else str(value)
+    return f"{char.name}: {val_str}"
+
+
+def _build_page_documents(page: Page, concept: Concept | None, char_texts: List[str]) -> List[Document]:
+    """Chunk the indexed text of a page (content, concept and characteristics)."""
     doc_parts = [page.content or ""]
     doc_parts.append(page.autogenerated_content or "")
-    
-    
+
     if concept:
         doc_parts.append(concept.description or "")
     if char_texts:
         doc_parts.append("\n".join(char_texts))
     document = "\n".join(doc_parts)
 
-    # print (f" --- FINAL DOCUMENT: {document}")
     metadata = {
         "page_id": page.id,
         "gameworld_id": page.gameworld_id,
@@ -196,75 +324,429 @@ async def add_page(session: AsyncSession, page_id: int):
         "title": page.name,
     }
 
-
-    collection = _get_collection(page.gameworld_id)
-
     docs = _text_splitter.create_documents([document], metadatas=[metadata])
     for i, doc in enumerate(docs):
         doc.metadata["chunk_index"] = i
+    return docs
 
-    # ``chromadb`` can fail on very large batches, so split the data into
-    # reasonable chunks based on the client's advertised limit.
-    _safe_add_documents(collection, docs)
-   
 
-    # print (f" --- API VECTORDB - Page added to the chromadb!")
-    return True
+async def _page_documents(session: AsyncSession, page: Page) -> List[Document]:
+    """Build the chunked documents indexed for a page."""
+    # Load related concept
+    concept = await session.get(Concept, page.concept_id)
 
+    # Load characteristic values
+    values = await session.execute(
+        select(PageCharacteristicValue, Characteristic)
+        .join(Characteristic, PageCharacteristicValue.characteristic_id == Characteristic.id)
+        .where(PageCharacteristicValue.page_id == page.id)
+    )
+    char_texts = [t for t in (_char_text(char, val.value) for val, char in values.all()) if t]
+    return _build_page_documents(page, concept, char_texts)
 
-async def rebuild_world(session: AsyncSession, world_id: int):
-    name = f"world_{world_id}"
 
-    collection = _get_collection(world_id)
+async def _world_documents(
+    session: AsyncSession, world_id: int
+) -> Tuple[List[Page], Iterator[Tuple[Page, List[Document]]]]:
+    """Load a world's pages with three bulk queries and chunk them lazily."""
+    result = await session.execute(select(Page).where(Page.gameworld_id == world_id))
+    pages = result.scalars().all()
 
-    print (f" --- INSIDE REBUILD WORKD: {world_id} --- ")
+    concept_ids = {p.concept_id for p in pages}
+    result = await session.execute(select(Concept).where(Concept.id.in_(concept_ids)))
+    concepts = {c.id: c for c in result.scalars().all()}
 
-    _delete_collection(name, collection)
-    print (f" --- COLLECTION DELETED!")
+    values = await session.execute(
+        select(PageCharacteristicValue.page_id, PageCharacteristicValue.value, Characteristic)
+        .join(Characteristic, PageCharacteristicValue.characteristic_id == Characteristic.id)
+        .join(Page, Page.id == PageCharacteristicValue.page_id)
+        .where(Page.gameworld_id == world_id)
+    )
+    char_texts: Dict[int, List[str]] = {}
+    for page_id, value, char in values.all():
+        text = _char_text(char, value)
+        if text:
+            char_texts.setdefault(page_id, []).append(text)
+
+    def chunks():
+        for page in pages:
+            yield page, _build_page_documents(
+                page, concepts.get(page.concept_id), char_texts.get(page.id, [])
+            )
+
+    return pages, chunks()
+
+
+def _upsert_embedded(collection: Chroma, docs: List[Document], ids: List[str]) -> None:
+    """Embed ``docs`` in one batch and upsert them with their vectors."""
+    if not docs:
+        return
+    embeddings = _embedding_fn.embed_documents([d.page_content for d in docs])
+    raw = collection._collection
+    client = getattr(raw, "_client", None)
+    try:
+        max_size = client.get_max_batch_size() if hasattr(client, "get_max_batch_size") else 0
+    except Exception:
+        max_size = 0
+    if not isinstance(max_size, int) or max_size <= 0:
+        max_size = len(docs)
+    for i in range(0, len(docs), max_size):
+        raw.upsert(
+            ids=ids[i : i + max_size],
+            embeddings=embeddings[i : i + max_size],
+            documents=[d.page_content for d in docs[i : i + max_size]],
+            metadatas=[d.metadata for d in docs[i : i + max_size]],
+        )
 
-       # collection = _get_collection(world_id)
 
-    # print (f" - API VECTORDB - Collection: {collection}")
+class _EmbeddingBatcher:
+    """Collect changed chunks across pages and embed them in large batches."""
 
-    result = await session.execute(select(Page.id).where(Page.gameworld_id == world_id))
+    def __init__(self, collection: Chroma, batch_size: int | None = None):
+        self.collection = collection
+        self.batch_size = max(1, batch_size or settings.vector_embed_batch_size)
+        self.docs: List[Document] = []
+        self.ids: List[str] = []
+        self.embedded = 0
+        self.seconds = 0.0
 
-    page_ids = [row[0] for row in result.all()]
-    for pid in page_ids:
+    def add(self, docs: List[Document], ids: List[str]) -> None:
+        self.docs.extend(docs)
+        self.ids.extend(ids)
+        while len(self.docs) >= self.batch_size:
+            self._flush(self.batch_size)
 
-        await add_page(session, pid)
+    def flush(self) -> None:
+        while self.docs:
+            self._flush(self.batch_size)
 
-       # update agents in this world with current time
+    def _flush(self, n: int) -> None:
+        docs, self.docs = self.docs[:n], self.docs[n:]
+        ids, self.ids = self.ids[:n], self.ids[n:]
+        start = time.perf_counter()
+        _upsert_embedded(self.collection, docs, ids)
+        self.seconds += time.perf_counter() - start
+        self.embedded += len(docs)
+
+    @property
+    def chunks_per_sec(self) -> float:
+        return round(self.embedded / self.seconds, 2) if self.seconds else 0.0
+
+
+def _collection_count(collection: Chroma) -> int | None:
+    try:
+        return collection._collection.count()
+    except Exception:
+        return None
+
+
+def _diff_page_chunks(
+    session: AsyncSession,
+    world_id: int,
+    page_id: int,
+    docs: List[Document],
+    manifest: Dict[int, VectorChunk],
+) -> Tuple[List[Document], List[str], int, List[VectorChunk]]:
+    """Compare a page's chunks with its manifest rows.
+
+    ``manifest`` maps chunk index to the page's manifest rows. New and
+    changed rows are updated in the session. Returns the chunks to embed
+    with their ids, the number of unchanged chunks and the manifest rows of
+    chunks that no longer exist, for the caller to delete.
+    """
+    changed_docs: List[Document] = []
+    changed_ids: List[str] = []
+    unchanged = 0
+    for doc in docs:
+        idx = doc.metadata["chunk_index"]
+        digest = _chunk_hash(doc)
+        row = manifest.get(idx)
+        if row is not None and row.text_hash == digest:
+            unchanged += 1
+            continue
+        changed_docs.append(doc)
+        changed_ids.append(chunk_id(page_id, idx))
+        if row is None:
+            session.add(VectorChunk(
+                world_id=world_id,
+                page_id=page_id,
+                chunk_index=idx,
+                text_hash=digest,
+                model=EMBEDDING_MODEL,
+            ))
+        else:
+            row.text_hash = digest
+
+    stale = [row for idx, row in manifest.items() if idx >= len(docs)]
+    return changed_docs, changed_ids, unchanged, stale
+
+
+async def _touch_world_agents(session: AsyncSession, world_id: int, only_built: bool = False) -> None:
+    """Stamp ``vector_db_update_date`` on the agents of a world."""
     agent_result = await session.execute(select(Agent).where(Agent.world_id == world_id))
-    agents = agent_result.scalars().all()
     now = datetime.now(timezone.utc)
-    for agent in agents:
+    for agent in agent_result.scalars().all():
+        if only_built and agent.vector_db_update_date is None:
+            continue
         agent.vector_db_update_date = now
+
+
+def page_version(page: Page | None) -> str:
+    """Token identifying the current revision of a page (``""`` once deleted)."""
+    if page is None:
+        return ""
+    stamp = page.updated_at or page.created_at
+    if stamp is None:
+        return ""
+    return stamp.replace(tzinfo=None).isoformat(timespec="microseconds")
+
+
+def schedule_reindex(page: Page, deleted: bool = False) -> None:
+    """Queue a debounced re-embed of the page's vector chunks.
+
+    The task carries the page revision it was scheduled for, so only the
+    last of a burst of edits actually re-embeds the page.
+    """
+    from app.task_queue import task_reindex_page
+    version = "" if deleted else page_version(page)
+    task_reindex_page.apply_async(
+        (page.id, page.gameworld_id, version),
+        countdown=settings.vector_reindex_delay,
+    )
+
+
+async def reindex_page(session: AsyncSession, page_id: int, world_id: int | None = None) -> dict | None:
+    """Replace exactly one page's chunks in its world collection.
+
+    Unchanged chunks are kept, so re-running it is cheap and never
+    duplicates chunks. When the page no longer exists its chunks are
+    removed from ``world_id``'s collection.
+    """
+    page = await session.get(Page, page_id)
+    if page:
+        world_id = page.gameworld_id
+    if world_id is None:
+        return None
+
+    result = await session.execute(
+        select(VectorChunk)
+        .where(VectorChunk.world_id == world_id)
+        .where(VectorChunk.page_id == page_id)
+    )
+    manifest = {row.chunk_index: row for row in result.scalars().all()}
+    if not page and not manifest:
+        return None
+
+    docs = await _page_documents(session, page) if page else []
+    changed_docs, changed_ids, unchanged, stale = _diff_page_chunks(
+        session, world_id, page_id, docs, manifest
+    )
+
+    def apply(collection: Chroma) -> None:
+        _upsert_embedded(collection, changed_docs, changed_ids)
+        if stale:
+            collection.delete(ids=[chunk_id(page_id, row.chunk_index) for row in stale])
+
+    with_collection(f"world_{world_id}", apply)
+    for row in stale:
+        await session.delete(row)
+
+    # Agents that never built their index stay unavailable
+    await _touch_world_agents(session, world_id, only_built=True)
     await session.commit()
+    mark_index_changed(f"world_{world_id}")
+    return {
+        "chunks_embedded": len(changed_docs),
+        "chunks_unchanged": unchanged,
+        "chunks_deleted": len(stale),
+    }
 
-    return len(page_ids)
 
+async def add_page(session: AsyncSession, page_id: int):
+    page = await session.get(Page, page_id)
+    if not page:
+        return None
+    await reindex_page(session, page_id)
+    return True
 
-def query_world(world_id: int, query: str, n_results: int = 5) -> List[Dict]:
-    """Query the vector DB for documents related to the given query."""
+
+async def rebuild_world(
+    session: AsyncSession,
+    world_id: int,
+    mode: Literal["full", "incremental"] = "incremental",
+) -> dict:
+    """Rebuild the world's vector collection.
+
+    ``incremental`` compares every chunk with the stored manifest and only
+    embeds new or changed chunks, deleting the chunks of removed pages.
+    It falls back to ``full`` when the manifest can't be trusted (different
+    embedding model, or the collection doesn't hold what it lists).
+
+    Pages are loaded in bulk and the changed chunks of many pages are
+    embedded together in batches of ``settings.vector_embed_batch_size``.
+    """
+    name = f"world_{world_id}"
     collection = _get_collection(world_id)
-    retrieved = collection.max_marginal_relevance_search(query, k=n_results * 4)
 
-    pages: Dict[int, Dict] = {}
+    result = await session.execute(select(VectorChunk).where(VectorChunk.world_id == world_id))
+    rows = result.scalars().all()
+
+    if mode == "incremental" and (
+        any(row.model != EMBEDDING_MODEL for row in rows)
+        or _collection_count(collection) != len(rows)
+    ):
+        mode = "full"
+
+    manifest: Dict[int, Dict[int, VectorChunk]] = {}
+    if mode == "full":
+        _delete_collection(name, get_chroma_client())
+        await session.execute(delete(VectorChunk).where(VectorChunk.world_id == world_id))
+        collection = _get_collection(world_id)
+    else:
+        for row in rows:
+            manifest.setdefault(row.page_id, {})[row.chunk_index] = row
+
+    pages, page_chunks = await _world_documents(session, world_id)
+
+    stats = {"mode": mode, "pages_indexed": len(pages), "chunks_embedded": 0, "chunks_unchanged": 0, "chunks_deleted": 0}
+    batcher = _EmbeddingBatcher(collection)
+    hits, misses = _embedding_cache.hits, _embedding_cache.misses
+    stale: List[VectorChunk] = []
+    for page, docs in page_chunks:
+        changed_docs, changed_ids, unchanged, page_stale = _diff_page_chunks(
+            session, world_id, page.id, docs, manifest.pop(page.id, {})
+        )
+        batcher.add(changed_docs, changed_ids)
+        stats["chunks_unchanged"] += unchanged
+        stale.extend(page_stale)
+    batcher.flush()
+    stats["chunks_embedded"] = batcher.embedded
+    stats["embed_seconds"] = round(batcher.seconds, 3)
+    stats["chunks_per_sec"] = batcher.chunks_per_sec
+    stats["embedding_cache_hits"] = _embedding_cache.hits - hits
+    stats["embedding_cache_misses"] = _embedding_cache.misses - misses
+
+    # Pages that no longer exist, and chunks past the end of shrunk pages
+    stale.extend(row for page_rows in manifest.values() for row in page_rows.values())
+    if stale:
+        collection.delete(ids=[chunk_id(row.page_id, row.chunk_index) for row in stale])
+        stats["chunks_deleted"] = len(stale)
+    for row in stale:
+        await session.delete(row)
+
+    # update agents in this world with current time
+    await _touch_world_agents(session, world_id)
+    await session.commit()
+    mark_index_changed(name)
+
+    return stats
+
+
+# Retrieval runs off the event loop: query embeddings in one bounded pool,
+# vector searches in a pool per backend whose size is that backend's
+# concurrency limit. Requests beyond the limits queue up without blocking
+# the loop.
+_embed_pool = ThreadPoolExecutor(
+    max_workers=max(settings.query_embedding_threads, 1),
+    thread_name_prefix="query-embed",
+)
+_search_pools: Dict[str, ThreadPoolExecutor] = {}
+_search_pools_lock = threading.Lock()
+
+
+def _search_pool() -> ThreadPoolExecutor:
+    backend = settings.vector_backend
+    with _search_pools_lock:
+        pool = _search_pools.get(backend)
+        if pool is None:
+            limit = settings.vector_search_concurrency.get(backend, 8)
+            pool = ThreadPoolExecutor(max_workers=max(limit, 1), thread_name_prefix=f"search-{backend}")
+            _search_pools[backend] = pool
+    return pool
+
+
+async def embed_query_async(query: str) -> List[float]:
+    lookup = getattr(_embedding_fn, "lookup_query", None)
+    vector = lookup(query) if lookup else None
+    if vector is not None:
+        return vector
+    compute = getattr(_embedding_fn, "compute_query", _embedding_fn.embed_query)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_embed_pool, compute, query)
+
+
+async def search_collection_async(name: str, embedding: List[float], k: int) -> List[Document]:
+    """MMR search of ``name`` in the backend's search pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _search_pool(),
+        partial(
+            with_collection,
+            name,
+            lambda collection: collection.max_marginal_relevance_search_by_vector(embedding, k=k),
+        ),
+    )
+
+
+def group_chunks(retrieved: List[Document], key: str, n_results: int) -> List[Dict]:
+    """Merge retrieved chunks into one document per ``key`` (page or source)."""
+    grouped: Dict[int, Dict] = {}
     for doc in retrieved:
         meta = doc.metadata or {}
-        page_id = meta.get("page_id")
-        if page_id is None:
+        item_id = meta.get(key)
+        if item_id is None:
             continue
-        entry = pages.setdefault(
-            page_id,
+        entry = grouped.setdefault(
+            item_id,
             {"document_parts": [], "metadata": {k: v for k, v in meta.items() if k != "chunk_index"}},
         )
         entry["document_parts"].append((meta.get("chunk_index", 0), doc.page_content))
 
     results: List[Dict] = []
-    for page in pages.values():
-        parts = sorted(page["document_parts"], key=lambda x: x[0])
+    for item in grouped.values():
+        parts = sorted(item["document_parts"], key=lambda x: x[0])
         full_doc = " ".join(p[1] for p in parts)
-        results.append({"document": full_doc, **page["metadata"]})
+        results.append({"document": full_doc, **item["metadata"]})
 
     return results[:n_results]
+
+
+def _result_key(name: str, query: str, n_results: int) -> tuple:
+    return (name, index_generation(name), text_hash(normalize_query(query)), n_results)
+
+
+def retrieve(name: str, query: str, n_results: int, group_key: str) -> List[Dict]:
+    """Cached MMR retrieval of ``name``, grouped by ``group_key``."""
+    key = _result_key(name, query, n_results)
+    results = _result_cache.get(key)
+    if results is None:
+        embedding = _embedding_fn.embed_query(query)
+        retrieved = with_collection(
+            name,
+            lambda collection: collection.max_marginal_relevance_search_by_vector(embedding, k=n_results * 4),
+        )
+        results = group_chunks(retrieved, group_key, n_results)
+        _result_cache.set(key, results)
+    return [dict(r) for r in results]
+
+
+async def aretrieve(name: str, query: str, n_results: int, group_key: str) -> List[Dict]:
+    """Non-blocking :func:`retrieve` for async handlers."""
+    key = _result_key(name, query, n_results)
+    results = _result_cache.get(key)
+    if results is None:
+        embedding = await embed_query_async(query)
+        retrieved = await search_collection_async(name, embedding, n_results * 4)
+        results = group_chunks(retrieved, group_key, n_results)
+        _result_cache.set(key, results)
+    return [dict(r) for r in results]
+
+
+def query_world(world_id: int, query: str, n_results: int = 5) -> List[Dict]:
+    """Query the vector DB for documents related to the given query."""
+    return retrieve(f"world_{world_id}", query, n_results, "page_id")
+
+
+async def aquery_world(world_id: int, query: str, n_results: int = 5) -> List[Dict]:
+    """Non-blocking :func:`query_world` for async handlers."""
+    return await aretrieve(f"world_{world_id}", query, n_results, "page_id")
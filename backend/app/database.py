@@ -9,9 +9,15 @@ engine = create_async_engine(DATABASE_URL, echo=True, future=True)
 async_session_maker = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
 
 async def init_db():
+    from app.crud.crud_chat_history import import_json_history, mark_imported
+
     async with engine.begin() as conn:
         await conn.run_sync(SQLModel.metadata.create_all)
         await conn.run_sync(_migrate)
+        # -- Chat history: move the per-user JSON files into chat_message --
+        imported = await conn.run_sync(import_json_history)
+    # only once the rows are committed
+    mark_imported(imported)
 
 def _migrate(conn):
     """Simple migration to add new columns without dropping data."""
@@ -37,6 +43,11 @@ def _migrate(conn):
     if "updated_by_agent_id" not in columns:
         conn.execute(text("ALTER TABLE page ADD COLUMN updated_by_agent_id INTEGER REFERENCES agent(id)"))
 
+    # -- GameWorld table migrations --
+    columns = [c["name"] for c in inspector.get_columns("gameworld")]
+    if "analysis_mode" not in columns:
+        conn.execute(text("ALTER TABLE gameworld ADD COLUMN analysis_mode TEXT"))
+
     # -- SpecialistSource table --
     if "specialistsource" not in inspector.get_table_names():
         conn.execute(text(
@@ -47,6 +58,73 @@ def _migrate(conn):
         if "name" not in columns:
             conn.execute(text("ALTER TABLE specialistsource ADD COLUMN name TEXT"))
 
+    # -- One-off data migrations, recorded so they run only once --
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS data_migration (name VARCHAR PRIMARY KEY, applied_at DATETIME NOT NULL)"
+    ))
+    applied = {row[0] for row in conn.execute(text("SELECT name FROM data_migration"))}
+
+    # -- Page token index and link graph: backfill existing pages once --
+    if "page_index_backfill" not in applied:
+        has_tokens = conn.execute(text("SELECT 1 FROM pagetoken LIMIT 1")).first()
+        has_links = conn.execute(text("SELECT 1 FROM pagelink LIMIT 1")).first()
+        if not has_tokens or not has_links:
+            _backfill_page_index(conn, tokens=not has_tokens, links=not has_links)
+        _mark_applied(conn, "page_index_backfill")
+
+def _mark_applied(conn, name: str):
+    from datetime import datetime, timezone
+    from sqlalchemy import text
+
+    conn.execute(
+        text("INSERT INTO data_migration (name, applied_at) VALUES (:name, :at)"),
+        {"name": name, "at": datetime.now(timezone.utc)},
+    )
+
+def _backfill_page_index(conn, tokens: bool, links: bool):
+    """Index the words and outgoing links of every page."""
+    from sqlalchemy import text
+    from app.crud.crud_crosslink_matcher import analyze_html
+
+    token_rows = []
+    link_rows = set()
+    pages = conn.execute(text("SELECT id, content, autogenerated_content FROM page")).all()
+    for page_id, content, autogenerated_content in pages:
+        page_tokens = set()
+        for kind, html in (("html_link", content), ("autogen_link", autogenerated_content)):
+            field_tokens, targets = analyze_html(html)
+            page_tokens.update(field_tokens)
+            link_rows.update((page_id, t, kind) for t in targets if t != page_id)
+        token_rows.extend({"page_id": page_id, "token": t} for t in page_tokens)
+
+    if links:
+        import json
+        refs = conn.execute(text(
+            "SELECT v.page_id, v.value FROM pagecharacteristicvalue v "
+            "JOIN characteristic c ON c.id = v.characteristic_id WHERE c.type = 'page_ref'"
+        )).all()
+        for page_id, value in refs:
+            if isinstance(value, str):
+                try:
+                    value = json.loads(value)
+                except ValueError:
+                    continue
+            for ref in value if isinstance(value, list) else [value]:
+                try:
+                    link_rows.add((page_id, int(ref), "page_ref"))
+                except (TypeError, ValueError):
+                    continue
+        if link_rows:
+            conn.execute(
+                text("INSERT INTO pagelink (source_page_id, target_page_id, kind) VALUES (:s, :t, :k)"),
+                [{"s": s, "t": t, "k": k} for s, t, k in link_rows],
+            )
+    if tokens and token_rows:
+        conn.execute(
+            text("INSERT INTO pagetoken (page_id, token) VALUES (:page_id, :token)"),
+            token_rows,
+        )
+
 async def get_session() -> AsyncSession:
     async with async_session_maker() as session:
         yield session
@@ -0,0 +1,188 @@
+"""Embedding model access shared by the API, Celery workers and scripts.
+
+The sentence-transformers model is only loaded on first use and kept as a
+per-process singleton. When ``EMBEDDING_WORKER_SOCKET`` is set, processes
+instead send their texts to a single embedding worker over a Unix socket,
+so only one copy of the model is held in memory per host. Start it with::
+
+    python -m app.embeddings
+"""
+import json
+import logging
+import os
+import socket
+import socketserver
+import struct
+import threading
+from typing import Callable, List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_MODEL = "sentence-transformers/all-mpnet-base-v2"
+
+
+def _load_huggingface() -> Embeddings:
+    # Importing langchain_huggingface pulls in torch, keep it off the import path
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    logger.info("Loading embedding model %s", EMBEDDING_MODEL)
+    return HuggingFaceEmbeddings(
+        model_name=EMBEDDING_MODEL,
+        model_kwargs={"device": "cpu"}
+    )
+
+
+class LazyEmbeddings(Embeddings):
+    """Build the wrapped model on first use (thread-safe)."""
+
+    def __init__(self, factory: Callable[[], Embeddings]):
+        self._factory = factory
+        self._model: Optional[Embeddings] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._model is not None
+
+    @property
+    def model(self) -> Embeddings:
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    self._model = self._factory()
+        return self._model
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.model.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.model.embed_query(text)
+
+
+# --- Unix socket protocol: 4-byte big-endian length + JSON body ---
+
+def _send(sock: socket.socket, payload: dict) -> None:
+    body = json.dumps(payload).encode("utf-8")
+    sock.sendall(struct.pack(">I", len(body)) + body)
+
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    buf = bytearray()
+    while len(buf) < size:
+        part = sock.recv(size - len(buf))
+        if not part:
+            raise ConnectionError("embedding worker closed the connection")
+        buf.extend(part)
+    return bytes(buf)
+
+
+def _recv(sock: socket.socket) -> dict:
+    (size,) = struct.unpack(">I", _recv_exact(sock, 4))
+    return json.loads(_recv_exact(sock, size))
+
+
+class RemoteEmbeddings(Embeddings):
+    """Client of the embedding worker listening on ``socket_path``."""
+
+    def __init__(self, socket_path: str, timeout: float = 300.0):
+        self.socket_path = socket_path
+        self.timeout = timeout
+
+    def _call(self, payload: dict) -> dict:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+            _send(sock, payload)
+            reply = _recv(sock)
+        if "error" in reply:
+            raise RuntimeError(f"embedding worker: {reply['error']}")
+        return reply
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        return self._call({"op": "documents", "texts": list(texts)})["vectors"]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._call({"op": "query", "text": text})["vector"]
+
+    def ping(self) -> bool:
+        return self._call({"op": "ping"}).get("ok", False)
+
+
+_local_model = LazyEmbeddings(_load_huggingface)
+
+
+def get_embedding_model() -> Embeddings:
+    """Return the embedding model for this process.
+
+    Uses the shared embedding worker when ``settings.embedding_worker_socket``
+    is configured, otherwise the lazily loaded in-process model.
+    """
+    if settings.embedding_worker_socket:
+        return RemoteEmbeddings(settings.embedding_worker_socket)
+    return _local_model
+
+
+def warm_embeddings() -> None:
+    """Load the model (or check the worker is reachable) ahead of the first request."""
+    model = get_embedding_model()
+    if isinstance(model, RemoteEmbeddings):
+        model.ping()
+    else:
+        model.embed_query("warm up")
+
+
+class _EmbeddingRequestHandler(socketserver.BaseRequestHandler):
+    def handle(self) -> None:
+        try:
+            request = _recv(self.request)
+        except (ConnectionError, ValueError, struct.error):
+            return
+        model: Embeddings = self.server.model  # type: ignore[attr-defined]
+        try:
+            op = request.get("op")
+            if op == "documents":
+                reply = {"vectors": model.embed_documents(request.get("texts") or [])}
+            elif op == "query":
+                reply = {"vector": model.embed_query(request.get("text") or "")}
+            elif op == "ping":
+                reply = {"ok": True}
+            else:
+                reply = {"error": f"unknown op {op!r}"}
+        except Exception as exc:  # pragma: no cover - defensive
+            logger.exception("Embedding request failed")
+            reply = {"error": str(exc)}
+        _send(self.request, reply)
+
+
+class EmbeddingWorker(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, model: Embeddings):
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        os.makedirs(os.path.dirname(os.path.abspath(socket_path)), exist_ok=True)
+        self.model = model
+        super().__init__(socket_path, _EmbeddingRequestHandler)
+
+
+def serve(socket_path: Optional[str] = None) -> None:
+    socket_path = socket_path or settings.embedding_worker_socket or "./data/embeddings.sock"
+    _local_model.model  # load before accepting connections
+    with EmbeddingWorker(socket_path, _local_model) as server:
+        logger.info("Embedding worker listening on %s", socket_path)
+        try:
+            server.serve_forever()
+        finally:
+            if os.path.exists(socket_path):
+                os.unlink(socket_path)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    serve()
@@ -0,0 +1,158 @@
+"""Push-based job progress.
+
+Workers publish every status change of a job on the ``jobs:<job_id>`` Redis
+channel. Each API process keeps a single pattern subscription on ``jobs:*``
+and fans the messages out to the local ``/jobs/{id}/events`` streams of that
+job, so a client watching a job costs nothing until the job reports.
+
+With a non-Redis broker (tests, single process runs) events are delivered
+in-process. Publishing is best effort: the job table stays the source of
+truth, and streams fall back to re-reading it when nothing arrives.
+"""
+import asyncio
+import json
+import logging
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional, Set
+from weakref import WeakKeyDictionary
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+CHANNEL_PREFIX = "jobs:"
+QUEUE_SIZE = 256
+
+
+def _events_url() -> str:
+    return settings.job_events_url or settings.celery_broker_url
+
+
+def uses_redis() -> bool:
+    return _events_url().startswith(("redis://", "rediss://", "unix://"))
+
+
+# one Redis client per event loop, Celery tasks each run their own loop
+_clients: "WeakKeyDictionary[asyncio.AbstractEventLoop, object]" = WeakKeyDictionary()
+
+
+def _client():
+    import redis.asyncio as redis
+
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = redis.from_url(_events_url(), decode_responses=True)
+        _clients[loop] = client
+    return client
+
+
+async def close_publisher() -> None:
+    """Close the current loop's Redis connection (end of a Celery task)."""
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+async def publish(job_id: str, event: str, data: dict) -> None:
+    """Send ``data`` as ``event`` to everyone watching ``job_id``."""
+    message = {"event": event, "job_id": job_id, **data}
+    if not uses_redis():
+        get_hub().dispatch(job_id, message)
+        return
+    try:
+        await _client().publish(CHANNEL_PREFIX + job_id, json.dumps(message, default=str))
+    except Exception as exc:
+        logger.warning("Could not publish %s event for job %s: %s", event, job_id, exc)
+
+
+class JobEventHub:
+    """Fans job events out to the subscribers of one event loop."""
+
+    def __init__(self):
+        self._queues: Dict[str, Set[asyncio.Queue]] = defaultdict(set)
+        self._reader: Optional[asyncio.Task] = None
+        self._ready = asyncio.Event()
+
+    def dispatch(self, job_id: str, message: dict) -> None:
+        for queue in self._queues.get(job_id, ()):
+            if queue.full():
+                # a slow client loses the oldest update, never blocks the others
+                queue.get_nowait()
+            queue.put_nowait(message)
+
+    @asynccontextmanager
+    async def subscribe(self, job_id: str) -> AsyncIterator[asyncio.Queue]:
+        queue: asyncio.Queue = asyncio.Queue(QUEUE_SIZE)
+        self._queues[job_id].add(queue)
+        if uses_redis():
+            if self._reader is None or self._reader.done():
+                self._ready.clear()
+                self._reader = asyncio.create_task(self._read())
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout=1)
+            except asyncio.TimeoutError:
+                pass
+        try:
+            yield queue
+        finally:
+            queues = self._queues.get(job_id)
+            if queues is not None:
+                queues.discard(queue)
+                if not queues:
+                    del self._queues[job_id]
+
+    async def _read(self) -> None:
+        """Relay Redis messages while anyone is subscribed, reconnecting on errors."""
+        delay = 1
+        while self._queues:
+            pubsub = _client().pubsub()
+            try:
+                await pubsub.psubscribe(CHANNEL_PREFIX + "*")
+                self._ready.set()
+                delay = 1
+                while self._queues:
+                    msg = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                    if msg and msg.get("type") == "pmessage":
+                        job_id = msg["channel"][len(CHANNEL_PREFIX):]
+                        try:
+                            self.dispatch(job_id, json.loads(msg["data"]))
+                        except ValueError:
+                            logger.warning("Ignoring malformed event on %s", msg["channel"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                logger.warning("Job event subscription failed, retrying in %ss: %s", delay, exc)
+                self._ready.clear()
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30)
+            finally:
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+        self._ready.clear()
+
+    def stats(self) -> dict:
+        return {
+            "jobs": len(self._queues),
+            "subscribers": sum(len(q) for q in self._queues.values()),
+        }
+
+
+_hubs: "WeakKeyDictionary[asyncio.AbstractEventLoop, JobEventHub]" = WeakKeyDictionary()
+
+
+def get_hub() -> JobEventHub:
+    loop = asyncio.get_running_loop()
+    hub = _hubs.get(loop)
+    if hub is None:
+        hub = JobEventHub()
+        _hubs[loop] = hub
+    return hub
+
+
+def subscribe(job_id: str):
+    """``async with subscribe(job_id) as queue`` receives the job's events."""
+    return get_hub().subscribe(job_id)
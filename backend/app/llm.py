@@ -0,0 +1,255 @@
+"""Shared OpenAI chat clients and the compiled chat graph.
+
+``get_chat_model`` hands out one ``ChatOpenAI`` per (model, temperature,
+max_tokens) and event loop, all sharing a keep-alive HTTP connection pool
+(HTTP/2 when the ``h2`` package is installed). Pools are per event loop
+because Celery tasks run each job in a fresh ``asyncio.run`` loop and
+connections cannot outlive the loop that opened them.
+
+``run_chat`` sends prepared messages through a langgraph graph that is
+compiled once per process; the model parameters travel in the graph state.
+
+``gather_limited`` fans batch work (page analysis and generation) out with
+at most ``settings.llm_concurrency`` requests in flight per event loop,
+``ainvoke_with_retry`` backs off on rate limits and transient errors,
+``TokenUsage`` adds up what a job spent and ``count_tokens`` sizes prompts
+before they are sent.
+"""
+import asyncio
+import importlib.util
+import logging
+import random
+import weakref
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Iterable, Optional, Sequence, TypeVar
+
+import httpx
+import openai
+from langchain_core.messages import BaseMessage
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_openai import ChatOpenAI
+from langgraph.graph import Graph
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+HTTP2 = settings.llm_http2 and importlib.util.find_spec("h2") is not None
+
+# Prompt shape shared by the agent and specialist chats. Everything is passed
+# as variables, so braces in page text or user messages are left alone.
+CHAT_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", "{system}"),
+    ("system", "{context}"),
+    ("system", "{history}"),
+    ("user", "{input}"),
+])
+
+_Key = tuple[str, Optional[float], Optional[int]]
+
+
+class _LoopClients:
+    def __init__(self):
+        self.http = _new_http_client()
+        self.models: dict[_Key, ChatOpenAI] = {}
+        # shared by every fan-out on the loop, so nested or concurrent
+        # batches still respect the global limit
+        self.slots = asyncio.Semaphore(settings.llm_concurrency)
+
+
+_per_loop: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _LoopClients]" = weakref.WeakKeyDictionary()
+_no_loop: Optional[_LoopClients] = None
+
+
+def _new_http_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        http2=HTTP2,
+        timeout=settings.llm_timeout,
+        limits=httpx.Limits(
+            max_connections=settings.llm_max_connections,
+            max_keepalive_connections=settings.llm_max_connections,
+            keepalive_expiry=settings.llm_keepalive_expiry,
+        ),
+    )
+
+
+def _loop_clients() -> _LoopClients:
+    global _no_loop
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        if _no_loop is None:
+            _no_loop = _LoopClients()
+        return _no_loop
+    clients = _per_loop.get(loop)
+    if clients is None:
+        clients = _per_loop[loop] = _LoopClients()
+    return clients
+
+
+async def close_loop_clients() -> None:
+    """Close the running loop's HTTP pool, before the loop itself ends (each
+    Celery task runs in its own ``asyncio.run`` loop)."""
+    clients = _per_loop.pop(asyncio.get_running_loop(), None)
+    if clients is not None:
+        await clients.http.aclose()
+
+
+def get_chat_model(
+    temperature: Optional[float] = None,
+    max_tokens: Optional[int] = None,
+    model: Optional[str] = None,
+) -> ChatOpenAI:
+    """Return the shared chat model for these parameters."""
+    key = (model or settings.open_ai_model, temperature, max_tokens)
+    clients = _loop_clients()
+    llm = clients.models.get(key)
+    if llm is None:
+        kwargs = {}
+        if temperature is not None:
+            kwargs["temperature"] = temperature
+        if max_tokens is not None:
+            kwargs["max_tokens"] = max_tokens
+        llm = ChatOpenAI(
+            api_key=settings.openai_api_key or "sk-test",
+            model=key[0],
+            http_async_client=clients.http,
+            **kwargs,
+        )
+        clients.models[key] = llm
+    return llm
+
+
+async def _chat_node(state: dict):
+    llm = get_chat_model(state.get("temperature"), state.get("max_tokens"), state.get("model"))
+    return await llm.ainvoke(state["messages"])
+
+
+@lru_cache(maxsize=1)
+def get_chat_graph():
+    """The one-node chat graph, compiled once per process."""
+    builder = Graph()
+    builder.add_node("chat", _chat_node)
+    builder.set_entry_point("chat")
+    builder.set_finish_point("chat")
+    return builder.compile()
+
+
+async def run_chat(
+    messages: Sequence[BaseMessage],
+    temperature: Optional[float] = None,
+    max_tokens: Optional[int] = None,
+    model: Optional[str] = None,
+    usage: Optional["TokenUsage"] = None,
+    stage: str = "chat",
+) -> str:
+    """Send ``messages`` through the compiled chat graph and return the answer
+    text, counting the tokens spent in ``usage`` under ``stage`` if given."""
+    response = await get_chat_graph().ainvoke(
+        {"messages": list(messages), "temperature": temperature, "max_tokens": max_tokens, "model": model}
+    )
+    if usage is not None:
+        usage.add(response, stage)
+    return getattr(response, "content", str(response))
+
+
+@lru_cache(maxsize=None)
+def _encoding(model: str):
+    try:
+        import tiktoken
+
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception as exc:
+        # tiktoken downloads its encodings on first use
+        logger.warning("No tokenizer for %s (%s), estimating token counts", model, exc)
+        return None
+
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    """Tokens of ``text`` for ``model`` (the configured one by default).
+    Estimated at four characters per token when tiktoken can't load the
+    model's encoding."""
+    encoding = _encoding(model or settings.open_ai_model or "")
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+# Worth retrying: the request may well succeed a moment later
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
+
+
+def _retry_after(exc: Exception) -> Optional[float]:
+    response = getattr(exc, "response", None)
+    try:
+        return float(response.headers["retry-after"])
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return None
+
+
+async def ainvoke_with_retry(runnable, inputs: Any, retries: Optional[int] = None) -> Any:
+    """``runnable.ainvoke(inputs)``, retried with exponential backoff and
+    jitter (or the server's Retry-After) on rate limits and transient errors."""
+    retries = settings.llm_max_retries if retries is None else retries
+    attempt = 0
+    while True:
+        try:
+            return await runnable.ainvoke(inputs)
+        except RETRYABLE_ERRORS as exc:
+            if attempt >= retries:
+                raise
+            delay = _retry_after(exc) or settings.llm_retry_base_delay * 2 ** attempt * (1 + random.random())
+            attempt += 1
+            logger.warning("LLM call failed (%s), retry %d/%d in %.1fs", type(exc).__name__, attempt, retries, delay)
+            await asyncio.sleep(delay)
+
+
+async def gather_limited(calls: Iterable[Callable[[], Awaitable[T]]]) -> list[T]:
+    """Run ``calls`` concurrently, at most ``settings.llm_concurrency`` LLM
+    requests at a time across the event loop. Results keep the order of
+    ``calls``, whatever order they finish in. The calls hold a slot while
+    they run, so they must not use ``gather_limited`` themselves."""
+    slots = _loop_clients().slots
+
+    async def run(call):
+        async with slots:
+            return await call()
+
+    return list(await asyncio.gather(*(run(c) for c in calls)))
+
+
+class TokenUsage:
+    """Token counts of the LLM calls made for one job, per stage."""
+
+    FIELDS = ("calls", "input_tokens", "output_tokens", "total_tokens")
+
+    def __init__(self):
+        self.stages: dict[str, dict[str, int]] = {}
+
+    def add(self, message: Any, stage: str) -> None:
+        """Count the ``usage_metadata`` of an LLM reply under ``stage``."""
+        counts = self.stages.setdefault(stage, dict.fromkeys(self.FIELDS, 0))
+        counts["calls"] += 1
+        usage = getattr(message, "usage_metadata", None) or {}
+        for field in self.FIELDS[1:]:
+            counts[field] += usage.get(field, 0) or 0
+
+    def merge(self, other: "TokenUsage") -> None:
+        for stage, counts in other.stages.items():
+            mine = self.stages.setdefault(stage, dict.fromkeys(self.FIELDS, 0))
+            for field in self.FIELDS:
+                mine[field] += counts[field]
+
+    def as_dict(self) -> dict:
+        total = {f: sum(c[f] for c in self.stages.values()) for f in self.FIELDS}
+        return {"total": total, "stages": {k: dict(v) for k, v in self.stages.items()}}
@@ -1,6 +1,8 @@
+import asyncio
 from fastapi import FastAPI
 from sqlmodel import SQLModel
-from .database import init_db
+from .database import async_session_maker, init_db
+from .crud import crud_chat_history, crud_job
 from .api import (
     api_characteristic,
     api_concept,
@@ -12,6 +14,7 @@ from .api import (
     api_agent,
     api_specialist,
     api_backup,
+    api_job,
 )
 from contextlib import asynccontextmanager
 
@@ -19,6 +22,7 @@ from fastapi.middleware.cors import CORSMiddleware
 
 import logging
 from app.config import settings
+from app.llm import get_chat_graph
 
 logging.basicConfig(
     level=logging.INFO,
@@ -38,7 +42,15 @@ async def lifespan(app: FastAPI):
     This replaces the deprecated on_event('startup') decorator.
     """
     await init_db()
+    get_chat_graph()
+    if settings.embedding_prewarm:
+        from app.embeddings import warm_embeddings
+        await asyncio.to_thread(warm_embeddings)
+    pruner = asyncio.create_task(crud_chat_history.retention_loop(async_session_maker))
+    job_purger = asyncio.create_task(crud_job.expiry_loop(async_session_maker))
     yield
+    pruner.cancel()
+    job_purger.cancel()
     # Optional: add teardown logic here
 
 app = FastAPI(
@@ -93,6 +105,7 @@ app.include_router(api_vectordb.router)
 app.include_router(api_agent.router)
 app.include_router(api_specialist.router)
 app.include_router(api_backup.router)
+app.include_router(api_job.router)
 
 
 
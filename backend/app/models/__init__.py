@@ -1,4 +1,4 @@
-from . import model_agent, model_characteristic, model_concept, model_gameworld, model_page, model_user, model_specialist_source
+from . import model_agent, model_characteristic, model_concept, model_gameworld, model_page, model_user, model_specialist_source, model_vectordb, model_chat, model_job
 
 __all__ = [
     "model_agent",
@@ -8,4 +8,7 @@ __all__ = [
     "model_page",
     "model_user",
     "model_specialist_source",
+    "model_vectordb",
+    "model_chat",
+    "model_job",
 ]
@@ -0,0 +1,21 @@
+from typing import List, Optional
+from datetime import datetime, timezone
+
+from sqlalchemy import Column, Index
+from sqlmodel import SQLModel, Field, JSON
+
+
+class ChatMessage(SQLModel, table=True):
+    """One message of a user's conversation with an agent (append-only)."""
+    __tablename__ = "chat_message"
+    __table_args__ = (
+        Index("ix_chat_message_user_agent_created", "user_id", "agent_id", "created_at"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_id: int
+    agent_id: int
+    role: str
+    content: str
+    sources: Optional[List[dict]] = Field(default=None, sa_column=Column(JSON))
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
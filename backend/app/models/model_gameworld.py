@@ -9,6 +9,9 @@ class GameWorld(SQLModel, table=True):
     description: str
     logo: Optional[str] = None        
     content: Optional[str] = None
+    # Page analysis extraction mode, see crud_page_analysis.ANALYSIS_MODES
+    # (None uses settings.page_analysis_mode)
+    analysis_mode: Optional[str] = None
 
     created_by: int = Field(foreign_key="user.id")
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
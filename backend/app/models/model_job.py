@@ -0,0 +1,31 @@
+from typing import Optional
+from datetime import datetime, timezone
+
+from sqlalchemy import Column, Index
+from sqlmodel import SQLModel, Field, JSON
+
+
+class Job(SQLModel, table=True):
+    """A background (Celery) job: vector rebuilds, writer and novelist runs.
+
+    ``payload`` holds the job's inputs, ``progress`` its latest progress
+    report and ``result`` what it produced. Finished jobs get an
+    ``expires_at`` after which they are purged.
+    """
+    __table_args__ = (
+        Index("ix_job_type_created", "type", "created_at"),
+        Index("ix_job_agent_created", "agent_id", "created_at"),
+    )
+
+    id: str = Field(primary_key=True)
+    type: str
+    agent_id: Optional[int] = None
+    status: str = Field(default="queued", index=True)
+    payload: Optional[dict] = Field(default=None, sa_column=Column(JSON))
+    progress: Optional[dict] = Field(default=None, sa_column=Column(JSON))
+    result: Optional[dict] = Field(default=None, sa_column=Column(JSON))
+    error: Optional[str] = None
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc), index=True)
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    expires_at: Optional[datetime] = Field(default=None, index=True)
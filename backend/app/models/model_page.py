@@ -36,3 +36,22 @@ class Page(SQLModel, table=True):
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))            
     updated_at: Optional[datetime] = None
 
+
+
+class PageToken(SQLModel, table=True):
+    """Word index over page text, used to prefilter crosslink candidates."""
+    page_id: int = Field(foreign_key="page.id", primary_key=True)
+    token: str = Field(primary_key=True, index=True)
+
+
+class PageLink(SQLModel, table=True):
+    """Inverted link graph: one row per page linking or referencing another.
+
+    ``kind`` is ``html_link`` (content), ``autogen_link`` (autogenerated
+    content) or ``page_ref`` (page reference characteristic value). The
+    target is not a foreign key so edges to a deleted page survive until its
+    crosslinks have been cleaned up.
+    """
+    source_page_id: int = Field(foreign_key="page.id", primary_key=True)
+    target_page_id: int = Field(primary_key=True, index=True)
+    kind: str = Field(primary_key=True)
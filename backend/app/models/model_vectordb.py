@@ -0,0 +1,14 @@
+from sqlmodel import SQLModel, Field
+
+
+class VectorChunk(SQLModel, table=True):
+    """Manifest of the chunks indexed in a world's vector collection.
+
+    ``text_hash`` is the sha256 of the chunk text; together with ``model``
+    it tells an incremental rebuild whether the chunk must be re-embedded.
+    """
+    world_id: int = Field(primary_key=True)
+    page_id: int = Field(primary_key=True, index=True)
+    chunk_index: int = Field(primary_key=True)
+    text_hash: str
+    model: str
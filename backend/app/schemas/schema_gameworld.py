@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import Literal, Optional
 from pydantic import BaseModel
 from datetime import datetime
 
@@ -8,6 +8,7 @@ class GameWorldCreate(BaseModel):
     description: str
     logo: Optional[str] = None
     content: Optional[str] = None
+    analysis_mode: Optional[Literal["per_concept", "multi_concept"]] = None
 
     # created_by: int
     # created_at: datetime
@@ -29,6 +30,7 @@ class GameWorldUpdate(BaseModel):
     description: Optional[str] = None
     logo: Optional[str] = None
     content: Optional[str] = None
+    analysis_mode: Optional[Literal["per_concept", "multi_concept"]] = None
 
     # created_by: int
     # created_at: datetime
@@ -43,6 +43,13 @@ class PageRead(PageBase):
     updated_at: Optional[datetime]
     values: List["PageCharacteristicValueRead"] = []
 
+class PageBacklinkRead(SQLModel):
+    page_id: int
+    name: str
+    gameworld_id: int
+    concept_id: int
+    kinds: List[str] = []  # "html_link", "autogen_link" and/or "page_ref"
+
 # resolve forward references on import
 from .schema_page_characteristic_value import (
     PageCharacteristicValueCreate,
@@ -0,0 +1,82 @@
+"""Streaming chat responses as Server-Sent Events or NDJSON.
+
+A stream always carries, in order: one ``sources`` event, any number of
+``token`` events and a final ``done`` event holding the full answer and
+timings (or an ``error`` event if the model call failed).
+"""
+import json
+import logging
+import time
+from typing import Any, Awaitable, Callable, Literal
+
+from fastapi.responses import StreamingResponse
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+
+logger = logging.getLogger(__name__)
+
+StreamFormat = Literal["sse", "ndjson"]
+
+MEDIA_TYPES = {"sse": "text/event-stream", "ndjson": "application/x-ndjson"}
+
+
+def encode_event(fmt: StreamFormat, event: str, data: dict) -> str:
+    if fmt == "sse":
+        return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+    return json.dumps({"event": event, **data}) + "\n"
+
+
+def _chunk_text(chunk: Any) -> str:
+    content = getattr(chunk, "content", chunk)
+    return content if isinstance(content, str) else ""
+
+
+def stream_chat_response(
+    llm: BaseChatModel,
+    messages: list[BaseMessage],
+    sources: list[dict],
+    on_complete: Callable[[str], Awaitable[None]],
+    fmt: StreamFormat = "sse",
+    label: str = "chat",
+) -> StreamingResponse:
+    """Stream ``llm``'s answer to ``messages`` after the retrieved ``sources``.
+
+    ``on_complete`` receives the full answer once the model is done, it is
+    not called when the model fails or the client disconnects.
+    """
+    started = time.perf_counter()
+
+    async def body():
+        yield encode_event(fmt, "sources", {"sources": sources})
+        parts: list[str] = []
+        ttft_ms = None
+        try:
+            async for chunk in llm.astream(messages):
+                text = _chunk_text(chunk)
+                if not text:
+                    continue
+                if ttft_ms is None:
+                    ttft_ms = round((time.perf_counter() - started) * 1000, 1)
+                    logger.info("%s: first token after %.1f ms", label, ttft_ms)
+                parts.append(text)
+                yield encode_event(fmt, "token", {"content": text})
+        except Exception as exc:
+            logger.exception("%s: streaming failed", label)
+            yield encode_event(fmt, "error", {"detail": str(exc)})
+            return
+
+        answer = "".join(parts)
+        await on_complete(answer)
+        total_ms = round((time.perf_counter() - started) * 1000, 1)
+        logger.info("%s: %d chunks in %.1f ms", label, len(parts), total_ms)
+        yield encode_event(
+            fmt,
+            "done",
+            {"answer": answer, "sources": sources, "ttft_ms": ttft_ms, "total_ms": total_ms},
+        )
+
+    return StreamingResponse(
+        body(),
+        media_type=MEDIA_TYPES[fmt],
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,6 +1,7 @@
 import os
 import asyncio
 from celery import Celery
+from celery.signals import worker_process_init
 import multiprocessing
 multiprocessing.set_start_method("spawn", force=True)
 
@@ -42,26 +43,52 @@ import app.models.model_user  # noqa: F401
 import app.models.model_page  # noqa: F401
 import app.models.model_characteristic  # noqa: F401
 import app.models.model_specialist_source  # noqa: F401
+import app.models.model_vectordb  # noqa: F401
+import app.models.model_job  # noqa: F401
+
+def _run(main):
+    """``asyncio.run(main)`` for a task, closing the loop's LLM connections
+    before the loop goes away."""
+    from app.llm import close_loop_clients
+
+    async def run_and_close():
+        try:
+            return await main
+        finally:
+            await close_loop_clients()
+
+    return asyncio.run(run_and_close())
+
+
+@worker_process_init.connect
+def _warm_embeddings(**kwargs):
+    from app.config import settings
+    from app.llm import get_chat_graph
+    get_chat_graph()
+    if settings.embedding_prewarm:
+        from app.embeddings import warm_embeddings
+        warm_embeddings()
+
 
 @celery_app.task
 def task_auto_crosslink_page_content(page_id: int):
-    asyncio.run(auto_crosslink_page_content(page_id))
+    _run(auto_crosslink_page_content(page_id))
 
 @celery_app.task
 def task_auto_crosslink_batch(page_id: int):
-    asyncio.run(auto_crosslink_batch(page_id))
+    _run(auto_crosslink_batch(page_id))
 
 @celery_app.task
 def task_remove_crosslinks_to_page(page_id: int):
-    asyncio.run(remove_crosslinks_to_page(page_id))
+    _run(remove_crosslinks_to_page(page_id))
 
 @celery_app.task
 def task_remove_page_refs_from_characteristics(page_id: int):
-    asyncio.run(remove_page_refs_from_characteristics(page_id))
+    _run(remove_page_refs_from_characteristics(page_id))
 
 @celery_app.task
 def task_sync_page_ref_attributes(page_id: int):
-    asyncio.run(sync_page_ref_attributes(page_id))
+    _run(sync_page_ref_attributes(page_id))
 
 from app.crud.crud_page_analysis import analyze_pages_bulk
 from app.api.api_agent import get_agent
@@ -69,41 +96,21 @@ from app.crud.crud_page import get_page, update_page, get_pages
 from app.database import async_session_maker
 from app.config import settings
 from app.crud import crud_vectordb, crud_specialist_vectordb, crud_novel
-from datetime import datetime, timezone
-import json
-from pathlib import Path
-from app.crud.crud_page_analysis import analyze_page, generate_pages
+from app.crud.crud_job import JobReporter
+from app.crud.crud_page_analysis import analyze_page, analysis_mode, generate_pages
+from app.llm import TokenUsage
 
 
 @celery_app.task
 def task_analyze_pages_job(agent_id: int, page_ids: list[int], job_id: str):
     async def run():
-        job_dir = Path(settings.writer_job_dir)
-        job_dir.mkdir(parents=True, exist_ok=True)
-        job_path = job_dir / f"{job_id}.json"
-        start_time = datetime.now(timezone.utc).isoformat()
-
-        with open(job_path, "w") as f:
-            json.dump(
-                {
-                    "status": "processing",
-                    "agent_id": agent_id,
-                    "job_type": "analyze_pages",
-                    "page_ids": page_ids,
-                    "pages_total": len(page_ids),
-                    "pages_processed": 0,
-                    "start_time": start_time,
-                    "action_needed": None,
-                },
-                f,
-                default=str,
-            )
+        job = JobReporter(job_id)
+        await job.start(pages_total=len(page_ids), pages_processed=0, action_needed=None)
 
         async with async_session_maker() as session:
             agent = await get_agent(session, agent_id)
             if not agent:
-                with open(job_path, "w") as ff:
-                    json.dump({"status": "error", "error": "Agent not found", "start_time": start_time}, ff, default=str)
+                await job.error("Agent not found")
                 return
 
             pages = []
@@ -115,176 +122,108 @@ def task_analyze_pages_job(agent_id: int, page_ids: list[int], job_id: str):
                     pages.append(p)
                     page_names.append(p.name)
                 processed += 1
-                with open(job_path, "w") as f:
-                    json.dump(
-                        {
-                            "status": "processing",
-                            "agent_id": agent_id,
-                            "job_type": "analyze_pages",
-                            "page_ids": page_ids,
-                            "page_names": page_names,
-                            "pages_total": len(page_ids),
-                            "pages_processed": processed,
-                            "start_time": start_time,
-                            "action_needed": None,
-                        },
-                        f,
-                        default=str,
-                    )
+                await job.progress(
+                    page_names=page_names,
+                    pages_total=len(page_ids),
+                    pages_processed=processed,
+                    action_needed=None,
+                )
 
+            usage = TokenUsage()
+            mode = await analysis_mode(session, agent.world_id)
             if len(pages) == 1:
-                result = await analyze_page(session, agent, pages[0])
+                result = await analyze_page(session, agent, pages[0], usage)
                 suggestions = result.get("suggestions", [])
             else:
-                suggestions = await analyze_pages_bulk(session, agent, pages)
-
-        end_time = datetime.now(timezone.utc).isoformat()
-        with open(job_path, "w") as f:
-            json.dump(
-                {
-                    "status": "done",
-                    "agent_id": agent_id,
-                    "job_type": "analyze_pages",
-                    "page_ids": page_ids,
-                    "page_names": page_names,
-                    "pages_total": len(page_ids),
-                    "pages_processed": len(page_ids),
-                    "suggestions": suggestions,
-                    "start_time": start_time,
-                    "end_time": end_time,
-                    "action_needed": "review",
-                },
-                f,
-                default=str,
-            )
+                suggestions = await analyze_pages_bulk(
+                    session, agent, pages, usage,
+                    progress_cb=lambda done, total: job.progress_nowait(
+                        page_names=page_names,
+                        pages_total=len(page_ids),
+                        pages_processed=len(page_ids),
+                        pages_analyzed=done,
+                        action_needed=None,
+                    ),
+                )
+
+        await job.done(
+            page_names=page_names,
+            pages_total=len(page_ids),
+            pages_processed=len(page_ids),
+            suggestions=suggestions,
+            action_needed="review",
+            analysis_mode=mode,
+            token_usage=usage.as_dict(),
+        )
 
-    asyncio.run(run())
+    _run(run())
 
 
 @celery_app.task
-def task_rebuild_vectordb(agent_id: int, job_id: str):
+def task_rebuild_vectordb(agent_id: int, job_id: str, mode: str = "incremental"):
     async def run():
-        job_dir = Path(settings.vectordb_job_dir)
-        job_dir.mkdir(parents=True, exist_ok=True)
-        job_path = job_dir / f"{job_id}.json"
-        start_time = datetime.now(timezone.utc).isoformat()
-        with open(job_path, "w") as f:
-            json.dump({
-                "status": "processing",
-                "agent_id": agent_id,
-                "job_type": "update_vector_db",
-                "start_time": start_time,
-            }, f, default=str)
-
-        print (f" --- CALCUALTING SUGGESTIONS --- ")
-        print (f" --- CALCUALTING SUGGESTIONS --- ")
-        print (f" --- CALCUALTING SUGGESTIONS --- ")
-        print (f" --- CALCUALTING SUGGESTIONS --- ")
+        job = JobReporter(job_id)
+        await job.start()
+
         async with async_session_maker() as session:
             agent = await get_agent(session, agent_id)
             if not agent:
-                with open(job_path, "w") as ff:
-                    json.dump({
-                        "status": "error",
-                        "error": "Agent not found",
-                        "start_time": start_time,
-                    }, ff, default=str)
+                await job.error("Agent not found")
                 return
 
-            print (f" --- CALCUALTING SUGGESTIONS2 --- ")
-            print (f" --- CALCUALTING SUGGESTIONS2 --- ")
-            print (f" --- CALCUALTING SUGGESTIONS2 --- ")
-            print (f" --- CALCUALTING SUGGESTIONS2 --- ")
-            
             try:
-                print (f" --- CALCUALTING SUGGESTIONS3 --- ")
-                print (f" --- CALCUALTING SUGGESTIONS3 --- ")
-                print (f" --- CALCUALTING SUGGESTIONS3 --- ")
-                print (f" --- CALCUALTING SUGGESTIONS3 --- ")
-                count = await crud_vectordb.rebuild_world(session, agent.world_id)
-                print (f" --- CALCUALTING SUGGESTIONS4 --- ")
-                print (f" --- CALCUALTING SUGGESTIONS4 --- ")
-                print (f" --- CALCUALTING SUGGESTIONS4 --- ")
-                print (f" --- CALCUALTING SUGGESTIONS4 --- ")
+                stats = await crud_vectordb.rebuild_world(session, agent.world_id, mode=mode)
             except Exception as exc:  # pragma: no cover - defensive
-                print (f" --- CALCUALTING SUGGESTIONS5  ERROR {str(exc)} --- ")
-                print (f" --- CALCUALTING SUGGESTIONS5  ERROR {str(exc)} --- ")
-                print (f" --- CALCUALTING SUGGESTIONS5  ERROR {str(exc)} --- ")
-                print (f" --- CALCUALTING SUGGESTIONS5  ERROR {str(exc)} --- ")
-            
-                with open(job_path, "w") as ff:
-                    json.dump(
-                        {
-                            "status": "error",
-                            "error": str(exc),
-                            "start_time": start_time,
-                        },
-                        ff,
-                        default=str,
-                    )
+                await job.error(str(exc))
                 raise
 
-        end_time = datetime.now(timezone.utc).isoformat()
-        with open(job_path, "w") as f:
-            json.dump({
-                "status": "done",
-                "agent_id": agent_id,
-                "job_type": "update_vector_db",
-                "pages_indexed": count,
-                "start_time": start_time,
-                "end_time": end_time,
-            }, f, default=str)
+        await job.done(**stats)
 
-    asyncio.run(run())
+    _run(run())
+
+
+@celery_app.task
+def task_reindex_page(page_id: int, world_id: int, version: str = ""):
+    """Re-embed one page after a create/update/delete.
+
+    Scheduled with a countdown; when the page was edited again in the
+    meantime a newer task is already queued, so this one does nothing.
+    """
+    async def run():
+        async with async_session_maker() as session:
+            page = await get_page(session, page_id)
+            if page and crud_vectordb.page_version(page) != version:
+                return
+            await crud_vectordb.reindex_page(session, page_id, world_id)
+
+    _run(run())
 
 
 @celery_app.task
 def task_rebuild_specialist_vectors(agent_id: int, job_id: str):
     async def run():
-        job_dir = Path(settings.specialist_job_dir)
-        job_dir.mkdir(parents=True, exist_ok=True)
-        job_path = job_dir / f"{job_id}.json"
-        start_time = datetime.now(timezone.utc).isoformat()
-        def write_status(status: str, progress: str | None = None, count: int | None = None, end: str | None = None):
-            data = {
-                "status": status,
-                "agent_id": agent_id,
-                "job_type": "rebuild_specialist_vectors",
-                "start_time": start_time,
-            }
-            if progress:
-                data["progress"] = progress
-            if count is not None:
-                data["documents_indexed"] = count
-            if end:
-                data["end_time"] = end
-            with open(job_path, "w") as f:
-                json.dump(data, f, default=str)
-
-        write_status("processing")
+        job = JobReporter(job_id)
+        await job.start()
 
         async with async_session_maker() as session:
             agent = await get_agent(session, agent_id)
             if not agent:
-                write_status("error")
+                await job.error("Agent not found")
                 return
             try:
                 def progress_cb(msg: str):
-                    write_status("processing", msg)
+                    job.progress_nowait(progress=msg)
 
                 count = await crud_specialist_vectordb.rebuild_agent_with_progress(
                     session, agent_id, progress_cb
                 )
             except Exception as exc:  # pragma: no cover - defensive
-                write_status("error")
+                await job.error(str(exc))
                 raise
 
-        end_time = datetime.now(timezone.utc).isoformat()
-        write_status("done", count=count, end=end_time)
-
-    asyncio.run(run())
-
+        await job.done(documents_indexed=count)
 
+    _run(run())
 
 
 @celery_app.task
@@ -298,37 +237,14 @@ def task_generate_pages_job(
     bulk_accept_updates: bool = False,
 ):
     async def run():
-        job_dir = Path(settings.writer_job_dir)
-        job_dir.mkdir(parents=True, exist_ok=True)
-        job_path = job_dir / f"{job_id}.json"
-        start_time = datetime.now(timezone.utc).isoformat()
-        with open(job_path, "w") as f:
-            json.dump(
-                {
-                    "status": "processing",
-                    "agent_id": agent_id,
-                    "page_id": page_id,
-                    "job_type": "generate_pages",
-                    "start_time": start_time,
-                    "merge_groups": merge_groups or [],
-                    "suggestions": suggestions or [],
-                    "bulk_accept_updates": bulk_accept_updates,
-                    "action_needed": None,
-                },
-                f,
-                default=str,
-            )
+        job = JobReporter(job_id)
+        await job.start(action_needed=None)
 
         async with async_session_maker() as session:
             agent = await get_agent(session, agent_id)
             page = await get_page(session, page_id)
             if not agent or not page or agent.world_id != page.gameworld_id:
-                with open(job_path, "w") as ff:
-                    json.dump({
-                        "status": "error",
-                        "error": "Agent or page not found",
-                        "start_time": start_time,
-                    }, ff, default=str)
+                await job.error("Agent or page not found")
                 return
             result = await generate_pages(session, agent, page, pages)
 
@@ -389,6 +305,7 @@ def task_generate_pages_job(
                                     "updated_by_agent_id": agent_id,
                                 },
                             )
+                            crud_vectordb.schedule_reindex(backend_page)
                             auto_updated.append(
                                 {"id": backend_page.id, "name": backend_page.name}
                             )
@@ -409,62 +326,31 @@ def task_generate_pages_job(
 
             result_pages = final_pages
 
-        end_time = datetime.now(timezone.utc).isoformat()
-        with open(job_path, "w") as f:
-            json.dump(
-                {
-                    "status": "done",
-                    "agent_id": agent_id,
-                    "page_id": page_id,
-                    "job_type": "generate_pages",
-                    "pages": result_pages,
-                    "auto_updated": auto_updated,
-                    "start_time": start_time,
-                    "end_time": end_time,
-                    "merge_groups": merge_groups or [],
-                    "suggestions": suggestions or [],
-                    "bulk_accept_updates": bulk_accept_updates,
-                    "action_needed": "review",
-                },
-                f,
-                default=str,
-            )
+        await job.done(
+            pages=result_pages,
+            auto_updated=auto_updated,
+            action_needed="review",
+            token_usage=result.get("token_usage"),
+        )
 
-    asyncio.run(run())
+    _run(run())
 
 @celery_app.task
 def task_create_novel_job(agent_id: int, text: str, instructions: str, previous_page_id: int | None, helper_agents: list[int], job_id: str):
     async def run():
-        job_dir = Path(settings.novelist_job_dir)
-        job_dir.mkdir(parents=True, exist_ok=True)
-        job_path = job_dir / f"{job_id}.json"
-        start_time = datetime.now(timezone.utc).isoformat()
-        with open(job_path, "w") as f:
-            json.dump({
-                "status": "processing",
-                "agent_id": agent_id,
-                "job_type": "create_novel",
-                "progress": 0,
-                "start_time": start_time,
-            }, f, default=str)
+        job = JobReporter(job_id)
+        await job.start(progress=0)
 
         async with async_session_maker() as session:
             agent = await get_agent(session, agent_id)
             if not agent:
-                with open(job_path, "w") as ff:
-                    json.dump({"status": "error", "error": "Agent not found", "start_time": start_time}, ff, default=str)
+                await job.error("Agent not found")
                 return
 
-            async def progress_cb(idx: int, total: int):
-                with open(job_path, "w") as f:
-                    json.dump({
-                        "status": "processing",
-                        "agent_id": agent_id,
-                        "job_type": "create_novel",
-                        "progress": idx + 1,
-                        "chunks_total": total,
-                        "start_time": start_time,
-                    }, f, default=str)
+            def progress_cb(done: int, total: int):
+                job.progress_nowait(progress=done, chunks_total=total)
+
+            usage = TokenUsage()
 
             novel = await crud_novel.create_novel(
                 session,
@@ -474,18 +360,9 @@ def task_create_novel_job(agent_id: int, text: str, instructions: str, previous_
                 previous_page_id,
                 helper_agents,
                 progress_cb,
+                usage,
             )
 
-        end_time = datetime.now(timezone.utc).isoformat()
-        with open(job_path, "w") as f:
-            json.dump({
-                "status": "done",
-                "agent_id": agent_id,
-                "job_type": "create_novel",
-                "novel": novel,
-                "start_time": start_time,
-                "end_time": end_time,
-                "action_needed": "review",
-            }, f, default=str)
-
-    asyncio.run(run())
+        await job.done(novel=novel, action_needed="review", token_usage=usage.as_dict())
+
+    _run(run())
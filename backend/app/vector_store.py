@@ -0,0 +1,379 @@
+"""Vector store backends.
+
+``crud_vectordb`` and ``crud_specialist_vectordb`` talk to a client that
+implements the subset of the ``chromadb`` client API listed in
+:class:`VectorClient`, so the langchain ``Chroma`` wrapper works on top of
+any of them. The backend is chosen with ``settings.vector_backend``:
+
+``chroma_http``
+    ``chromadb.HttpClient`` against ``VECTOR_DB_URL``/``VECTOR_DB_PORT``.
+``chroma_persistent``
+    embedded ``chromadb.PersistentClient`` storing under ``VECTOR_DB_PATH``.
+``flat``
+    :class:`FlatIndexClient`, an exact cosine search over a NumPy matrix
+    memory-mapped from ``VECTOR_DB_PATH/flat``. Meant for small worlds and
+    single-node installs; no server needed.
+"""
+import fcntl
+import json
+import os
+import re
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Protocol
+
+import numpy as np
+
+from app.config import settings
+
+
+class VectorClient(Protocol):
+    def get_or_create_collection(self, name: str, **kwargs: Any) -> Any: ...
+
+    def get_collection(self, name: str, **kwargs: Any) -> Any: ...
+
+    def delete_collection(self, name: str) -> None: ...
+
+    def list_collections(self) -> List[Any]: ...
+
+
+def _as_list(value):
+    if value is None:
+        return None
+    return [value] if isinstance(value, (str, dict)) else list(value)
+
+
+def _matches(meta: Optional[dict], where: Optional[dict]) -> bool:
+    """Evaluate a (subset of the) Chroma ``where`` filter against ``meta``."""
+    if not where:
+        return True
+    meta = meta or {}
+    for key, cond in where.items():
+        if key == "$and":
+            if not all(_matches(meta, c) for c in cond):
+                return False
+        elif key == "$or":
+            if not any(_matches(meta, c) for c in cond):
+                return False
+        elif isinstance(cond, dict):
+            for op, val in cond.items():
+                got = meta.get(key)
+                if op == "$eq" and got != val:
+                    return False
+                if op == "$ne" and got == val:
+                    return False
+                if op == "$in" and got not in val:
+                    return False
+                if op == "$nin" and got in val:
+                    return False
+        elif meta.get(key) != cond:
+            return False
+    return True
+
+
+class FlatCollection:
+    """One collection of the flat index: ids, documents, metadatas and an
+    ``(n, dim)`` float32 matrix of unit-normalised embeddings."""
+
+    def __init__(self, client: "FlatIndexClient", name: str):
+        self._client = client
+        self.name = name
+        self._dir = os.path.join(client.path, name) if client.path else None
+        self._lock = threading.RLock()
+        self._ids: List[str] = []
+        self._documents: List[Optional[str]] = []
+        self._metadatas: List[Optional[dict]] = []
+        self._vectors = np.zeros((0, 0), dtype=np.float32)
+        self._index: Dict[str, int] = {}
+        self._version = None
+        if self._dir:
+            os.makedirs(self._dir, exist_ok=True)
+
+    # --- persistence -------------------------------------------------
+
+    def _meta_path(self) -> str:
+        return os.path.join(self._dir, "meta.json")
+
+    def _vec_path(self) -> str:
+        return os.path.join(self._dir, "vectors.npy")
+
+    @contextmanager
+    def _file_lock(self, exclusive: bool):
+        if not self._dir:
+            yield
+            return
+        with open(os.path.join(self._dir, ".lock"), "a") as fh:
+            fcntl.flock(fh, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+
+    def _stat_version(self):
+        # meta.json is replaced on every write, so the inode changes too
+        st = os.stat(self._meta_path())
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def _refresh(self) -> None:
+        """Reload from disk when another process wrote the collection."""
+        if not self._dir:
+            return
+        try:
+            version = self._stat_version()
+        except FileNotFoundError:
+            version = None
+        if version == self._version:
+            return
+        if version is None:
+            self._set([], [], [], np.zeros((0, 0), dtype=np.float32))
+        else:
+            with open(self._meta_path()) as f:
+                meta = json.load(f)
+            vectors = np.load(self._vec_path(), mmap_mode="r")
+            self._set(meta["ids"], meta["documents"], meta["metadatas"], vectors)
+        self._version = version
+
+    def _set(self, ids, documents, metadatas, vectors) -> None:
+        self._ids = list(ids)
+        self._documents = list(documents)
+        self._metadatas = list(metadatas)
+        self._vectors = vectors
+        self._index = {id_: i for i, id_ in enumerate(self._ids)}
+
+    def _save(self) -> None:
+        if not self._dir:
+            return
+        vec_tmp = self._vec_path() + ".tmp.npy"
+        meta_tmp = self._meta_path() + ".tmp"
+        np.save(vec_tmp, np.ascontiguousarray(self._vectors, dtype=np.float32))
+        with open(meta_tmp, "w") as f:
+            json.dump({"ids": self._ids, "documents": self._documents, "metadatas": self._metadatas}, f)
+        os.replace(vec_tmp, self._vec_path())
+        os.replace(meta_tmp, self._meta_path())
+        self._version = self._stat_version()
+        # re-open memory mapped so the written copy isn't held in RAM twice
+        self._vectors = np.load(self._vec_path(), mmap_mode="r")
+
+    @contextmanager
+    def _reading(self):
+        with self._lock, self._file_lock(exclusive=False):
+            self._refresh()
+            yield
+
+    @contextmanager
+    def _writing(self):
+        with self._lock, self._file_lock(exclusive=True):
+            self._refresh()
+            yield
+            self._save()
+
+    # --- chromadb Collection API --------------------------------------
+
+    def count(self) -> int:
+        with self._reading():
+            return len(self._ids)
+
+    def upsert(self, ids, embeddings=None, metadatas=None, documents=None, **kwargs) -> None:
+        ids = _as_list(ids)
+        if embeddings is None:
+            raise ValueError("The flat vector index needs precomputed embeddings")
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        if vectors.ndim == 1:
+            vectors = vectors.reshape(1, -1)
+        if len(vectors) != len(ids):
+            raise ValueError("ids and embeddings must have the same length")
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        vectors = vectors / norms
+        metadatas = _as_list(metadatas) or [None] * len(ids)
+        documents = _as_list(documents) or [None] * len(ids)
+
+        with self._writing():
+            matrix = np.array(self._vectors, dtype=np.float32)
+            if matrix.size == 0:
+                matrix = np.zeros((0, vectors.shape[1]), dtype=np.float32)
+            elif matrix.shape[1] != vectors.shape[1]:
+                raise ValueError(
+                    f"Embedding dimension {vectors.shape[1]} does not match collection dimensionality {matrix.shape[1]}"
+                )
+            new_rows = []
+            for id_, vec, meta, doc in zip(ids, vectors, metadatas, documents):
+                pos = self._index.get(id_)
+                if pos is None:
+                    self._index[id_] = len(self._ids)
+                    self._ids.append(id_)
+                    self._documents.append(doc)
+                    self._metadatas.append(meta)
+                    new_rows.append(vec)
+                elif pos < len(matrix):
+                    matrix[pos] = vec
+                    self._documents[pos] = doc
+                    self._metadatas[pos] = meta
+                else:  # id repeated within this call
+                    new_rows[pos - len(matrix)] = vec
+                    self._documents[pos] = doc
+                    self._metadatas[pos] = meta
+            if new_rows:
+                matrix = np.vstack([matrix, np.stack(new_rows)])
+            self._vectors = matrix
+
+    add = upsert
+
+    def _select(self, ids=None, where=None) -> List[int]:
+        if ids is not None:
+            rows = [self._index[i] for i in _as_list(ids) if i in self._index]
+        else:
+            rows = list(range(len(self._ids)))
+        if where:
+            rows = [r for r in rows if _matches(self._metadatas[r], where)]
+        return rows
+
+    def get(self, ids=None, where=None, limit=None, offset=None, include=None, **kwargs) -> dict:
+        include = include if include is not None else ["metadatas", "documents"]
+        with self._reading():
+            rows = self._select(ids, where)[offset or 0:]
+            if limit is not None:
+                rows = rows[:limit]
+            result: Dict[str, Any] = {"ids": [self._ids[r] for r in rows]}
+            result["documents"] = [self._documents[r] for r in rows] if "documents" in include else None
+            result["metadatas"] = [self._metadatas[r] for r in rows] if "metadatas" in include else None
+            result["embeddings"] = (
+                np.array(self._vectors[rows], dtype=np.float32) if "embeddings" in include else None
+            )
+            return result
+
+    def delete(self, ids=None, where=None, **kwargs) -> None:
+        with self._writing():
+            drop = set(self._select(ids, where)) if (ids is not None or where) else set()
+            if not drop:
+                return
+            keep = [r for r in range(len(self._ids)) if r not in drop]
+            vectors = np.array(self._vectors[keep], dtype=np.float32) if keep else np.zeros((0, 0), dtype=np.float32)
+            self._set(
+                [self._ids[r] for r in keep],
+                [self._documents[r] for r in keep],
+                [self._metadatas[r] for r in keep],
+                vectors,
+            )
+
+    def query(
+        self,
+        query_embeddings=None,
+        n_results: int = 10,
+        where=None,
+        where_document=None,
+        include=None,
+        query_texts=None,
+        **kwargs,
+    ) -> dict:
+        if query_embeddings is None:
+            raise ValueError("The flat vector index needs query embeddings")
+        include = include if include is not None else ["metadatas", "documents", "distances"]
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        if queries.ndim == 1:
+            queries = queries.reshape(1, -1)
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        queries = queries / norms
+
+        out: Dict[str, Any] = {key: [] for key in ("ids", "documents", "metadatas", "distances", "embeddings")}
+        with self._reading():
+            rows = np.array(self._select(where=where), dtype=np.int64)
+            if where_document and "$contains" in where_document:
+                needle = where_document["$contains"]
+                rows = np.array([r for r in rows if needle in (self._documents[r] or "")], dtype=np.int64)
+            for q in queries:
+                if len(rows) == 0:
+                    top = np.array([], dtype=np.int64)
+                    dist = np.array([], dtype=np.float32)
+                else:
+                    sims = self._vectors[rows] @ q
+                    k = min(n_results, len(rows))
+                    best = np.argpartition(-sims, k - 1)[:k]
+                    best = best[np.argsort(-sims[best], kind="stable")]
+                    top = rows[best]
+                    dist = 1.0 - sims[best]
+                out["ids"].append([self._ids[r] for r in top])
+                out["documents"].append([self._documents[r] for r in top])
+                out["metadatas"].append([self._metadatas[r] for r in top])
+                out["distances"].append([float(d) for d in dist])
+                out["embeddings"].append(np.array(self._vectors[top], dtype=np.float32))
+        for key in ("documents", "metadatas", "distances", "embeddings"):
+            if key not in include:
+                out[key] = None
+        return out
+
+
+class FlatIndexClient:
+    """In-process vector store with exact cosine search.
+
+    Collections live in ``path/<name>`` (or only in memory when ``path`` is
+    ``None``) and are reloaded when another process writes them.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self._collections: Dict[str, FlatCollection] = {}
+        self._lock = threading.Lock()
+        if path:
+            os.makedirs(path, exist_ok=True)
+
+    def _on_disk(self, name: str) -> bool:
+        return bool(self.path) and os.path.isdir(os.path.join(self.path, name))
+
+    def get_or_create_collection(self, name: str, **kwargs) -> FlatCollection:
+        if not re.fullmatch(r"[\w.-]{1,200}", name):
+            raise ValueError(f"Invalid collection name {name!r}")
+        with self._lock:
+            collection = self._collections.get(name)
+            if collection is None or (self.path and not self._on_disk(name)):
+                collection = FlatCollection(self, name)
+                self._collections[name] = collection
+            return collection
+
+    create_collection = get_or_create_collection
+
+    def get_collection(self, name: str, **kwargs) -> FlatCollection:
+        with self._lock:
+            if name not in self._collections and not self._on_disk(name):
+                raise ValueError(f"Collection {name} does not exist.")
+        return self.get_or_create_collection(name)
+
+    def delete_collection(self, name: str) -> None:
+        with self._lock:
+            self._collections.pop(name, None)
+            if self.path and self._on_disk(name):
+                directory = os.path.join(self.path, name)
+                for fname in os.listdir(directory):
+                    os.remove(os.path.join(directory, fname))
+                os.rmdir(directory)
+
+    def list_collections(self) -> List[FlatCollection]:
+        names = set(self._collections)
+        if self.path:
+            names.update(d for d in os.listdir(self.path) if os.path.isdir(os.path.join(self.path, d)))
+        return [self.get_or_create_collection(n) for n in sorted(names)]
+
+    def get_max_batch_size(self) -> int:
+        return 10_000
+
+    def heartbeat(self) -> int:
+        return 0
+
+
+def create_vector_client(backend: Optional[str] = None) -> VectorClient:
+    """Build the client for ``backend`` (default ``settings.vector_backend``)."""
+    backend = backend or settings.vector_backend
+    db_path = settings.vector_db_path
+    if backend == "chroma_http":
+        import chromadb
+
+        return chromadb.HttpClient(host=settings.vector_db_url, port=int(settings.vector_db_port))
+    if backend == "chroma_persistent":
+        import chromadb
+
+        os.makedirs(db_path, exist_ok=True)
+        return chromadb.PersistentClient(path=db_path)
+    if backend == "flat":
+        return FlatIndexClient(os.path.join(db_path, "flat"))
+    raise ValueError(f"Unknown vector backend {backend!r}")
@@ -0,0 +1,136 @@
+"""Benchmark: ``query_world`` with a fresh Chroma client per call vs. the pooled one.
+
+Needs a running Chroma server (``VECTOR_DB_URL``/``VECTOR_DB_PORT`` or
+``--host``/``--port``); ``--spawn`` starts a throwaway ``chroma run`` instead.
+``--backend flat`` times the pooled path against the built-in flat index.
+Run from the ``backend`` directory::
+
+    python -m benchmarks.bench_chroma_query [--spawn] [--queries 200] [--chunks 2000]
+
+A deterministic hash embedding replaces the sentence-transformers model so
+the timings only cover client setup, collection lookup and the search.
+"""
+import argparse
+import hashlib
+import statistics
+import subprocess
+import tempfile
+import time
+
+import chromadb
+from langchain_chroma import Chroma
+
+from app.config import settings
+from app.crud import crud_vectordb
+
+WORLD_ID = 990001
+
+
+class HashEmbeddings:
+    def _vec(self, text):
+        digest = hashlib.sha256(text.encode("utf-8")).digest()
+        return [b / 255.0 for b in digest[:32]]
+
+    def embed_documents(self, texts):
+        return [self._vec(t) for t in texts]
+
+    def embed_query(self, text):
+        return self._vec(text)
+
+
+def legacy_query_world(world_id: int, query: str, n_results: int = 5):
+    """The previous behaviour: new HTTP client and langchain wrapper per call."""
+    client = chromadb.HttpClient(host=settings.vector_db_url, port=int(settings.vector_db_port))
+    collection = Chroma(
+        client=client,
+        collection_name=f"world_{world_id}",
+        embedding_function=crud_vectordb._embedding_fn,
+    )
+    return collection.max_marginal_relevance_search(query, k=n_results * 4)
+
+
+def seed(client, n_chunks: int) -> None:
+    name = f"world_{WORLD_ID}"
+    crud_vectordb._delete_collection(name, client)
+    raw = client.get_or_create_collection(name)
+    emb = crud_vectordb._embedding_fn
+    for start in range(0, n_chunks, 500):
+        ids = [f"page-{i}-0" for i in range(start, min(start + 500, n_chunks))]
+        docs = [f"chunk {i} about the realm and its people" for i in range(start, start + len(ids))]
+        raw.upsert(
+            ids=ids,
+            documents=docs,
+            embeddings=emb.embed_documents(docs),
+            metadatas=[{"page_id": i, "chunk_index": 0, "title": f"P{i}"} for i in range(start, start + len(ids))],
+        )
+
+
+def timed(fn, queries):
+    samples = []
+    for q in queries:
+        start = time.perf_counter()
+        fn(WORLD_ID, q)
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return statistics.mean(samples), samples[len(samples) // 2], samples[int(len(samples) * 0.95) - 1]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host")
+    parser.add_argument("--port", type=int)
+    parser.add_argument("--spawn", action="store_true", help="start a local chroma server")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--backend", default="chroma_http", choices=["chroma_http", "chroma_persistent", "flat"])
+    args = parser.parse_args()
+
+    server = None
+    if args.spawn:
+        args.port = args.port or 8765
+        args.host = "localhost"
+        server = subprocess.Popen(
+            ["chroma", "run", "--path", tempfile.mkdtemp(), "--port", str(args.port)],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        for _ in range(100):
+            try:
+                chromadb.HttpClient(host=args.host, port=args.port).heartbeat()
+                break
+            except Exception:
+                time.sleep(0.2)
+    if args.host:
+        settings.vector_db_url = args.host
+    if args.port:
+        settings.vector_db_port = str(args.port)
+    settings.vector_backend = args.backend
+    if args.backend != "chroma_http":
+        settings.vector_db_path = tempfile.mkdtemp()
+
+    crud_vectordb._embedding_fn = HashEmbeddings()
+    http_client = chromadb.HttpClient(host=settings.vector_db_url, port=int(settings.vector_db_port))
+    try:
+        seed(http_client, args.chunks)
+        if args.backend != "chroma_http":
+            seed(crud_vectordb.get_chroma_client(), args.chunks)
+        queries = [f"question {i} about the realm" for i in range(args.queries)]
+        # warm both paths once
+        legacy_query_world(WORLD_ID, "warm")
+        crud_vectordb.query_world(WORLD_ID, "warm")
+
+        before = timed(legacy_query_world, queries)
+        after = timed(crud_vectordb.query_world, queries)
+        for label, (mean, p50, p95) in (("per-call client", before), (f"pooled {args.backend}", after)):
+            print(f"{label} | mean {mean:7.2f} ms | p50 {p50:7.2f} ms | p95 {p95:7.2f} ms")
+        print(f"speedup (mean) {before[0] / after[0]:.2f}x over {args.queries} queries, {args.chunks} chunks")
+    finally:
+        crud_vectordb._delete_collection(f"world_{WORLD_ID}", http_client)
+        crud_vectordb._delete_collection(f"world_{WORLD_ID}", crud_vectordb.get_chroma_client())
+        if server:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
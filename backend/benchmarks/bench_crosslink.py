@@ -0,0 +1,128 @@
+"""Micro-benchmark: per-name regex crosslinking vs. the single-pass matcher.
+
+Run from the ``backend`` directory::
+
+    python -m benchmarks.bench_crosslink [--pages 1000 10000] [--docs 5]
+
+Builds synthetic worlds of N pages, links a handful of generated documents
+with both implementations, checks that they produce the same HTML and prints
+the timings.
+"""
+import argparse
+import random
+import re
+import time
+from dataclasses import dataclass
+
+from bs4 import BeautifulSoup
+
+from app.crud.crud_crosslink_matcher import CrosslinkMatcher, link_html
+
+SYLLABLES = ["ka", "ri", "mo", "thal", "dor", "en", "vy", "sa", "gul", "bren", "ith", "or"]
+FILLER = "the party walked along the road and talked about old stories of the realm".split()
+
+
+@dataclass
+class FakePage:
+    id: int
+    gameworld_id: int
+    concept_id: int
+    name: str
+
+
+def make_world(n_pages: int, seed: int = 0) -> list[FakePage]:
+    rnd = random.Random(seed)
+    pages = []
+    for i in range(n_pages):
+        words = [
+            "".join(rnd.choice(SYLLABLES) for _ in range(rnd.randint(2, 3))).capitalize()
+            for _ in range(rnd.randint(1, 2))
+        ]
+        pages.append(FakePage(id=i + 1, gameworld_id=1, concept_id=1 + i % 7, name=" ".join(words)))
+    return pages
+
+
+def make_document(pages: list[FakePage], n_paragraphs: int = 30, seed: int = 0) -> str:
+    rnd = random.Random(seed)
+    paragraphs = []
+    for _ in range(n_paragraphs):
+        words = []
+        for _ in range(60):
+            if rnd.random() < 0.08:
+                words.append(rnd.choice(pages).name)
+            else:
+                words.append(rnd.choice(FILLER))
+        paragraphs.append(f"<p>{' '.join(words)}</p>")
+    return "\n".join(paragraphs)
+
+
+def legacy_link_html(html: str, candidate_pages: list[FakePage]) -> tuple[str, bool]:
+    """The previous per-name regex implementation, kept for comparison."""
+    page_name_map = {}
+    for cp in candidate_pages:
+        if cp.name.lower() not in page_name_map:
+            page_name_map[cp.name.lower()] = cp
+
+    soup = BeautifulSoup(html or "", "html.parser")
+    changed = False
+    for name, target_page in page_name_map.items():
+        url = f"/worlds/{target_page.gameworld_id}/concept/{target_page.concept_id}/page/{target_page.id}"
+        already_linked = False
+        for a in soup.find_all("a", href=True):
+            if a.get("href") == url or a.get_text(strip=True).lower() == name:
+                already_linked = True
+                break
+        if already_linked:
+            continue
+
+        pattern = re.compile(rf"\b({re.escape(target_page.name)})\b", re.IGNORECASE)
+        for element in soup.find_all(string=True):
+            if element.find_parent("a"):
+                continue
+            if pattern.search(element):
+                def repl(m):
+                    return f'<a href="{url}" class="wiki-link" title="{target_page.name}">{m.group(0)}</a>'
+                new_html = pattern.sub(repl, element, count=1)
+                element.replace_with(BeautifulSoup(new_html, "html.parser"))
+                changed = True
+                break
+    return str(soup), changed
+
+
+def run(n_pages: int, n_docs: int) -> None:
+    pages = make_world(n_pages)
+    docs = [make_document(pages, seed=i) for i in range(n_docs)]
+
+    start = time.perf_counter()
+    legacy = [legacy_link_html(d, pages)[0] for d in docs]
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    matcher = CrosslinkMatcher(pages)
+    build_time = time.perf_counter() - start
+    start = time.perf_counter()
+    new = [link_html(d, matcher)[0] for d in docs]
+    new_time = time.perf_counter() - start
+
+    same = all(
+        str(BeautifulSoup(a, "html.parser")) == str(BeautifulSoup(b, "html.parser"))
+        for a, b in zip(legacy, new)
+    )
+    print(
+        f"{n_pages:>6} pages x {n_docs} docs | legacy {legacy_time / n_docs * 1000:9.1f} ms/doc"
+        f" | matcher build {build_time * 1000:7.1f} ms, {new_time / n_docs * 1000:7.1f} ms/doc"
+        f" | speedup {legacy_time / max(new_time, 1e-9):6.1f}x | identical={same}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--docs", type=int, default=3)
+    args = parser.parse_args()
+    for n in args.pages:
+        run(n, args.docs)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Benchmark: per-call LLM overhead, fresh client and graph vs. the shared ones.
+
+Run from the ``backend`` directory::
+
+    python -m benchmarks.bench_llm_overhead [--calls 500]
+
+The OpenAI API is replaced by an in-process ``httpx.MockTransport`` that
+answers instantly, so the timings only cover what happens around the
+request: building the ``ChatOpenAI`` client and prompt, compiling the
+langgraph graph and serialising the call. The previous code path built all
+of these on every chat; ``app.llm.run_chat`` reuses them.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+import httpx
+from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_openai import ChatOpenAI
+from langgraph.graph import Graph
+
+from app import llm
+from app.config import settings
+
+
+def _reply(request: httpx.Request) -> httpx.Response:
+    body = json.loads(request.content)
+    return httpx.Response(200, json={
+        "id": "chatcmpl-bench",
+        "object": "chat.completion",
+        "created": 0,
+        "model": body["model"],
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": "ok"}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+    })
+
+
+TRANSPORT = httpx.MockTransport(_reply)
+SYSTEM = "The agent is a helper to consume data from the world.\n" * 20
+
+
+async def legacy_call(question: str) -> str:
+    """What chat_with_agent used to do per request."""
+    client = ChatOpenAI(
+        api_key="sk-test",
+        model=settings.open_ai_model or "gpt-4o-mini",
+        http_async_client=httpx.AsyncClient(transport=TRANSPORT),
+    )
+    prompt = ChatPromptTemplate.from_messages([("system", SYSTEM), ("user", "{input}")])
+    builder = Graph()
+    builder.add_node("chat", prompt | client)
+    builder.set_entry_point("chat")
+    builder.set_finish_point("chat")
+    graph = builder.compile()
+    response = await graph.ainvoke({"input": question})
+    return response.content
+
+
+async def shared_call(question: str) -> str:
+    return await llm.run_chat(
+        [SystemMessage(content=SYSTEM), HumanMessage(content=question)],
+        model=settings.open_ai_model or "gpt-4o-mini",
+    )
+
+
+async def timed(fn, calls: int) -> list[float]:
+    await fn("warm")
+    samples = []
+    for i in range(calls):
+        start = time.perf_counter()
+        await fn(f"question {i}")
+        samples.append((time.perf_counter() - start) * 1000)
+    return sorted(samples)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=500)
+    args = parser.parse_args()
+
+    llm._new_http_client = lambda: httpx.AsyncClient(transport=TRANSPORT)
+    results = {}
+    for label, fn in (("fresh client+graph", legacy_call), ("shared client+graph", shared_call)):
+        samples = await timed(fn, args.calls)
+        results[label] = samples
+        print(f"{label:<20} | mean {statistics.mean(samples):6.2f} ms | "
+              f"p50 {samples[len(samples) // 2]:6.2f} ms | p99 {samples[int(len(samples) * 0.99) - 1]:6.2f} ms")
+    before, after = (statistics.mean(s) for s in results.values())
+    print(f"per-call overhead saved: {before - after:.2f} ms ({before / after:.1f}x) over {args.calls} calls")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,79 @@
+"""Benchmark: page-name resolution, pairwise scan vs. ``NameIndex``.
+
+Run from the ``backend`` directory::
+
+    python -m benchmarks.bench_name_index [--pages 5000] [--names 300]
+
+Resolves extracted names against a synthetic world the way page analysis
+(``find_existing``) and page generation (``find_page_id``) do, once by
+comparing every page with ``SequenceMatcher`` as the old code did and once
+through the index.
+"""
+import argparse
+import random
+import time
+from difflib import SequenceMatcher
+
+from app.crud.crud_name_index import NameIndex, canonical
+
+SYLLABLES = ["ka", "ri", "mor", "ven", "tal", "lis", "bor", "in", "es", "trel", "ae", "dun", "gar", "oth", "wyn"]
+
+
+def make_name(rng: random.Random) -> str:
+    words = ["".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))) for _ in range(rng.randint(1, 3))]
+    return " ".join(w.capitalize() for w in words)
+
+
+def scan_existing(key, page_map):
+    if key in page_map:
+        return page_map[key]
+    for k, pid in page_map.items():
+        if key.startswith(k) or k.startswith(key) or SequenceMatcher(None, key, k).ratio() > 0.85:
+            return pid
+    return None
+
+
+def scan_page_id(name, pages):
+    target = canonical(name)
+    best_id, best_ratio = None, 0.0
+    for pid, pname, _ in pages:
+        candidate = canonical(pname)
+        if not candidate:
+            continue
+        if target in candidate or candidate in target:
+            return pid
+        ratio = SequenceMatcher(None, target, candidate).ratio()
+        if ratio > 0.8 and ratio > best_ratio:
+            best_id, best_ratio = pid, ratio
+    return best_id
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=5000)
+    parser.add_argument("--names", type=int, default=300)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    pages = [(i + 1, make_name(rng), rng.randint(1, 5)) for i in range(args.pages)]
+    names = [rng.choice(pages)[1][:-1] if rng.random() < 0.5 else make_name(rng) for _ in range(args.names)]
+
+    start = time.perf_counter()
+    page_map = {canonical(n): pid for pid, n, _ in pages}
+    expected = [(scan_existing(canonical(n), page_map), scan_page_id(n, pages)) for n in names]
+    scan = time.perf_counter() - start
+
+    start = time.perf_counter()
+    index = NameIndex(pages)
+    built = time.perf_counter() - start
+    got = [(index.find_existing(canonical(n)), index.find_page_id(n)) for n in names]
+    lookup = time.perf_counter() - start - built
+
+    same = sum(a == b for a, b in zip(expected, got))
+    print(f"pairwise scan  | {scan * 1000:9.1f} ms")
+    print(f"NameIndex      | {lookup * 1000:9.1f} ms (+ {built * 1000:.1f} ms to build, cached per world)")
+    print(f"same answer for {same}/{len(names)} names, {scan / lookup:.0f}x faster lookups")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""Load test: concurrent ``POST /agents/{id}/chat`` requests on one event loop.
+
+Run from the ``backend`` directory::
+
+    python -m benchmarks.load_chat [--concurrency 50] [--rounds 4] [--embed-ms 40] [--llm-ms 300]
+
+The app is served in-process through ``httpx.ASGITransport`` (one event loop,
+like a single uvicorn worker) with a temporary SQLite database and the flat
+vector backend. The embedding model and the LLM are simulated: the query
+embedding holds a thread for ``--embed-ms`` (as a CPU forward pass would)
+and the LLM answers asynchronously after ``--llm-ms``. Each run is done
+twice, once with retrieval called inline (the previous blocking
+behaviour) and once through the async retrieval layer, and the p50/p99
+latencies are reported.
+"""
+import argparse
+import asyncio
+import hashlib
+import logging
+import os
+import statistics
+import tempfile
+import time
+
+_tmp = tempfile.mkdtemp(prefix="shrecknet-load-")
+os.environ.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{_tmp}/load.db")
+os.environ.setdefault("VECTOR_BACKEND", "flat")
+os.environ.setdefault("VECTOR_DB_PATH", f"{_tmp}/vectors")
+os.environ.setdefault("CHAT_HISTORY_DIR", f"{_tmp}/chat/{{user_id}}")
+os.environ.setdefault("EMBEDDING_CACHE_PATH", f"{_tmp}/embedding_cache.sqlite3")
+os.environ.setdefault("CELERY_BROKER_URL", "memory://")
+os.environ.setdefault("CELERY_RESULT_BACKEND", "cache+memory://")
+
+from httpx import ASGITransport, AsyncClient  # noqa: E402
+from langchain_core.messages import AIMessage  # noqa: E402
+from langchain_core.runnables import RunnableLambda  # noqa: E402
+
+from app import database, llm  # noqa: E402
+from app.crud import crud_agent, crud_vectordb  # noqa: E402
+from app.main import app  # noqa: E402
+from app.models.model_agent import Agent  # noqa: E402
+from app.models.model_concept import Concept  # noqa: E402
+from app.models.model_gameworld import GameWorld  # noqa: E402
+from app.models.model_page import Page  # noqa: E402
+
+
+class SimulatedEmbeddings:
+    def __init__(self, query_ms: float):
+        self.query_ms = query_ms
+
+    def _vec(self, text):
+        digest = hashlib.sha256(text.encode("utf-8")).digest()
+        return [b / 255.0 for b in digest[:64]]
+
+    def embed_documents(self, texts):
+        return [self._vec(t) for t in texts]
+
+    def embed_query(self, text):
+        time.sleep(self.query_ms / 1000)  # a forward pass holds the thread
+        return self._vec(text)
+
+
+def fake_llm_factory(llm_ms: float):
+    async def answer(prompt_value):
+        await asyncio.sleep(llm_ms / 1000)
+        return AIMessage(content="An answer from the archives.")
+
+    return lambda *args, **kwargs: RunnableLambda(lambda x: AIMessage(content="sync"), afunc=answer)
+
+
+async def fake_prompts(personalities):
+    return {p: f"{p} = Write with a {p} tone." for p in personalities}
+
+
+async def setup(n_pages: int) -> tuple[int, str]:
+    database.engine.echo = False
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    await database.init_db()
+    async with database.async_session_maker() as session:
+        world = GameWorld(name="Load", system="sys", description="d", created_by=1)
+        session.add(world)
+        await session.commit()
+        concept = Concept(gameworld_id=world.id, name="Lore")
+        session.add(concept)
+        await session.commit()
+        session.add_all(
+            Page(gameworld_id=world.id, concept_id=concept.id, name=f"Page {i}",
+                 content=f"<p>Entry {i} of the chronicle, about house {i % 17} and the river {i % 5}.</p>")
+            for i in range(n_pages)
+        )
+        agent = Agent(name="Archivist", world_id=world.id, personality="calm")
+        session.add(agent)
+        await session.commit()
+        await crud_vectordb.rebuild_world(session, world.id, mode="full")
+        agent_id = agent.id
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://load") as client:
+        await client.post("/user/", json={
+            "nickname": "load", "email": "load@test.com", "password": "pass",
+            "role": "player", "image_url": "http://test",
+        })
+        resp = await client.post("/user/login", data={"username": "load@test.com", "password": "pass"})
+        token = resp.json()["access_token"]
+    return agent_id, token
+
+
+async def run(agent_id: int, token: str, concurrency: int, rounds: int) -> list[float]:
+    latencies: list[float] = []
+    headers = {"Authorization": f"Bearer {token}"}
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://load", timeout=120) as client:
+        async def one(i: int) -> None:
+            payload = {"messages": [{"role": "user", "content": f"What happened at house {i % 17}?"}]}
+            start = time.perf_counter()
+            resp = await client.post(f"/agents/{agent_id}/chat", json=payload, headers=headers)
+            latencies.append((time.perf_counter() - start) * 1000)
+            resp.raise_for_status()
+
+        for r in range(rounds):
+            await asyncio.gather(*(one(r * concurrency + i) for i in range(concurrency)))
+    return latencies
+
+
+def report(label: str, latencies: list[float], wall: float) -> None:
+    latencies = sorted(latencies)
+    p50 = statistics.median(latencies)
+    p99 = latencies[max(int(len(latencies) * 0.99) - 1, 0)]
+    print(f"{label:<18} | p50 {p50:8.1f} ms | p99 {p99:8.1f} ms | {len(latencies) / wall:6.1f} chats/s")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=4)
+    parser.add_argument("--pages", type=int, default=300)
+    parser.add_argument("--embed-ms", type=float, default=40)
+    parser.add_argument("--llm-ms", type=float, default=300)
+    args = parser.parse_args()
+
+    crud_vectordb._embedding_fn = SimulatedEmbeddings(args.embed_ms)
+    llm.get_chat_model = fake_llm_factory(args.llm_ms)
+    crud_agent.ensure_personality_prompts = fake_prompts
+
+    agent_id, token = await setup(args.pages)
+    print(f"{args.concurrency} concurrent chats x {args.rounds} rounds, "
+          f"embed {args.embed_ms:.0f} ms, llm {args.llm_ms:.0f} ms")
+
+    async_query = crud_vectordb.aquery_world
+
+    async def blocking_query(world_id, query, n_results=5):
+        return crud_vectordb.query_world(world_id, query, n_results)
+
+    for label, impl in (("blocking retrieval", blocking_query), ("async retrieval", async_query)):
+        crud_vectordb.aquery_world = impl
+        start = time.perf_counter()
+        latencies = await run(agent_id, token, args.concurrency, args.rounds)
+        report(label, latencies, time.perf_counter() - start)
+    crud_vectordb.aquery_world = async_query
+    await database.engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
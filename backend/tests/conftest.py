@@ -1,4 +1,5 @@
 import os
+import tempfile
 import pytest
 from httpx import AsyncClient
 from sqlmodel import SQLModel
@@ -18,6 +19,12 @@ from app.config import settings
 
 test_chat_dir = Path.cwd() / "test_chat_history"
 settings.chat_history_dir = str(test_chat_dir / "{user_id}")
+# Run the vector paths against the built-in index instead of a Chroma server
+settings.vector_backend = "flat"
+settings.vector_db_path = tempfile.mkdtemp(prefix="shrecknet-vectors-")
+# Keep the embedding cache out of the source tree
+settings.embedding_cache_path = str(Path(tempfile.mkdtemp(prefix="shrecknet-embeddings-")) / "embedding_cache.sqlite3")
+settings.personality_file = str(Path(tempfile.mkdtemp(prefix="shrecknet-personalities-")) / "personalities_parsing.json")
 
 from app.main import app
 from app.database import get_session
@@ -15,7 +15,7 @@ async def test_chat_endpoint(async_client, create_user, login_and_get_token):
         personality = "kind"
         vector_db_update_date = datetime.now(timezone.utc)
 
-    async def fake_chat(session, agent_id, messages):
+    async def fake_chat(session, agent_id, messages, **kwargs):
         return {"answer": "Hi", "sources": []}
 
     with patch("app.api.api_agent.get_agent", return_value=FakeAgent()), \
@@ -30,10 +30,8 @@ async def test_chat_endpoint(async_client, create_user, login_and_get_token):
 
 
 @pytest.mark.anyio
-async def test_chat_history_saved(async_client, create_user, login_and_get_token, tmp_path):
-    from app.config import settings
-
-    settings.chat_history_dir = str(tmp_path / "{user_id}")
+async def test_chat_history_saved(async_client, session, create_user, login_and_get_token):
+    from app.crud import crud_chat_history
 
     user = await create_user("history@test.com", "pass", "writer")
     token = await login_and_get_token("history@test.com", "pass", "writer")
@@ -45,7 +43,7 @@ async def test_chat_history_saved(async_client, create_user, login_and_get_token
         personality = "kind"
         vector_db_update_date = datetime.now(timezone.utc)
 
-    async def fake_chat(session, agent_id, messages):
+    async def fake_chat(session, agent_id, messages, **kwargs):
         return {"answer": "Hi", "sources": []}
 
     with patch("app.api.api_agent.get_agent", return_value=FakeAgent()), \
@@ -58,9 +56,7 @@ async def test_chat_history_saved(async_client, create_user, login_and_get_token
     assert resp.status_code == 200
     assert resp.json()["answer"] == "Hi"
 
-    hist_file = tmp_path / str(user["id"]) / "1.json"
-    with open(hist_file) as f:
-        data = json.load(f)
+    data = await crud_chat_history.load_history(session, user["id"], 1)
     assert data[-2:] == [
         {"role": "user", "content": "Hello"},
         {"role": "assistant", "content": "Hi"},
@@ -75,10 +71,8 @@ async def test_chat_history_saved(async_client, create_user, login_and_get_token
 
 
 @pytest.mark.anyio
-async def test_clear_chat_history(async_client, create_user, login_and_get_token, tmp_path):
-    from app.config import settings
-
-    settings.chat_history_dir = str(tmp_path / "{user_id}")
+async def test_clear_chat_history(async_client, session, create_user, login_and_get_token):
+    from app.crud import crud_chat_history
 
     user = await create_user("clear@test.com", "pass", "writer")
     token = await login_and_get_token("clear@test.com", "pass", "writer")
@@ -90,7 +84,7 @@ async def test_clear_chat_history(async_client, create_user, login_and_get_token
         personality = "kind"
         vector_db_update_date = datetime.now(timezone.utc)
 
-    async def fake_chat(session, agent_id, messages):
+    async def fake_chat(session, agent_id, messages, **kwargs):
         return {"answer": "Hi", "sources": []}
 
     with patch("app.api.api_agent.get_agent", return_value=FakeAgent()), \
@@ -101,8 +95,7 @@ async def test_clear_chat_history(async_client, create_user, login_and_get_token
             headers={"Authorization": f"Bearer {token}"},
         )
 
-    hist_file = tmp_path / str(user["id"]) / "1.json"
-    assert hist_file.is_file()
+    assert await crud_chat_history.load_history(session, user["id"], 1)
 
     resp = await async_client.delete(
         "/agents/1/history",
@@ -110,7 +103,7 @@ async def test_clear_chat_history(async_client, create_user, login_and_get_token
     )
     assert resp.status_code == 200
     assert resp.json()["ok"] is True
-    assert not hist_file.exists()
+    assert await crud_chat_history.load_history(session, user["id"], 1) == []
 
 
 @pytest.mark.anyio
@@ -127,7 +120,7 @@ async def test_chat_test_endpoint(async_client, create_user, login_and_get_token
     fake_docs = [{"document": "Doc1"}, {"document": "Doc2"}]
 
     with patch("app.api.api_agent.get_agent", return_value=FakeAgent()), \
-         patch("app.api.api_agent.crud_vectordb.query_world", return_value=fake_docs):
+         patch("app.api.api_agent.crud_vectordb.aquery_world", return_value=fake_docs):
         resp = await async_client.post(
             "/agents/1/chat_test",
             json=payload,
@@ -195,3 +188,55 @@ async def test_agent_crud(async_client, create_user, login_and_get_token):
     assert resp.status_code == 200
     assert resp.json()["ok"] is True
 
+
+
+@pytest.mark.anyio
+async def test_chat_stream_sends_sources_then_tokens(async_client, session, create_user, login_and_get_token):
+    from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+    from langchain_core.messages import AIMessage
+    from app.crud import crud_chat_history
+    from app.models.model_agent import Agent
+    from app.models.model_gameworld import GameWorld
+
+    user = await create_user("stream@test.com", "pass", "writer")
+    token = await login_and_get_token("stream@test.com", "pass", "writer")
+
+    world = GameWorld(name="Streamed", system="sys", description="d", created_by=user["id"])
+    session.add(world)
+    await session.commit()
+    agent = Agent(name="Bard", world_id=world.id, personality="kind",
+                  vector_db_update_date=datetime.now(timezone.utc))
+    session.add(agent)
+    await session.commit()
+
+    docs = [{"document": "Lore", "page_id": 3, "concept_id": 2, "title": "Keep"}]
+
+    async def fake_prompts(personalities):
+        return {}
+
+    fake_llm = GenericFakeChatModel(messages=iter([AIMessage(content="Hello there traveller")]))
+
+    with patch("app.crud.crud_agent.crud_vectordb.aquery_world", return_value=docs), \
+         patch("app.crud.crud_agent.ensure_personality_prompts", side_effect=fake_prompts), \
+         patch("app.api.api_agent.get_chat_model", return_value=fake_llm):
+        resp = await async_client.post(
+            f"/agents/{agent.id}/chat/stream?format=ndjson",
+            json={"messages": [{"role": "user", "content": "Hi"}]},
+            headers={"Authorization": f"Bearer {token}"},
+        )
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("application/x-ndjson")
+    events = [json.loads(line) for line in resp.text.splitlines()]
+    assert events[0] == {
+        "event": "sources",
+        "sources": [{"title": "Keep", "url": f"/worlds/{world.id}/concept/2/page/3"}],
+    }
+    tokens = [e["content"] for e in events if e["event"] == "token"]
+    assert len(tokens) > 1 and "".join(tokens) == "Hello there traveller"
+    done = events[-1]
+    assert done["event"] == "done" and done["answer"] == "Hello there traveller"
+    assert done["ttft_ms"] is not None
+
+    saved = await crud_chat_history.load_history(session, user["id"], agent.id)
+    assert saved[-1]["content"] == "Hello there traveller"
+    assert saved[-1]["sources"] == events[0]["sources"]
@@ -0,0 +1,64 @@
+import json
+
+import pytest
+
+
+@pytest.mark.anyio
+async def test_history_is_bounded_and_pruned(session):
+    from app.crud import crud_chat_history
+
+    for i in range(6):
+        await crud_chat_history.record_exchange(
+            session, 71, 5, {"role": "user", "content": f"q{i}"}, f"a{i}", [{"title": "T"}] if i == 5 else None
+        )
+    await crud_chat_history.append_message(session, 71, 6, "user", "other agent")
+
+    last = await crud_chat_history.load_history(session, 71, 5, limit=3)
+    assert [m["content"] for m in last] == ["a4", "q5", "a5"]
+    assert last[-1]["sources"] == [{"title": "T"}]
+    assert "sources" not in last[0]
+
+    deleted = await crud_chat_history.prune_history(session, keep=4, max_age_days=0)
+    assert deleted == 8
+    assert [m["content"] for m in await crud_chat_history.load_history(session, 71, 5, limit=50)] == [
+        "q4", "a4", "q5", "a5",
+    ]
+    assert len(await crud_chat_history.load_history(session, 71, 6)) == 1
+
+
+@pytest.mark.anyio
+async def test_json_history_files_are_imported_once(session, test_engine, tmp_path, monkeypatch):
+    from app.config import settings
+    from app.crud import crud_chat_history
+
+    monkeypatch.setattr(settings, "chat_history_dir", str(tmp_path / "chat" / "{user_id}"))
+    user_dir = tmp_path / "chat" / "72"
+    user_dir.mkdir(parents=True)
+    (user_dir / "9.json").write_text(json.dumps([
+        {"role": "user", "content": "Hello"},
+        {"role": "assistant", "content": "Hi", "sources": [{"name": "Doc"}]},
+    ]))
+
+    class Rollback(Exception):
+        pass
+
+    # a failed transaction leaves the file to import on the next start
+    with pytest.raises(Rollback):
+        async with test_engine.begin() as conn:
+            await conn.run_sync(crud_chat_history.import_json_history)
+            raise Rollback
+    assert (user_dir / "9.json").is_file()
+    assert await crud_chat_history.load_history(session, 72, 9) == []
+
+    async with test_engine.begin() as conn:
+        imported = await conn.run_sync(crud_chat_history.import_json_history)
+    assert imported == [user_dir / "9.json"]
+    crud_chat_history.mark_imported(imported)
+    async with test_engine.begin() as conn:
+        assert await conn.run_sync(crud_chat_history.import_json_history) == []
+
+    assert await crud_chat_history.load_history(session, 72, 9) == [
+        {"role": "user", "content": "Hello"},
+        {"role": "assistant", "content": "Hi", "sources": [{"name": "Doc"}]},
+    ]
+    assert (user_dir / "9.json.imported").is_file()
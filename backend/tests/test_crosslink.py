@@ -0,0 +1,137 @@
+import pytest
+from dataclasses import dataclass
+
+from app.crud.crud_crosslink_matcher import CrosslinkMatcher, link_html
+
+
+@dataclass
+class FakePage:
+    id: int
+    gameworld_id: int
+    concept_id: int
+    name: str
+
+
+def test_links_first_occurrence_per_name():
+    pages = [FakePage(1, 1, 2, "Gryx"), FakePage(2, 1, 3, "Silver Keep")]
+    html = "<p>gryx rode to the silver keep. Gryx left the Silver Keep.</p>"
+
+    new_html, changed = link_html(html, CrosslinkMatcher(pages))
+
+    assert changed
+    assert new_html == (
+        '<p><a class="wiki-link" href="/worlds/1/concept/2/page/1" title="Gryx">gryx</a>'
+        ' rode to the <a class="wiki-link" href="/worlds/1/concept/3/page/2" title="Silver Keep">silver keep</a>.'
+        " Gryx left the Silver Keep.</p>"
+    )
+
+
+def test_skips_existing_links_and_partial_words():
+    pages = [FakePage(1, 1, 1, "Red"), FakePage(2, 1, 1, "Dragon"), FakePage(3, 1, 1, "Inn")]
+    html = '<p><a href="/other">Dragon</a> at the Red Dragon Inn, Reddish dragon</p>'
+
+    new_html, changed = link_html(html, CrosslinkMatcher(pages))
+
+    assert changed
+    assert new_html.count("wiki-link") == 2
+    assert 'title="Red">Red</a> Dragon <a' in new_html
+    assert "Reddish dragon" in new_html
+
+
+def test_name_priority_and_excluded_page():
+    pages = [FakePage(5, 1, 1, "Red Dragon"), FakePage(6, 1, 1, "Red")]
+    html = "<p>The Red Dragon slept. Red wine.</p>"
+
+    new_html, _ = link_html(html, CrosslinkMatcher(pages))
+    assert 'page/5" title="Red Dragon">Red Dragon</a>' in new_html
+    assert 'page/6" title="Red">Red</a> wine' in new_html
+
+    new_html, changed = link_html(html, CrosslinkMatcher(pages), exclude_page_id=5)
+    assert changed
+    assert "page/5" not in new_html
+    assert 'title="Red">Red</a> Dragon slept' in new_html
+
+
+@pytest.mark.anyio
+async def test_batch_links_only_pages_containing_new_name(test_engine, session, monkeypatch):
+    from sqlalchemy.ext.asyncio import AsyncSession
+    from sqlalchemy.orm import sessionmaker
+    from app.crud import crud_page, crud_page_links_update
+    from app.models.model_gameworld import GameWorld
+    from app.models.model_concept import Concept
+    from app.models.model_page import Page
+
+    monkeypatch.setattr(
+        crud_page_links_update,
+        "async_session_maker",
+        sessionmaker(bind=test_engine, class_=AsyncSession, expire_on_commit=False),
+    )
+    reindexed = []
+    monkeypatch.setattr(crud_page_links_update, "schedule_reindex", lambda page: reindexed.append(page.id))
+
+    world = GameWorld(name="Batch", system="sys", description="d", created_by=1)
+    session.add(world)
+    await session.commit()
+    concept = Concept(gameworld_id=world.id, name="NPC")
+    session.add(concept)
+    await session.commit()
+
+    mentions = await crud_page.create_page(
+        session, Page(gameworld_id=world.id, concept_id=concept.id, name="Log", content="<p>We met Old Gryx today.</p>")
+    )
+    unrelated = await crud_page.create_page(
+        session, Page(gameworld_id=world.id, concept_id=concept.id, name="Other", content="<p>Old roads.</p>")
+    )
+    new_page = await crud_page.create_page(
+        session, Page(gameworld_id=world.id, concept_id=concept.id, name="Old Gryx")
+    )
+
+    ids = await crud_page.get_pages_with_tokens(session, {"old", "gryx"})
+    assert ids == [mentions.id]
+
+    await crud_page_links_update.auto_crosslink_batch(new_page.id)
+
+    await session.refresh(mentions)
+    await session.refresh(unrelated)
+    assert f'/page/{new_page.id}" title="Old Gryx">Old Gryx</a>' in mentions.content
+    assert unrelated.content == "<p>Old roads.</p>"
+    assert reindexed == [mentions.id]
+
+
+@pytest.mark.anyio
+async def test_remove_crosslinks_uses_link_graph(test_engine, session, monkeypatch):
+    from sqlalchemy.ext.asyncio import AsyncSession
+    from sqlalchemy.orm import sessionmaker
+    from app.crud import crud_page, crud_page_links_update
+    from app.models.model_page import Page
+
+    monkeypatch.setattr(
+        crud_page_links_update,
+        "async_session_maker",
+        sessionmaker(bind=test_engine, class_=AsyncSession, expire_on_commit=False),
+    )
+    reindexed = []
+    monkeypatch.setattr(crud_page_links_update, "schedule_reindex", lambda page: reindexed.append(page.id))
+
+    target = await crud_page.create_page(session, Page(gameworld_id=1, concept_id=1, name="Doomed"))
+    href = f"/worlds/1/concept/1/page/{target.id}"
+    linking = await crud_page.create_page(
+        session,
+        Page(
+            gameworld_id=1,
+            concept_id=1,
+            name="Chronicle",
+            content=f'<p>The <a href="{href}">Doomed</a> keep.</p>',
+            autogenerated_content=f'<p><a href="{href}">Doomed</a></p>',
+        ),
+    )
+    assert [b["page_id"] for b in await crud_page.get_backlinks(session, target.id)] == [linking.id]
+
+    await crud_page.delete_page(session, target.id)
+    await crud_page_links_update.remove_crosslinks_to_page(target.id)
+
+    await session.refresh(linking)
+    assert linking.content == "<p>The Doomed keep.</p>"
+    assert linking.autogenerated_content == "<p>Doomed</p>"
+    assert reindexed == [linking.id]
+    assert await crud_page.get_backlinks(session, target.id) == []
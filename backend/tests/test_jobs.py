@@ -0,0 +1,154 @@
+from datetime import timedelta
+
+import pytest
+from sqlalchemy import update
+
+
+@pytest.mark.anyio
+async def test_job_lifecycle_and_listing(session):
+    from app.crud import crud_job
+
+    ids = []
+    for i in range(5):
+        job = await crud_job.create_job(session, "analyze_pages", 301, {"page_ids": [i]})
+        ids.append(job.id)
+    other = await crud_job.create_job(session, "create_novel", 302)
+
+    page = await crud_job.list_jobs(session, ["analyze_pages"], agent_id=301, limit=2)
+    assert [j.id for j in page] == ids[::-1][:2]
+    rest = await crud_job.list_jobs(session, ["analyze_pages"], agent_id=301, before=page[-1].created_at)
+    assert [j.id for j in rest] == ids[::-1][2:]
+    assert [j.id for j in await crud_job.list_jobs(session, agent_id=302)] == [other.id]
+
+    await crud_job.start_job(session, ids[0], {"pages_total": 1})
+    await crud_job.report_progress(session, ids[0], {"pages_total": 1, "pages_processed": 1})
+    await crud_job.finish_job(session, ids[0], {"results": [{"page_id": 0}]})
+    await crud_job.update_job_result(session, ids[0], {"action_needed": "done"})
+
+    job = await crud_job.get_job(session, ids[0], ["analyze_pages"])
+    await session.refresh(job)
+    data = crud_job.job_to_dict(job)
+    assert data["status"] == "done"
+    assert data["page_ids"] == [0]
+    assert data["pages_processed"] == 1
+    assert data["action_needed"] == "done"
+    assert data["start_time"] and data["end_time"]
+    assert await crud_job.get_job(session, ids[0], ["create_novel"]) is None
+    assert [j.id for j in await crud_job.list_jobs(session, agent_id=301, status="done")] == [ids[0]]
+
+
+@pytest.mark.anyio
+async def test_expired_jobs_are_purged(session):
+    from app.crud import crud_job
+    from app.models.model_job import Job
+
+    old = await crud_job.create_job(session, "update_vector_db", 303)
+    await crud_job.fail_job(session, old.id, "boom")
+    running = await crud_job.create_job(session, "update_vector_db", 303)
+    await session.execute(
+        update(Job).where(Job.id == old.id).values(expires_at=crud_job._now() - timedelta(seconds=1))
+    )
+    await session.commit()
+
+    assert await crud_job.purge_expired(session) == 1
+    remaining = await crud_job.list_jobs(session, agent_id=303)
+    assert [j.id for j in remaining] == [running.id]
+
+
+@pytest.mark.anyio
+async def test_job_result_updates_merge(session, test_engine):
+    import asyncio
+
+    from sqlalchemy.ext.asyncio import AsyncSession
+    from sqlalchemy.orm import sessionmaker
+
+    from app.crud import crud_job
+
+    maker = sessionmaker(bind=test_engine, class_=AsyncSession, expire_on_commit=False)
+    job = await crud_job.create_job(session, "analyze_pages", 304)
+    await crud_job.start_job(session, job.id)
+
+    async def patch(updates):
+        async with maker() as other:
+            await crud_job.update_job_result(other, job.id, updates)
+
+    await asyncio.gather(patch({"action_needed": "review"}), patch({"seen": True}))
+    await crud_job.finish_job(session, job.id, {"results": [1]})
+
+    job = await session.get(job.__class__, job.id, populate_existing=True)
+    assert job.result == {"action_needed": "review", "seen": True, "results": [1]}
+    assert await crud_job.update_job_result(session, "missing", {"seen": True}) is None
+
+
+@pytest.mark.anyio
+async def test_job_endpoints(async_client, session, create_user, login_and_get_token):
+    from app.crud import crud_job
+
+    await create_user("jobs@test.com", "pass", "writer")
+    token = await login_and_get_token("jobs@test.com", "pass", "writer")
+    headers = {"Authorization": f"Bearer {token}"}
+
+    job = await crud_job.create_job(session, "generate_pages", 304, {"page_id": 9})
+
+    resp = await async_client.get(f"/agents/writer_jobs/{job.id}", headers=headers)
+    assert resp.status_code == 200
+    assert resp.json()["status"] == "queued"
+    assert resp.json()["page_id"] == 9
+    assert (await async_client.get(f"/agents/novelist_jobs/{job.id}", headers=headers)).status_code == 404
+
+    resp = await async_client.patch(
+        f"/agents/writer_jobs/{job.id}", json={"action_needed": "done"}, headers=headers
+    )
+    assert resp.json()["action_needed"] == "done"
+
+    resp = await async_client.get("/agents/writer_jobs", params={"agent_id": 304, "limit": 1}, headers=headers)
+    assert [j["job_id"] for j in resp.json()] == [job.id]
+    resp = await async_client.get("/jobs/", params={"job_type": "generate_pages", "agent_id": 304}, headers=headers)
+    assert [j["job_id"] for j in resp.json()] == [job.id]
+    assert (await async_client.get("/agents/writer_jobs", params={"limit": 0}, headers=headers)).status_code == 422
+
+
+@pytest.mark.anyio
+async def test_job_events_stream(async_client, session, test_engine, create_user, login_and_get_token):
+    import asyncio
+    import json
+
+    from sqlalchemy.ext.asyncio import AsyncSession
+    from sqlalchemy.orm import sessionmaker
+
+    from app import job_events
+    from app.crud import crud_job
+
+    await create_user("events@test.com", "pass", "writer")
+    token = await login_and_get_token("events@test.com", "pass", "writer")
+    job = await crud_job.create_job(session, "create_novel", 305)
+    reporter = crud_job.JobReporter(
+        job.id, sessionmaker(bind=test_engine, class_=AsyncSession, expire_on_commit=False)
+    )
+
+    async def run_job():
+        while not job_events.get_hub().stats()["subscribers"]:
+            await asyncio.sleep(0.01)
+        await reporter.start(progress=0, chunks_total=2)
+        reporter.progress_nowait(progress=1, chunks_total=2)
+        reporter.progress_nowait(progress=2, chunks_total=2)
+        await reporter.done(novel_id=7)
+
+    worker = asyncio.create_task(run_job())
+    resp = await async_client.get(f"/jobs/{job.id}/events", headers={"Authorization": f"Bearer {token}"})
+    await worker
+
+    assert resp.headers["content-type"].startswith("text/event-stream")
+    events = []
+    for block in resp.text.strip().split("\n\n"):
+        name, data = block.split("\n")
+        events.append((name.removeprefix("event: "), json.loads(data.removeprefix("data: "))))
+    assert [e for e, _ in events] == ["status", "status", "progress", "progress", "done"]
+    assert events[0][1]["status"] == "queued"
+    assert [d["progress"] for _, d in events[2:4]] == [1, 2]
+    assert events[-1][1]["novel_id"] == 7
+
+    # finished jobs answer with their final state straight away
+    resp = await async_client.get(f"/jobs/{job.id}/events", headers={"Authorization": f"Bearer {token}"})
+    assert resp.text.count("event: ") == 1
+    assert '"status": "done"' in resp.text
@@ -0,0 +1,72 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+
+def _fake_openai(calls):
+    def handler(request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content)
+        calls.append(body)
+        return httpx.Response(200, json={
+            "id": "chatcmpl-1",
+            "object": "chat.completion",
+            "created": 0,
+            "model": body["model"],
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": f"echo: {body['messages'][-1]['content']}"},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+        })
+    return httpx.MockTransport(handler)
+
+
+@pytest.mark.anyio
+async def test_chat_models_are_shared_per_parameters(monkeypatch):
+    from langchain_core.messages import HumanMessage
+    from app import llm
+
+    calls = []
+    monkeypatch.setattr(llm, "_new_http_client", lambda: httpx.AsyncClient(transport=_fake_openai(calls)))
+    monkeypatch.setattr(llm, "_per_loop", type(llm._per_loop)())
+
+    a = llm.get_chat_model(temperature=0.2, max_tokens=100, model="gpt-test")
+    assert llm.get_chat_model(temperature=0.2, max_tokens=100, model="gpt-test") is a
+    b = llm.get_chat_model(temperature=0.9, max_tokens=100, model="gpt-test")
+    assert b is not a
+    assert a.async_client is not None and b.http_async_client is a.http_async_client
+
+    graph = llm.get_chat_graph()
+    answer = await llm.run_chat([HumanMessage(content="hi")], temperature=0.9, max_tokens=100, model="gpt-test")
+    assert answer == "echo: hi"
+    assert llm.get_chat_graph() is graph
+    assert calls[-1]["temperature"] == 0.9
+    assert calls[-1].get("max_completion_tokens", calls[-1].get("max_tokens")) == 100
+
+    # Celery runs every job in a new event loop: it gets its own clients
+    other = await asyncio.to_thread(
+        lambda: asyncio.run(_get_model(llm))
+    )
+    assert other is not a
+
+
+async def _get_model(llm):
+    return llm.get_chat_model(temperature=0.2, max_tokens=100, model="gpt-test")
+
+
+def test_task_loops_close_their_clients(monkeypatch):
+    from app import llm
+    from app.task_queue import _run
+
+    monkeypatch.setattr(llm, "_per_loop", type(llm._per_loop)())
+
+    async def job():
+        llm.get_chat_model(model="gpt-test")
+        return llm._loop_clients().http
+
+    http = _run(job())
+    assert http.is_closed
+    assert len(llm._per_loop) == 0
@@ -0,0 +1,121 @@
+import random
+from difflib import SequenceMatcher
+
+import pytest
+
+
+def _scan_existing(key, pages):
+    """The pairwise scan NameIndex.find_existing replaces."""
+    from app.crud.crud_name_index import canonical
+
+    page_map = {canonical(name): pid for pid, name, _ in pages}
+    if key in page_map:
+        return page_map[key]
+    for k, pid in page_map.items():
+        if key.startswith(k) or k.startswith(key) or SequenceMatcher(None, key, k).ratio() > 0.85:
+            return pid
+    return None
+
+
+def _scan_page_id(name, pages, concept_id=None):
+    """The pairwise scan NameIndex.find_page_id replaces."""
+    from app.crud.crud_name_index import canonical
+
+    target = canonical(name)
+    best_id, best_ratio = None, 0.0
+    for pid, pname, cid in pages:
+        candidate = canonical(pname)
+        if (concept_id is not None and cid != concept_id) or not candidate:
+            continue
+        if target in candidate or candidate in target:
+            return pid
+        ratio = SequenceMatcher(None, target, candidate).ratio()
+        if ratio > 0.8 and ratio > best_ratio:
+            best_id, best_ratio = pid, ratio
+    return best_id
+
+
+def test_name_index_matches_pairwise_scan():
+    from app.crud.crud_name_index import NameIndex, canonical
+
+    words = ["aria", "borin", "kestrel", "raven", "moor", "old", "mill", "iron", "foot", "tallis", "Sir", "Mórn"]
+    rng = random.Random(11)
+
+    def name():
+        n = " ".join(rng.choice(words) for _ in range(rng.randint(1, 3)))
+        return n[: rng.randint(1, len(n))] if rng.random() < 0.3 else n
+
+    for _ in range(50):
+        pages = [(i + 1, name(), rng.choice([1, 2])) for i in range(rng.randint(0, 40))]
+        index = NameIndex(pages)
+        for _ in range(20):
+            q = name()
+            assert index.find_existing(canonical(q)) == _scan_existing(canonical(q), pages)
+            assert index.find_page_id(q) == _scan_page_id(q, pages)
+            assert index.find_page_id(q, 2) == _scan_page_id(q, pages, 2)
+
+
+def test_find_page_id_handles_long_values():
+    import string
+    import time
+
+    from app.crud.crud_name_index import NameIndex
+
+    rng = random.Random(3)
+    pages = [(i, "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 12))), 1) for i in range(2000)]
+    pages.append((5000, "Kestrel", 2))
+    index = NameIndex(pages)
+    noise = "".join(rng.choice(string.ascii_uppercase + " ") for _ in range(1200))
+    started = time.perf_counter()
+    assert index.find_page_id(noise[:600] + " kestrel " + noise[600:], 2) == 5000
+    assert time.perf_counter() - started < 0.5
+
+
+def test_prefix_trie_finds_earliest_related_key():
+    from app.crud.crud_name_index import PrefixTrie
+
+    trie = PrefixTrie()
+    for key in ("kestrel", "aria", "ar", "borin"):
+        trie.append(key)
+    assert trie.first_related("kes") == (0, "kestrel")
+    assert trie.first_related("aria of the moor") == (1, "aria")
+    assert trie.first_related("a") == (1, "aria")
+    trie.remove("aria")
+    assert trie.first_related("a") == (2, "ar")
+    assert trie.first_related("tallis") is None
+    assert "ar" in trie and "aria" not in trie
+
+
+@pytest.mark.anyio
+async def test_world_index_is_cached_and_invalidated(session):
+    from datetime import datetime, timezone
+
+    from sqlalchemy import update
+
+    from app.crud import crud_name_index, crud_page
+    from app.models.model_page import Page
+
+    page = await crud_page.create_page(session, Page(gameworld_id=901, concept_id=1, name="Lord Kestrel"))
+    index = await crud_name_index.get_name_index(session, 901)
+    assert await crud_name_index.get_name_index(session, 901) is index
+    assert index.find_existing("kestrel") == page.id
+
+    await crud_page.update_page(session, page.id, {"name": "Aria"})
+    index = await crud_name_index.get_name_index(session, 901)
+    assert index.find_existing("kestrel") is None
+    assert index.find_page_id("aria the bold") == page.id
+
+    other = await crud_page.create_page(session, Page(gameworld_id=901, concept_id=2, name="Ravenmoor"))
+    index = await crud_name_index.get_name_index(session, 901)
+    assert index.find_page_id("ravenmor", concept_id=2) == other.id
+    assert index.find_page_id("ravenmor", concept_id=1) is None
+
+    # changes made by another process are noticed too
+    await session.execute(
+        update(Page).where(Page.id == other.id).values(name="Old Mill", updated_at=datetime.now(timezone.utc))
+    )
+    await session.commit()
+    assert (await crud_name_index.get_name_index(session, 901)).find_existing("old mill") == other.id
+
+    await crud_page.delete_page(session, other.id)
+    assert (await crud_name_index.get_name_index(session, 901)).find_existing("old mill") is None
@@ -0,0 +1,196 @@
+import asyncio
+import time
+
+import pytest
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+
+
+def word_tokens(text):
+    return len(text.split())
+
+
+def fake_graph(answer):
+    """A chat graph answering ``answer(system, user)``, 10 tokens in and 1 out per call."""
+
+    async def run(state):
+        system, user = (m.content for m in state["messages"])
+        content = await answer(system, user)
+        return AIMessage(
+            content=content, usage_metadata={"input_tokens": 10, "output_tokens": 1, "total_tokens": 11}
+        )
+
+    return lambda: RunnableLambda(run)
+
+
+@pytest.mark.anyio
+async def test_create_novel_runs_arcs_concurrently(session, monkeypatch):
+    from app import llm
+    from app.config import settings
+    from app.crud import crud_novel
+    from app.models.model_agent import Agent
+    from app.models.model_gameworld import GameWorld
+    from app.models.model_page import Page
+
+    world = GameWorld(name="Novel", system="d20", description="", created_by=1)
+    session.add(world)
+    await session.commit()
+    writer = Agent(name="Writer", world_id=world.id)
+    helper = Agent(name="Lore", world_id=world.id)
+    previous = Page(gameworld_id=world.id, concept_id=1, name="Session 0", content="the dragon fled")
+    session.add_all([writer, helper, previous])
+    await session.commit()
+
+    delay = 0.05
+    calls = []
+    rag_started = []
+
+    async def answer(system, user):
+        if system.startswith("You are a helpful editor"):
+            await asyncio.sleep(delay)
+            # ran alongside the arcs' RAG calls, not before them
+            assert len(rag_started) == 5
+            calls.append("summary")
+            return "DRAGON FLED"
+        await asyncio.sleep(delay)
+        if user.startswith("You are a fantasy literary critic"):
+            arc = user.split("Novelized arc:\n")[1].strip()
+            calls.append(("critic", arc))
+            return f"notes on {arc}"
+        if "Combine and polish" in user:
+            calls.append("synthesis")
+            assert "DRAGON FLED" in user
+            return user.split("Novelized arcs:\n")[1].split(" Instructions:")[0]
+        arc = user.split("Transcript:\n")[1].split()[0]
+        assert "DRAGON FLED" in user and f"lore of {arc}" in user
+        calls.append(("write", arc))
+        return f"novel {arc}"
+
+    async def fake_rag(session, agent_id, messages, usage=None, stage="chat"):
+        assert agent_id == helper.id
+        arc = messages[-1]["content"].split("Transcript:\n")[1].split()[0]
+        rag_started.append(arc)
+        await asyncio.sleep(delay)
+        calls.append(("rag", arc))
+        usage.add(AIMessage(content="", usage_metadata={"input_tokens": 5, "output_tokens": 5, "total_tokens": 10}), stage)
+        return {"answer": f"lore of {arc}", "sources": []}
+
+    async def no_prompts(personalities):
+        return {}
+
+    monkeypatch.setattr(llm, "get_chat_graph", fake_graph(answer))
+    monkeypatch.setattr(crud_novel, "chat_with_agent", fake_rag)
+    monkeypatch.setattr(crud_novel, "ensure_personality_prompts", no_prompts)
+    monkeypatch.setattr(crud_novel, "count_tokens", word_tokens)
+    monkeypatch.setattr(settings, "novel_arc_tokens", 1000)
+    text = "\n".join(f"arc{i} " + "word " * 999 for i in range(5))
+    progress = []
+    usage = llm.TokenUsage()
+
+    started = time.perf_counter()
+    novel = await crud_novel.create_novel(
+        session, writer, text, "", previous.id, [helper.id],
+        lambda done, total: progress.append((done, total)), usage,
+    )
+    elapsed = time.perf_counter() - started
+
+    # RAG, write, critique for one arc, then the synthesis
+    assert elapsed < 6 * delay
+    assert novel.split("\n\n") == [f"novel arc{i}" for i in range(5)]
+    assert progress == [(i, 6) for i in range(7)]
+    assert calls.count("summary") == 1 and calls[-1] == "synthesis"
+    assert sum(1 for c in calls if c[0] == "rag") == 5
+    stages = usage.as_dict()["stages"]
+    assert {k: v["calls"] for k, v in stages.items()} == {
+        "previous_summary": 1, "rag": 5, "write": 5, "critique": 5, "synthesis": 1,
+    }
+    assert stages["write"]["input_tokens"] == 50 and stages["write"]["output_tokens"] == 5
+    assert stages["rag"]["output_tokens"] == 25
+
+
+def test_split_into_arcs_follows_speakers_and_scenes(monkeypatch):
+    import random
+
+    from app.crud import crud_novel
+
+    monkeypatch.setattr(crud_novel, "count_tokens", word_tokens)
+    rng = random.Random(11)
+    lines = []
+    for i in range(400):
+        if i % 70 == 0:
+            lines.append(f"--- Scene {i // 70} ---")
+        speaker = rng.choice(["Gryx", "DM", "[00:1%d] Aria" % (i % 10)])
+        lines.append(f"{speaker}: " + " ".join("word" for _ in range(rng.randint(3, 40))))
+        if rng.random() < 0.2:
+            lines.append("and then " + " ".join("more" for _ in range(rng.randint(3, 20))))
+    text = "\n".join(lines)
+    total = word_tokens(text)
+
+    assert crud_novel.split_into_arcs(text, arc_tokens=total) == [text]
+
+    for arc_tokens, max_arcs in ((1500, 12), (800, 12), (400, 5)):
+        arcs = crud_novel.split_into_arcs(text, arc_tokens, max_arcs)
+        # nothing lost or reordered
+        assert "\n".join(arcs) == text
+        assert len(arcs) <= max_arcs
+        target = max(arc_tokens, total / max_arcs)
+        assert len(arcs) >= min(max_arcs, total // arc_tokens) - 1
+        for arc in arcs:
+            first = arc.splitlines()[0]
+            assert first.startswith("---") or crud_novel.SPEAKER_LINE.match(first)
+            assert word_tokens(arc) <= target * 1.25 * 1.1 ** 3
+
+    # an arc ends early on a scene change rather than mid-scene
+    turns = [f"DM: {'word ' * 99}" for _ in range(30)]
+    turns.insert(6, "--- The tavern ---")
+    arcs = crud_novel.split_into_arcs("\n".join(turns), 1000, 12)
+    # 4 arcs of about 750 tokens, the first one cut short at the scene
+    assert arcs[1].startswith("--- The tavern ---")
+    assert [word_tokens(arc) for arc in arcs] == [600, 804, 800, 800]
+
+    # a transcript without line breaks is cut between sentences
+    prose = " ".join(f"Sentence {i} " + "word " * 20 + "ends." for i in range(300))
+    arcs = crud_novel.split_into_arcs(prose, 1000, 12)
+    assert " ".join(" ".join(arcs).split()) == prose
+    assert all(arc.startswith("Sentence") and arc.endswith("ends.") for arc in arcs)
+    assert all(word_tokens(arc) <= 1250 for arc in arcs)
+
+
+@pytest.mark.anyio
+async def test_synthesis_merges_arcs_that_exceed_the_context(monkeypatch):
+    from app import llm
+    from app.config import settings
+    from app.crud import crud_novel
+
+    prompts = []
+
+    async def answer(system, user):
+        prompts.append(user)
+        await asyncio.sleep(0.01)
+        novels = user.split("Novelized arcs:\n")[1].split(" Instructions:")[0].split()
+        if "Merge the following" in user:
+            return " ".join(novels[::4])
+        return " ".join(novels)
+
+    monkeypatch.setattr(llm, "get_chat_graph", fake_graph(answer))
+    monkeypatch.setattr(crud_novel, "count_tokens", word_tokens)
+    overhead = word_tokens(crud_novel._final_prompt("", "", "") + crud_novel._merge_prompt("", "", ""))
+    monkeypatch.setattr(settings, "llm_context_tokens", crud_novel.SYNTHESIS_MAX_TOKENS + overhead + 400)
+    novels = [" ".join(f"a{i}w{j}" for j in range(160)) for i in range(8)]
+    notes = [f"note{i}" for i in range(8)]
+    usage = llm.TokenUsage()
+
+    draft = await crud_novel.synthesize("", "", novels, notes, usage)
+
+    stages = usage.as_dict()["stages"]
+    assert stages["synthesis"]["calls"] == 1
+    assert stages["synthesis_merge"]["calls"] == 4
+    merges, final = prompts[:-1], prompts[-1]
+    for merge in merges:
+        assert word_tokens(merge.split("Critic notes for each arc:\n")[1]) <= 400 + overhead
+    assert all(f"note{i}" in "".join(merges) for i in range(8))
+    assert "[Already applied]" not in "".join(merges)
+    # every arc is represented, in order
+    arcs = [w.split("w")[0] for w in draft.split()]
+    assert list(dict.fromkeys(arcs)) == [f"a{i}" for i in range(8)]
+    assert word_tokens(final) <= settings.llm_context_tokens
@@ -189,3 +189,73 @@ async def test_safe_delete_removes_page_refs(async_client):
     assert resp.status_code == 200
     vals = resp.json()["values"]
     assert not vals or str(p1_id) not in (vals[0]["value"] or [])
+
+
+@pytest.mark.anyio
+async def test_page_backlinks(async_client):
+    sysadmin_token = await register_and_login(async_client, SYSTEM_ADMIN)
+    writer_token = await register_and_login(async_client, WRITER)
+    headers = {"Authorization": f"Bearer {writer_token}"}
+
+    gw_payload = {"name": "LinkWorld", "system": "sys", "description": "d", "logo": "logo"}
+    resp = await async_client.post("/gameworlds/", json=gw_payload, headers={"Authorization": f"Bearer {sysadmin_token}"})
+    gw_id = resp.json()["id"]
+    concept_payload = {"gameworld_id": gw_id, "name": "NPC", "description": "c"}
+    resp = await async_client.post("/concepts/", json=concept_payload, headers={"Authorization": f"Bearer {sysadmin_token}"})
+    concept_id = resp.json()["id"]
+    char_payload = {"gameworld_id": gw_id, "name": "ally", "type": "page_ref", "ref_concept_id": concept_id, "is_list": True}
+    resp = await async_client.post("/characteristics/", json=char_payload, headers={"Authorization": f"Bearer {sysadmin_token}"})
+    char_id = resp.json()["id"]
+
+    resp = await async_client.post("/pages/", json={"gameworld_id": gw_id, "concept_id": concept_id, "name": "Target"}, headers=headers)
+    target_id = resp.json()["id"]
+
+    link = f'<p>See <a href="/worlds/{gw_id}/concept/{concept_id}/page/{target_id}">Target</a></p>'
+    resp = await async_client.post(
+        "/pages/",
+        json={
+            "gameworld_id": gw_id,
+            "concept_id": concept_id,
+            "name": "Source",
+            "content": link,
+            "values": [{"characteristic_id": char_id, "value": [str(target_id)]}],
+        },
+        headers=headers,
+    )
+    source_id = resp.json()["id"]
+
+    resp = await async_client.get(f"/pages/{target_id}/backlinks", headers=headers)
+    assert resp.status_code == 200
+    backlinks = resp.json()
+    assert [b["page_id"] for b in backlinks] == [source_id]
+    assert sorted(backlinks[0]["kinds"]) == ["html_link", "page_ref"]
+
+    # Dropping the link from the content leaves only the page_ref edge
+    resp = await async_client.patch(f"/pages/{source_id}", json={"content": "<p>See Target</p>"}, headers=headers)
+    assert resp.status_code == 200
+    resp = await async_client.get(f"/pages/{target_id}/backlinks", headers=headers)
+    assert resp.json()[0]["kinds"] == ["page_ref"]
+
+    resp = await async_client.get("/pages/999999/backlinks", headers=headers)
+    assert resp.status_code == 404
+
+
+@pytest.mark.anyio
+async def test_page_index_backfill_runs_once(monkeypatch):
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from sqlmodel import SQLModel
+
+    from app import database
+
+    runs = []
+    monkeypatch.setattr(database, "_backfill_page_index", lambda conn, tokens, links: runs.append((tokens, links)))
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+    for _ in range(2):
+        async with engine.begin() as conn:
+            await conn.run_sync(database._migrate)
+    await engine.dispose()
+
+    # the empty token and link tables don't trigger it again on the next start
+    assert len(runs) == 1
@@ -0,0 +1,327 @@
+import asyncio
+import random
+
+import httpx
+import openai
+import pytest
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+
+
+NAMES = {
+    ("Character", "chunk one"): ["Aria", "Borin"],
+    ("Character", "chunk two"): ["Borin", "Kestrel"],
+    ("Place", "chunk two"): ["Ravenmoor"],
+    ("Place", "chunk three"): ["Kestrel", "Ravenmoor"],
+    ("Item", "chunk three"): ["Not mentioned"],
+}
+
+
+class FakeExtractor:
+    """Answers extraction prompts from a script, finishing in random order."""
+
+    def __init__(self, seed):
+        self.rng = random.Random(seed)
+        self.active = 0
+        self.max_active = 0
+        self.calls = 0
+        self.rate_limited = False
+
+    async def __call__(self, prompt):
+        system, user = (m.content for m in prompt.to_messages())
+        self.calls += 1
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(self.rng.random() / 50)
+            if system.startswith("Choose"):
+                return AIMessage(content="Place")
+            if "Place" in system and "chunk two" in user and not self.rate_limited:
+                self.rate_limited = True
+                raise openai.RateLimitError(
+                    "slow down",
+                    response=httpx.Response(429, request=httpx.Request("POST", "https://api.test")),
+                    body=None,
+                )
+            concept = system.split("names of any ")[1].split(" explicitly")[0]
+            marker = next(m for m in ("chunk one", "chunk two", "chunk three") if m in user)
+            return AIMessage(content=", ".join(NAMES.get((concept, marker), [])))
+        finally:
+            self.active -= 1
+
+
+async def _analysis_fixture(session, name, analysis_mode=None):
+    from app.models.model_agent import Agent
+    from app.models.model_concept import Concept
+    from app.models.model_gameworld import GameWorld
+    from app.models.model_page import Page
+
+    world = GameWorld(name=name, system="d20", description="", created_by=1, analysis_mode=analysis_mode)
+    session.add(world)
+    await session.commit()
+    concepts = [
+        Concept(gameworld_id=world.id, name=concept, auto_generated=True, created_by_user_id=1)
+        for concept in ("Character", "Place", "Item")
+    ]
+    session.add_all(concepts)
+    await session.commit()
+    content = "\n\n".join(f"{marker} " + "lorem ipsum " * 150 for marker in ("chunk one", "chunk two", "chunk three"))
+    page = Page(gameworld_id=world.id, concept_id=concepts[0].id, name="Session 1", content=content)
+    agent = Agent(name="Writer", world_id=world.id)
+    session.add_all([page, agent])
+    await session.commit()
+    return agent, page
+
+
+EXPECTED = [
+    ("aria", "Character"),
+    ("borin", "Character"),
+    ("kestrel", "Place"),
+    ("ravenmoor", "Place"),
+]
+
+
+@pytest.mark.anyio
+async def test_analyze_page_fans_out_and_merges_in_order(session, monkeypatch):
+    from app.config import settings
+    from app.crud import crud_page_analysis
+
+    monkeypatch.setattr(settings, "llm_retry_base_delay", 0)
+    agent, page = await _analysis_fixture(session, "Fanout")
+
+    results = []
+    for seed in (1, 2):
+        fake = FakeExtractor(seed)
+        monkeypatch.setattr(crud_page_analysis, "get_chat_model", lambda: RunnableLambda(fake))
+        results.append(await crud_page_analysis.analyze_page(session, agent, page))
+        # 3 concepts x 3 chunks, one retried call and one concept choice
+        assert fake.calls == 11
+        assert 1 < fake.max_active <= settings.llm_concurrency
+
+    assert results[0] == results[1]
+    assert results[0]["analysis_mode"] == "per_concept"
+    assert [(s["name"], s["concept"]) for s in results[0]["suggestions"]] == EXPECTED
+
+
+@pytest.mark.anyio
+async def test_multi_concept_mode_falls_back_per_chunk(session, monkeypatch):
+    import json
+
+    from app.crud import crud_page_analysis
+
+    agent, page = await _analysis_fixture(session, "Multi", analysis_mode="multi_concept")
+    prompts = []
+
+    async def fake(prompt, **kwargs):
+        system, user = (m.content for m in prompt.to_messages())
+        marker = next(m for m in ("chunk one", "chunk two", "chunk three") if m in user)
+        usage = {"input_tokens": 100, "output_tokens": 10, "total_tokens": 110}
+        if system.startswith("Choose"):
+            prompts.append("choose")
+            return AIMessage(content="Place", usage_metadata=usage)
+        if system.startswith("Extract the exact names explicitly"):
+            prompts.append(("multi", marker))
+            if marker == "chunk two":
+                return AIMessage(content="Borin, Kestrel and Ravenmoor", usage_metadata=usage)
+            answer = {c: n for (c, m), n in NAMES.items() if m == marker}
+            return AIMessage(content=json.dumps(answer), usage_metadata=usage)
+        concept = system.split("names of any ")[1].split(" explicitly")[0]
+        prompts.append((concept, marker))
+        return AIMessage(content=", ".join(NAMES.get((concept, marker), [])), usage_metadata=usage)
+
+    monkeypatch.setattr(crud_page_analysis, "get_chat_model", lambda: RunnableLambda(fake))
+    result = await crud_page_analysis.analyze_page(session, agent, page)
+
+    assert [(s["name"], s["concept"]) for s in result["suggestions"]] == EXPECTED
+    assert sorted(p for p in prompts if p != "choose") == sorted([
+        ("multi", "chunk one"), ("multi", "chunk two"), ("multi", "chunk three"),
+        ("Character", "chunk two"), ("Place", "chunk two"), ("Item", "chunk two"),
+    ])
+    usage = result["token_usage"]
+    assert usage["stages"]["multi_concept"] == {
+        "calls": 3, "input_tokens": 300, "output_tokens": 30, "total_tokens": 330,
+    }
+    assert usage["stages"]["per_concept"]["calls"] == 3
+    assert usage["total"]["calls"] == 7
+
+
+@pytest.mark.anyio
+async def test_bulk_analysis_loads_world_once_and_merges_pages(session, monkeypatch):
+    from datetime import datetime, timedelta, timezone
+
+    from app.config import settings
+    from app.crud import crud_concept, crud_page_analysis
+    from app.models.model_concept import Concept
+    from app.models.model_page import Page
+
+    monkeypatch.setattr(settings, "llm_retry_base_delay", 0)
+    agent, first = await _analysis_fixture(session, "Bulk")
+    now = datetime.now(timezone.utc)
+    first.updated_at = now - timedelta(days=1)
+    second = Page(
+        gameworld_id=first.gameworld_id, concept_id=first.concept_id, name="Session 2",
+        content="chunk one " + "lorem ipsum " * 10, updated_at=now,
+    )
+    region = Concept(gameworld_id=first.gameworld_id, name="Region", auto_generated=False, created_by_user_id=1)
+    session.add_all([second, region])
+    await session.commit()
+    session.add(Page(gameworld_id=first.gameworld_id, concept_id=region.id, name="Ravenmoor"))
+    await session.commit()
+
+    async def no_queries(*args):
+        raise AssertionError("concepts come from the analysis context")
+
+    monkeypatch.setattr(crud_concept, "get_concept", no_queries)
+    loads = []
+    load_context = crud_page_analysis.load_analysis_context
+
+    async def counting_load(*args):
+        loads.append(args)
+        return await load_context(*args)
+
+    monkeypatch.setattr(crud_page_analysis, "load_analysis_context", counting_load)
+    monkeypatch.setattr(crud_page_analysis, "get_chat_model", lambda: RunnableLambda(FakeExtractor(3)))
+    progress = []
+    merged = await crud_page_analysis.analyze_pages_bulk(
+        session, agent, [second, first], progress_cb=lambda done, total: progress.append((done, total))
+    )
+
+    assert len(loads) == 1
+    assert sorted(progress) == [(1, 2), (2, 2)]
+    by_name = {s["name"]: s for s in merged}
+    assert [s["name"] for s in merged] == ["aria", "borin", "kestrel", "ravenmoor"]
+    # found in both pages, the newer page wins but every source is kept
+    assert by_name["aria"]["source_page_ids"] == [first.id, second.id]
+    assert by_name["aria"]["source_page_updated"] == second.updated_at.isoformat()
+    assert [p["id"] for p in by_name["aria"]["source_pages"]] == [first.id, second.id]
+    assert by_name["ravenmoor"]["source_page_ids"] == [first.id]
+    # an existing page keeps its concept, even one pages aren't extracted for
+    assert (by_name["ravenmoor"]["concept"], by_name["ravenmoor"]["mode"]) == ("Region", "update")
+
+
+def test_suggestion_merger_matches_pairwise_scan():
+    from difflib import SequenceMatcher
+
+    from app.crud.crud_page_analysis import _SuggestionMerger
+
+    rng = random.Random(7)
+    stems = ["aria", "borin", "kestrel", "ravenmoor", "old mill", "ironfoot", "tallis", "vey"]
+    suggestions = []
+    for i in range(300):
+        name = rng.choice(stems)
+        if rng.random() < 0.5:
+            name = name[: rng.randint(2, len(name))] + rng.choice(["", "s", "e", " the bold", "ia"])
+        suggestions.append({
+            "name": name,
+            "concept_id": rng.choice([1, 2]),
+            "source_pages": [{"id": i, "name": f"p{i}"}],
+            "source_page_ids": [i],
+            "source_page_updated": "",
+        })
+
+    expected = []
+    for sugg in suggestions:
+        found = next(
+            (m for m in expected if m["concept_id"] == sugg["concept_id"]
+             and SequenceMatcher(None, m["name"].lower(), sugg["name"].lower()).ratio() >= 0.6),
+            None,
+        )
+        if found:
+            found["source_page_ids"] = found["source_page_ids"] + sugg["source_page_ids"]
+        else:
+            expected.append(dict(sugg))
+
+    merger = _SuggestionMerger()
+    for sugg in suggestions:
+        merger.add(dict(sugg, source_pages=list(sugg["source_pages"]), source_page_ids=list(sugg["source_page_ids"])))
+    assert [(m["name"], m["concept_id"], m["source_page_ids"]) for m in merger.merged] == [
+        (m["name"], m["concept_id"], m["source_page_ids"]) for m in expected
+    ]
+
+
+@pytest.mark.anyio
+async def test_generate_pages_summarizes_sources_concurrently(session, monkeypatch):
+    import json
+    from datetime import datetime, timedelta, timezone
+
+    from app.config import settings
+    from app.crud import crud_concept, crud_page_analysis
+    from app.models.model_characteristic import Characteristic, ConceptCharacteristicLink
+    from app.models.model_page import Page
+
+    agent, page = await _analysis_fixture(session, "Generate")
+    world_id = page.gameworld_id
+    concept_id = page.concept_id
+    home = Characteristic(gameworld_id=world_id, name="Home", type="page_ref", ref_concept_id=concept_id)
+    title = Characteristic(gameworld_id=world_id, name="Title", type="string")
+    session.add_all([home, title])
+    await session.commit()
+    session.add_all([
+        ConceptCharacteristicLink(concept_id=concept_id, characteristic_id=title.id, order=0),
+        ConceptCharacteristicLink(concept_id=concept_id, characteristic_id=home.id, order=1),
+    ])
+    now = datetime.now(timezone.utc)
+    sessions = [
+        Page(gameworld_id=world_id, concept_id=concept_id, name=f"Session {i}",
+             content=f"notes {i}", updated_at=now - timedelta(days=i))
+        for i in range(2, 6)
+    ]
+    session.add_all(sessions)
+    await session.commit()
+
+    rng = random.Random(5)
+    active = max_active = calls = 0
+
+    async def fake(prompt):
+        nonlocal active, max_active, calls
+        system, user = (m.content for m in prompt.to_messages())
+        calls += 1
+        active += 1
+        max_active = max(max_active, active)
+        try:
+            await asyncio.sleep(rng.random() / 50)
+        finally:
+            active -= 1
+        assert "Characteristics: Title, Home" in user
+        notes = user.split("Text:\n")[1]
+        answer = {"autogenerated_content": f"Summary of {notes}", "values": {"Title": [notes], "Home": ["session 1"]}}
+        return AIMessage(
+            content=json.dumps(answer),
+            usage_metadata={"input_tokens": 50, "output_tokens": 5, "total_tokens": 55},
+        )
+
+    concept_loads = []
+    get_concept = crud_concept.get_concept
+
+    async def counting_get_concept(*args):
+        concept_loads.append(args[1])
+        return await get_concept(*args)
+
+    async def no_prompts(personalities):
+        return {}
+
+    monkeypatch.setattr(crud_concept, "get_concept", counting_get_concept)
+    monkeypatch.setattr(crud_page_analysis, "ensure_personality_prompts", no_prompts)
+    monkeypatch.setattr(crud_page_analysis, "get_chat_model", lambda: RunnableLambda(fake))
+    ids = [s.id for s in sessions]
+    specs = [
+        {"name": "Aria", "concept_id": concept_id, "source_page_ids": ids},
+        {"name": "Borin", "concept_id": concept_id, "source_page_ids": [ids[0], 999999, ids[2]]},
+        {"name": "Nobody", "concept_id": 999999},
+    ]
+    result = await crud_page_analysis.generate_pages(session, agent, page, specs)
+
+    assert concept_loads == [concept_id, 999999]
+    assert calls == 6
+    assert 1 < max_active <= settings.llm_concurrency
+    aria, borin = result["pages"]
+    # oldest source first, whatever order the summaries came back in
+    assert [line for line in aria["autogenerated_content"].splitlines() if line.startswith("Summary")] == [
+        "Summary of notes 5", "Summary of notes 4", "Summary of notes 3", "Summary of notes 2",
+    ]
+    assert "<h2>Notes from Session 4" in borin["autogenerated_content"].split("\n\n")[0]
+    values = {v["characteristic_id"]: sorted(v["value"]) for v in borin["values"]}
+    assert values == {title.id: ["notes 2", "notes 4"], home.id: [str(page.id)]}
+    assert result["token_usage"]["stages"]["generate"] == {
+        "calls": 6, "input_tokens": 300, "output_tokens": 30, "total_tokens": 330,
+    }
@@ -0,0 +1,38 @@
+import asyncio
+import json
+
+import pytest
+
+
+@pytest.mark.anyio
+async def test_personality_store_dedups_and_shares_file(tmp_path):
+    from app.crud.crud_personality import PersonalityStore
+
+    calls = []
+
+    async def generate(key):
+        calls.append(key)
+        await asyncio.sleep(0.05)
+        return f"{key} = Speak like {key}."
+
+    path = tmp_path / "personalities.json"
+    store = PersonalityStore(path, generate=generate, check_interval=60)
+
+    results = await asyncio.gather(*(store.get(["grumpy", "kind"]) for _ in range(10)))
+    assert sorted(calls) == ["grumpy", "kind"]
+    assert all(r == {"grumpy": "grumpy = Speak like grumpy.", "kind": "kind = Speak like kind."} for r in results)
+    assert json.loads(path.read_text()) == results[0]
+
+    # Known personalities are served from memory
+    loads = store.loads
+    assert await store.get(["kind"]) == {"kind": "kind = Speak like kind."}
+    assert store.loads == loads
+
+    # Another process adds one: it is merged, not overwritten, and picked up here
+    other = PersonalityStore(path, generate=generate, check_interval=60)
+    assert (await other.get(["wise"]))["wise"] == "wise = Speak like wise."
+    assert calls.count("wise") == 1
+    assert set(json.loads(path.read_text())) == {"grumpy", "kind", "wise"}
+    assert (await store.get(["wise"]))["wise"] == "wise = Speak like wise."
+    assert calls.count("wise") == 1
+    assert not list(tmp_path.glob("*.tmp"))
@@ -50,3 +50,366 @@ async def test_rebuild_vectordb(async_client, create_user, login_and_get_token):
     resp = await async_client.post(f"/vectordb/{gw_id}/rebuild")
     assert resp.status_code == 200
     assert resp.json()["pages_indexed"] == 3
+
+
+class FakeEmbeddings:
+    """Deterministic embeddings that count how many texts were embedded."""
+
+    def __init__(self):
+        self.embedded = 0
+        self.batches = []
+
+    def embed_documents(self, texts):
+        self.embedded += len(texts)
+        self.batches.append(len(texts))
+        return [self.embed_query(t) for t in texts]
+
+    def embed_query(self, text):
+        return [float(len(text) % 7), float(len(text.split()) % 5), 1.0]
+
+
+@pytest.mark.anyio
+async def test_incremental_world_rebuild(session, monkeypatch):
+    import chromadb
+    from app.crud import crud_vectordb
+    from app.models.model_page import Page
+
+    client = chromadb.EphemeralClient()
+    fake = FakeEmbeddings()
+    monkeypatch.setattr(crud_vectordb, "get_chroma_client", lambda: client)
+    monkeypatch.setattr(crud_vectordb, "_embedding_fn", fake)
+
+    world_id = 9901
+    pages = [
+        Page(gameworld_id=world_id, concept_id=1, name=f"P{i}", content=f"page {i} text")
+        for i in range(3)
+    ]
+    session.add_all(pages)
+    await session.commit()
+
+    stats = await crud_vectordb.rebuild_world(session, world_id, mode="full")
+    assert stats["pages_indexed"] == 3
+    assert stats["chunks_embedded"] == 3
+    assert fake.embedded == 3
+
+    # Nothing changed: no embedding work at all
+    stats = await crud_vectordb.rebuild_world(session, world_id)
+    assert stats["mode"] == "incremental"
+    assert stats["chunks_embedded"] == 0
+    assert stats["chunks_unchanged"] == 3
+    assert fake.embedded == 3
+
+    # One page edited, one removed
+    pages[0].content = "page zero rewritten with more words"
+    await session.delete(pages[2])
+    await session.commit()
+    stats = await crud_vectordb.rebuild_world(session, world_id)
+    assert stats["chunks_embedded"] == 1
+    assert stats["chunks_deleted"] == 1
+    assert fake.embedded == 4
+
+    ids = set(client.get_collection(f"world_{world_id}").get()["ids"])
+    assert ids == {crud_vectordb.chunk_id(pages[0].id, 0), crud_vectordb.chunk_id(pages[1].id, 0)}
+
+
+@pytest.mark.anyio
+async def test_reindex_page_replaces_its_chunks(session, monkeypatch):
+    import chromadb
+    from app.crud import crud_vectordb
+    from app.models.model_agent import Agent
+    from app.models.model_page import Page
+
+    client = chromadb.EphemeralClient()
+    fake = FakeEmbeddings()
+    monkeypatch.setattr(crud_vectordb, "get_chroma_client", lambda: client)
+    monkeypatch.setattr(crud_vectordb, "_embedding_fn", fake)
+
+    world_id = 9902
+    agent = Agent(name="Indexer", world_id=world_id, personality="p")
+    page = Page(gameworld_id=world_id, concept_id=1, name="Solo", content="first text")
+    session.add_all([agent, page])
+    await session.commit()
+
+    await crud_vectordb.reindex_page(session, page.id)
+    await crud_vectordb.reindex_page(session, page.id)
+    collection = client.get_collection(f"world_{world_id}")
+    assert collection.get()["ids"] == [crud_vectordb.chunk_id(page.id, 0)]
+    assert fake.embedded == 1
+    # The agent never built its index, so it isn't marked as up to date
+    await session.refresh(agent)
+    assert agent.vector_db_update_date is None
+
+    page.content = "second text"
+    await session.commit()
+    stats = await crud_vectordb.reindex_page(session, page.id)
+    assert stats["chunks_embedded"] == 1
+    assert collection.get()["documents"][0].startswith("second text")
+
+    page_id = page.id
+    await session.delete(page)
+    await session.commit()
+    stats = await crud_vectordb.reindex_page(session, page_id, world_id)
+    assert stats["chunks_deleted"] == 1
+    assert collection.get()["ids"] == []
+
+
+@pytest.mark.anyio
+async def test_rebuild_embeds_across_pages_in_batches(session, monkeypatch):
+    import chromadb
+    from app.config import settings
+    from app.crud import crud_vectordb
+    from app.models.model_characteristic import Characteristic
+    from app.models.model_page import Page, PageCharacteristicValue
+
+    client = chromadb.EphemeralClient()
+    fake = FakeEmbeddings()
+    monkeypatch.setattr(crud_vectordb, "get_chroma_client", lambda: client)
+    monkeypatch.setattr(crud_vectordb, "_embedding_fn", fake)
+    monkeypatch.setattr(settings, "vector_embed_batch_size", 4)
+
+    world_id = 9903
+    char = Characteristic(gameworld_id=world_id, name="Rank", type="string")
+    pages = [
+        Page(gameworld_id=world_id, concept_id=1, name=f"B{i}", content=f"batch page {i}")
+        for i in range(10)
+    ]
+    session.add_all([char, *pages])
+    await session.commit()
+    session.add(PageCharacteristicValue(page_id=pages[0].id, characteristic_id=char.id, value=["Captain"]))
+    await session.commit()
+
+    stats = await crud_vectordb.rebuild_world(session, world_id, mode="full")
+    assert stats["chunks_embedded"] == 10
+    assert "chunks_per_sec" in stats
+    assert fake.batches == [4, 4, 2]
+
+    collection = client.get_collection(f"world_{world_id}")
+    got = collection.get(ids=[crud_vectordb.chunk_id(pages[0].id, 0)], include=["documents", "embeddings"])
+    assert "Rank: Captain" in got["documents"][0]
+    assert len(got["embeddings"][0]) == 3
+
+
+def test_embedding_cache_lru_and_persistence(tmp_path):
+    from app.crud.crud_embedding_cache import CachedEmbeddings, EmbeddingCache
+
+    path = str(tmp_path / "emb.sqlite3")
+    base = FakeEmbeddings()
+    cached = CachedEmbeddings(base, EmbeddingCache(path, max_entries=2), "fake")
+
+    first = cached.embed_documents(["alpha", "beta", "alpha"])
+    assert first == [base.embed_query(t) for t in ["alpha", "beta", "alpha"]]
+    assert base.embedded == 2
+    assert (cached.cache.hits, cached.cache.misses) == (1, 2)
+
+    cached.embed_documents(["alpha"])  # refresh alpha, beta is now the oldest
+    cached.embed_documents(["gamma"])
+    assert base.embedded == 3
+    assert len(cached.cache) == 2
+
+    reopened = CachedEmbeddings(base, EmbeddingCache(path, max_entries=2), "fake")
+    reopened.embed_documents(["alpha", "gamma"])
+    assert base.embedded == 3
+    reopened.embed_documents(["beta"])
+    assert base.embedded == 4
+    assert reopened.cache.stats()["hits"] == 2
+
+
+def test_embedding_model_is_lazy_and_served_over_socket(tmp_path):
+    import threading
+    from app.embeddings import EmbeddingWorker, LazyEmbeddings, RemoteEmbeddings
+
+    base = FakeEmbeddings()
+    built = []
+    lazy = LazyEmbeddings(lambda: built.append(1) or base)
+    assert not lazy.loaded and built == []
+
+    sock = str(tmp_path / "emb.sock")
+    server = EmbeddingWorker(sock, lazy)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        client = RemoteEmbeddings(sock, timeout=5)
+        assert client.ping()
+        assert built == []
+        assert client.embed_documents(["one", "two words"]) == base.embed_documents(["one", "two words"])
+        assert client.embed_query("q") == base.embed_query("q")
+        assert built == [1]
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_collection_handles_are_cached_and_invalidated(monkeypatch):
+    import chromadb
+    from app.config import settings
+    from app.crud import crud_vectordb
+
+    client = chromadb.EphemeralClient()
+    monkeypatch.setattr(crud_vectordb, "get_chroma_client", lambda: client)
+    monkeypatch.setattr(crud_vectordb, "_embedding_fn", FakeEmbeddings())
+    monkeypatch.setattr(settings, "chroma_collection_cache_size", 2)
+    monkeypatch.setattr(crud_vectordb, "_collections", crud_vectordb.OrderedDict())
+
+    first = crud_vectordb.get_cached_collection("cache_a")
+    assert crud_vectordb.get_cached_collection("cache_a") is first
+    crud_vectordb.get_cached_collection("cache_b")
+    crud_vectordb.get_cached_collection("cache_c")
+    assert list(crud_vectordb._collections) == ["cache_b", "cache_c"]
+
+    crud_vectordb._delete_collection("cache_b", client)
+    assert "cache_b" not in crud_vectordb._collections
+    assert "cache_b" not in [c.name for c in client.list_collections()]
+
+
+@pytest.mark.anyio
+async def test_flat_backend_rebuild_and_query(session, monkeypatch, tmp_path):
+    from app.crud import crud_vectordb
+    from app.models.model_page import Page
+    from app.vector_store import FlatIndexClient
+
+    client = FlatIndexClient(str(tmp_path))
+    monkeypatch.setattr(crud_vectordb, "get_chroma_client", lambda: client)
+    monkeypatch.setattr(crud_vectordb, "_embedding_fn", FakeEmbeddings())
+
+    world_id = 9904
+    pages = [
+        Page(gameworld_id=world_id, concept_id=1, name="Short", content="tiny"),
+        Page(gameworld_id=world_id, concept_id=1, name="Long", content="dragons dragons dragons"),
+    ]
+    session.add_all(pages)
+    await session.commit()
+
+    stats = await crud_vectordb.rebuild_world(session, world_id, mode="full")
+    assert stats["chunks_embedded"] == 2
+    results = crud_vectordb.query_world(world_id, "dragons dragons dragons", n_results=1)
+    assert [r["page_id"] for r in results] == [pages[1].id]
+
+    # A second process sees the same data and incremental mode trusts it
+    other = FlatIndexClient(str(tmp_path))
+    assert other.get_collection(f"world_{world_id}").count() == 2
+    monkeypatch.setattr(crud_vectordb, "get_chroma_client", lambda: other)
+    stats = await crud_vectordb.rebuild_world(session, world_id)
+    assert stats["mode"] == "incremental" and stats["chunks_embedded"] == 0
+
+    await session.delete(pages[0])
+    await session.commit()
+    await crud_vectordb.reindex_page(session, pages[0].id, world_id)
+    assert client.get_collection(f"world_{world_id}").get()["ids"] == [crud_vectordb.chunk_id(pages[1].id, 0)]
+
+
+@pytest.mark.anyio
+async def test_async_query_does_not_block_event_loop(monkeypatch, tmp_path):
+    import asyncio
+    import time
+    from app.crud import crud_vectordb
+    from app.vector_store import FlatIndexClient
+
+    class SlowEmbeddings(FakeEmbeddings):
+        def embed_query(self, text):
+            time.sleep(0.2)
+            return super().embed_query(text)
+
+    client = FlatIndexClient(str(tmp_path))
+    monkeypatch.setattr(crud_vectordb, "get_chroma_client", lambda: client)
+    monkeypatch.setattr(crud_vectordb, "_embedding_fn", SlowEmbeddings())
+    client.get_or_create_collection("world_9905").upsert(
+        ids=["page-1-0"],
+        embeddings=[[1.0, 0.0, 1.0]],
+        documents=["text"],
+        metadatas=[{"page_id": 1, "chunk_index": 0, "title": "T"}],
+    )
+
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    task = asyncio.create_task(ticker())
+    results = await crud_vectordb.aquery_world(9905, "q")
+    task.cancel()
+    assert [r["page_id"] for r in results] == [1]
+    assert ticks >= 5
+
+
+@pytest.mark.anyio
+async def test_query_and_result_caches(session, monkeypatch, tmp_path):
+    from app.cache import TTLCache
+    from app.crud import crud_vectordb
+    from app.crud.crud_embedding_cache import CachedEmbeddings, EmbeddingCache
+    from app.models.model_page import Page
+    from app.vector_store import FlatIndexClient
+
+    class CountingEmbeddings(FakeEmbeddings):
+        queries = 0
+
+        def embed_documents(self, texts):
+            return [FakeEmbeddings.embed_query(self, t) for t in texts]
+
+        def embed_query(self, text):
+            self.queries += 1
+            return super().embed_query(text)
+
+    base = CountingEmbeddings()
+    embeddings = CachedEmbeddings(
+        base, EmbeddingCache(str(tmp_path / "emb.sqlite3")), "fake", query_cache=TTLCache(16, 60)
+    )
+    client = FlatIndexClient(str(tmp_path / "vectors"))
+    monkeypatch.setattr(crud_vectordb, "get_chroma_client", lambda: client)
+    monkeypatch.setattr(crud_vectordb, "_embedding_fn", embeddings)
+    monkeypatch.setattr(crud_vectordb, "_result_cache", TTLCache(16, 60))
+
+    world_id = 9906
+    page = Page(gameworld_id=world_id, concept_id=1, name="Keep", content="old keep lore")
+    session.add(page)
+    await session.commit()
+    await crud_vectordb.rebuild_world(session, world_id, mode="full")
+
+    first = await crud_vectordb.aquery_world(world_id, "Where is the keep?")
+    again = await crud_vectordb.aquery_world(world_id, "  where is THE keep? ")
+    assert again == first and again is not first
+    assert base.queries == 1
+    assert crud_vectordb._result_cache.stats()["hits"] == 1
+
+    # A page edit bumps the world's generation, so the cached answer is dropped
+    generation = crud_vectordb.index_generation(f"world_{world_id}")
+    page.content = "new keep lore"
+    await session.commit()
+    await crud_vectordb.reindex_page(session, page.id)
+    assert crud_vectordb.index_generation(f"world_{world_id}") != generation
+    fresh = crud_vectordb.query_world(world_id, "where is the keep?")
+    assert fresh[0]["document"].startswith("new keep lore")
+    assert base.queries == 1  # query embedding still cached
+
+
+def test_index_generation_is_cached_between_file_checks(monkeypatch, tmp_path):
+    import builtins
+    import os
+
+    from app.config import settings
+    from app.crud import crud_vectordb
+
+    monkeypatch.setattr(settings, "vector_db_path", str(tmp_path))
+    monkeypatch.setattr(crud_vectordb, "_generations", {})
+    monkeypatch.setattr(settings, "index_generation_ttl", 60)
+    crud_vectordb.mark_index_changed("world_9907")
+    generation = crud_vectordb.index_generation("world_9907")
+
+    opened = []
+    real_open = builtins.open
+    monkeypatch.setattr(builtins, "open", lambda *a, **k: opened.append(a[0]) or real_open(*a, **k))
+    # another process bumps the generation: seen once the TTL is over
+    path = crud_vectordb._generation_path("world_9907")
+    with real_open(path, "w") as f:
+        f.write("other")
+    os.utime(path, (1, 1))
+    assert crud_vectordb.index_generation("world_9907") == generation
+    assert opened == []
+    monkeypatch.setattr(settings, "index_generation_ttl", 0)
+    assert crud_vectordb.index_generation("world_9907") == "other"
+    # unchanged file: only its mtime is checked
+    opened.clear()
+    assert crud_vectordb.index_generation("world_9907") == "other"
+    assert opened == []